@@ -30,9 +30,15 @@ import os
 import random
 import socket
 import threading
+import contextlib
+import functools
+import io
 import re
 import ast
-from typing import Dict, List, Tuple, Optional, Callable, Any
+import operator
+import zlib
+import hashlib
+from typing import Dict, List, Tuple, Optional, Callable, Any, IO, Iterator
 from enum import IntEnum
 import asyncio
 from dataclasses import dataclass, field
@@ -446,6 +452,10 @@ OP_CLEAR = 0xA8      # Clear screen: CLEAR color
 OP_MULH = 0xA9       # Multiply High: Get upper 32 bits of 64-bit multiplication
 OP_DIVMOD = 0xAA     # Combined DIV/MOD: dst=quotient, src gets remainder
 OP_AVGB = 0xAB       # Average bytes: Average of two values (useful for blending)
+# Register compare-and-branch (0xAC-0xAD): test a register and jump without touching flags
+OP_CBZ = 0xAC        # Branch if zero: CBZ reg, label
+OP_CBNZ = 0xAD       # Branch if not zero: CBNZ reg, label
+OP_CRC32_BUF = 0xAE  # Buffer checksum: R0=addr, R1=len -> R0=crc32
 
 OPCODE_NAME = {
     OP_NOP: "NOP", OP_MOV: "MOV", OP_LOADI: "LOADI", OP_LOAD: "LOAD", OP_STORE: "STORE",
@@ -500,7 +510,7 @@ OPCODE_NAME = {
     OP_LERP: "LERP", OP_SIGN: "SIGN", OP_SATURATE: "SATURATE",
     OP_PIXEL: "PIXEL", OP_LINE: "LINE", OP_RECT: "RECT", OP_FILLRECT: "FILLRECT",
     OP_CIRCLE: "CIRCLE", OP_FILLCIRCLE: "FILLCIRCLE", OP_GETPIXEL: "GETPIXEL", OP_CLEAR: "CLEAR",
-    OP_MULH: "MULH", OP_DIVMOD: "DIVMOD", OP_AVGB: "AVGB",
+    OP_MULH: "MULH", OP_DIVMOD: "DIVMOD", OP_AVGB: "AVGB", OP_CBZ: "CBZ", OP_CBNZ: "CBNZ", OP_CRC32_BUF: "CRC32_BUF",
     OP_SETG: "SETG", OP_SETLE: "SETLE", OP_SETGE: "SETGE", OP_SETNE: "SETNE", OP_SETE: "SETE",
     OP_LOOP: "LOOP", OP_LOOPZ: "LOOPZ", OP_LOOPNZ: "LOOPNZ",
     OP_REP: "REP", OP_REPZ: "REPZ", OP_REPNZ: "REPNZ",
@@ -533,6 +543,13 @@ FLAG_NAME_MAP = {
     "PARITY": FLAG_PARITY, "ADJUST": FLAG_ADJUST, "RESUME": FLAG_RESUME,
     "POWER": FLAG_POWER_SAVE, "THERMAL": FLAG_THERMAL, "SECURE": FLAG_SECURE,
 }
+
+@functools.lru_cache(maxsize=64)
+def _flag_mask(raw: str) -> Tuple[str, Optional[int]]:
+    """Return (canonical name, mask or None) for a user-typed flag name."""
+    name = raw.upper()
+    return name, FLAG_NAME_MAP.get(name)
+
 # Instruction packing helpers
 def pack_instruction(opcode: int, dst: int = 0, src: int = 0, imm16: int = 0) -> int:
     return ((opcode & 0xFF) << 24) | ((dst & 0x0F) << 20) | ((src & 0x0F) << 16) | (imm16 & 0xFFFF)
@@ -2465,6 +2482,9 @@ class CPU:
         if idx < 0 or idx >= NUM_REGS:
             raise IndexError("Register index out of range")
         self.regs[idx] = val & 0xFFFFFFFF
+    def snapshot_regs(self) -> List[int]:
+        """Copy of all general registers; reg_write keeps them masked to 32 bits."""
+        return self.regs[:]
     def fpu_reg_read(self, idx: int) -> float:
         if idx < 0 or idx >= NUM_FPU_REGS:
             raise IndexError("FPU register index out of range")
@@ -2722,21 +2742,27 @@ class CPU:
                 addr = self.reg_read(dst)
             self.mem.write_word(addr, self.reg_read(src))
         elif opcode == OP_ADD:
-            val = self.alu_add(self.reg_read(dst), self.reg_read(src))
+            # src == 0x0F selects the sign-extended imm16 operand, as for MUL and CMP
+            b = to_signed16(imm16) & 0xFFFFFFFF if src == 0x0F else self.reg_read(src)
+            val = self.alu_add(self.reg_read(dst), b)
             self.reg_write(dst, val)
         elif opcode == OP_SUB:
-            val = self.alu_sub(self.reg_read(dst), self.reg_read(src))
+            b = to_signed16(imm16) & 0xFFFFFFFF if src == 0x0F else self.reg_read(src)
+            val = self.alu_sub(self.reg_read(dst), b)
             self.reg_write(dst, val)
         elif opcode == OP_AND:
-            res = self.reg_read(dst) & self.reg_read(src)
+            b = to_signed16(imm16) & 0xFFFFFFFF if src == 0x0F else self.reg_read(src)
+            res = self.reg_read(dst) & b
             self.reg_write(dst, res)
             self.update_zero_and_neg_flags(res)
         elif opcode == OP_OR:
-            res = self.reg_read(dst) | self.reg_read(src)
+            b = to_signed16(imm16) & 0xFFFFFFFF if src == 0x0F else self.reg_read(src)
+            res = self.reg_read(dst) | b
             self.reg_write(dst, res)
             self.update_zero_and_neg_flags(res)
         elif opcode == OP_XOR:
-            res = self.reg_read(dst) ^ self.reg_read(src)
+            b = to_signed16(imm16) & 0xFFFFFFFF if src == 0x0F else self.reg_read(src)
+            res = self.reg_read(dst) ^ b
             self.reg_write(dst, res)
             self.update_zero_and_neg_flags(res)
         elif opcode == OP_NOT:
@@ -2745,13 +2771,13 @@ class CPU:
             self.update_zero_and_neg_flags(res)
         elif opcode == OP_SHL:
             s = self.reg_read(dst)
-            bits = self.reg_read(src) & 0x1F
+            bits = (imm16 if src == 0x0F else self.reg_read(src)) & 0x1F
             res = (s << bits) & 0xFFFFFFFF
             self.reg_write(dst, res)
             self.update_zero_and_neg_flags(res)
         elif opcode == OP_SHR:
             s = self.reg_read(dst)
-            bits = self.reg_read(src) & 0x1F
+            bits = (imm16 if src == 0x0F else self.reg_read(src)) & 0x1F
             res = (s >> bits) & 0xFFFFFFFF
             self.reg_write(dst, res)
             self.update_zero_and_neg_flags(res)
@@ -2789,6 +2815,14 @@ class CPU:
                     next_pc = base_addr + imm16
                 else:
                     next_pc = imm16
+        elif opcode == OP_CBZ or opcode == OP_CBNZ:
+            # CBZ/CBNZ: jump if register dst is zero / non-zero, fusing CMP reg, 0 + JE/JNE
+            if (self.reg_read(dst) == 0) == (opcode == OP_CBZ):
+                if imm16 < 0x1000:
+                    base_addr = (self.pc // 0x1000) * 0x1000
+                    next_pc = base_addr + imm16
+                else:
+                    next_pc = imm16
         elif opcode == OP_JL:
             # Jump if less (SF != OF)
             if (self.test_flag(FLAG_NEG) != self.test_flag(FLAG_OVERFLOW)):
@@ -3814,6 +3848,15 @@ class CPU:
                         self.mem.write_byte((base + j) & 0xFFFFFFFF, a)
                         i += 1
                         j -= 1
+        elif opcode == OP_CRC32_BUF:
+            # CRC32_BUF: R0=base_addr, R1=length -> R0=crc32 of the whole buffer
+            base = self.reg_read(0) & 0xFFFFFFFF
+            length = self.reg_read(1) & 0xFFFFFFFF
+            crc = 0
+            if length and base < self.mem.size:
+                end = base + length if length <= self.mem.size - base else self.mem.size
+                crc = zlib.crc32(memoryview(self.mem.data)[base:end])
+            self.reg_write(0, crc)
         elif opcode == OP_MEMSET:
             # Memory set: R0=dst_addr, R1=value, R2=length
             dst_addr = self.reg_read(0) & 0xFFFFFFFF
@@ -4646,6 +4689,8 @@ class CPU:
                 s = f"{pc:08x}: {name} R{dst}, {to_signed16(imm16)}"
             elif name in ("JMP", "JZ", "JNZ", "JE", "JNE", "JL", "JG", "JLE", "JGE", "CALL", "LOAD", "STORE", "INT"):
                 s = f"{pc:08x}: {name} {imm16} (0x{imm16:04x})"
+            elif name in ("CBZ", "CBNZ"):
+                s = f"{pc:08x}: {name} R{dst}, {imm16} (0x{imm16:04x})"
             elif name in ("MOV","ADD","SUB","AND","OR","XOR","CMP","TEST","SHL","SHR","MUL","IMUL","DIV","IDIV","MOD","FADD","FSUB","FMUL","FDIV","FCOMP","FXCH","ADC","SBB","ROL","ROR","BT","BTS","BTR","BSF","BSR","LAR","LSL","SLDT","STR","LLDT","LTR","VERR","VERW","SGDT","SIDT","LGDT","LIDT","SMSW","LMSW","CLTS","INVD","WBINVD","INVLPG","INVPCID","VMCALL","VMLAUNCH","VMRESUME","VMXOFF","MONITOR","MWAIT","RDSEED","RDRAND","CLAC","STAC","SKINIT","SVMEXIT","SVMRET","SVMLOCK","SVMUNLOCK"):
                 s = f"{pc:08x}: {name} R{dst}, R{src}"
             elif name in ("PUSH","POP","INC","DEC","NOT","OUT","IN","SYSCALL","FLD","FST","FCHS","FABS","FSQRT","FSTP","FLDZ","FLD1","FLDPI","FLDLG2","FLDLN2","FSTSW","FCLEX","FILD","FIST","FISTP","NEG","CBW","CWD","CWDQ","LAHF","SAHF","XCHG","CMPXCHG","IN","OUT","CLD","STD","INTO","AAM","AAD","XLAT"):
@@ -4833,6 +4878,17 @@ class Assembler:
         """Get list of assembly warnings"""
         return self.warnings
     
+    def reset(self):
+        """Forget state left by a previous assemble() so the instance can be reused"""
+        self.labels.clear()
+        self.lines = []
+        self.macros.clear()
+        self.constants.clear()
+        self.used_labels.clear()
+        self.string_data.clear()
+        self.incbin_cache.clear()
+        self.clear_errors()
+    
     def clear_errors(self):
         """Clear error list"""
         self.errors.clear()
@@ -5352,13 +5408,20 @@ class Assembler:
                             imm = self.resolve_label_token(second)
                             imm_val = self.parse_imm(imm) & 0xFFFF
                             word = pack_instruction(opcode, dst, 0, imm_val)
+                elif opcode in (OP_CBZ, OP_CBNZ):
+                    if len(args) != 2:
+                        raise AssemblerError(f"{mnem} requires register and label")
+                    dst = self.parse_reg(args[0])
+                    val = self.resolve_label_token(args[1])
+                    valnum = self.parse_imm(val) & 0xFFFF
+                    word = pack_instruction(opcode, dst, 0, valnum)
                 elif opcode in (OP_LOAD, OP_STORE, OP_JMP, OP_JZ, OP_JNZ, OP_JE, OP_JNE, OP_JL, OP_JG, OP_JLE, OP_JGE, OP_CALL, OP_INT, OP_FLD, OP_FST, OP_FSTP, OP_FILD, OP_FIST, OP_FISTP, OP_SETF, OP_TESTF, OP_CLRF, OP_LOOP, OP_LOOPZ, OP_LOOPNZ):
                     if len(args) != 1:
                         raise AssemblerError(f"{mnem} requires one operand")
                     val = self.resolve_label_token(args[0])
                     valnum = self.parse_imm(val) & 0xFFFF
                     word = pack_instruction(opcode, 0, 0, valnum)
-                elif opcode in (OP_PUSH, OP_POP, OP_INC, OP_DEC, OP_NOT, OP_OUT, OP_IN, OP_SYSCALL, OP_FCHS, OP_FABS, OP_FSQRT, OP_FSTSW, OP_LAR, OP_LSL, OP_SLDT, OP_STR, OP_LLDT, OP_LTR, OP_VERR, OP_VERW, OP_SGDT, OP_SIDT, OP_LGDT, OP_LIDT, OP_SMSW, OP_LMSW, OP_CLTS, OP_INVD, OP_WBINVD, OP_INVLPG, OP_INVPCID, OP_VMCALL, OP_VMLAUNCH, OP_VMRESUME, OP_VMXOFF, OP_MONITOR, OP_MWAIT, OP_RDSEED, OP_RDRAND, OP_CLAC, OP_STAC, OP_SKINIT, OP_SVMEXIT, OP_SVMRET, OP_SVMLOCK, OP_SVMUNLOCK, OP_CPUID, OP_SETG, OP_SETLE, OP_SETGE, OP_SETNE, OP_SETE):
+                elif opcode in (OP_PUSH, OP_POP, OP_INC, OP_DEC, OP_NOT, OP_OUT, OP_IN, OP_SYSCALL, OP_FCHS, OP_FABS, OP_FSQRT, OP_FSTSW, OP_LAR, OP_LSL, OP_SLDT, OP_STR, OP_LLDT, OP_LTR, OP_VERR, OP_VERW, OP_SGDT, OP_SIDT, OP_LGDT, OP_LIDT, OP_SMSW, OP_LMSW, OP_CLTS, OP_INVD, OP_WBINVD, OP_INVLPG, OP_INVPCID, OP_VMCALL, OP_VMLAUNCH, OP_VMRESUME, OP_VMXOFF, OP_MONITOR, OP_MWAIT, OP_RDSEED, OP_RDRAND, OP_CLAC, OP_STAC, OP_SKINIT, OP_SVMEXIT, OP_SVMRET, OP_SVMLOCK, OP_SVMUNLOCK, OP_CPUID, OP_SETG, OP_SETLE, OP_SETGE, OP_SETNE, OP_SETE, OP_SETZ, OP_SETNZ, OP_SETL, OP_SETA, OP_SETB, OP_SETBE, OP_SETAE, OP_SETO, OP_SETNO):
                     if len(args) != 1:
                         raise AssemblerError(f"{mnem} requires one operand")
                     dst = self.parse_reg(args[0])
@@ -5487,10 +5550,273 @@ class Assembler:
 # ---------------------------
 # Simple C++ Compiler (cas++)
 # ---------------------------
+# Byte -> action table for the statement splitter; 0 means an ordinary character.
+_ACT_QUOTE, _ACT_ESCAPE, _ACT_LPAREN, _ACT_RPAREN, _ACT_LBRACE, _ACT_RBRACE, _ACT_SEMI = range(1, 8)
+_CHAR_ACTION = bytearray(256)
+for _ch, _act in (('"', _ACT_QUOTE), ('\\', _ACT_ESCAPE), ('(', _ACT_LPAREN), (')', _ACT_RPAREN),
+                  ('{', _ACT_LBRACE), ('}', _ACT_RBRACE), (';', _ACT_SEMI)):
+    _CHAR_ACTION[ord(_ch)] = _act
+del _ch, _act
+# Signed depth deltas indexed by action id (0 = ordinary character)
+_BRACE_DELTA = (0, 0, 0, 0, 0, 1, -1, 0)
+_PAREN_DELTA = (0, 0, 0, 1, -1, 0, 0, 0)
+
+
+def _make_statement_builtin(templates: Tuple[str, ...]) -> Callable[..., None]:
+    """Build an emitter specialized for one statement-form builtin.
+
+    The emitter evaluates each argument into its own temp register and then
+    appends `templates`, formatted with those registers in argument order,
+    directly to the caller's `out` list.
+    """
+    def emit(compiler: "CppCompiler", args: List[str], out: List[str]) -> None:
+        nodes = [compiler._parse_expression_node(arg) for arg in args]
+        regs = [compiler._acquire_temp_register() for _ in nodes]
+        for node, reg in zip(nodes, regs):
+            compiler._emit_expression_into(node, reg, out)
+        out.extend(template.format(*regs) for template in templates)
+        for reg in reversed(regs):
+            compiler._release_temp_register(reg)
+    return emit
+
+
+# Builtin functions that don't return values (statement form), keyed by (name, argc)
+_STATEMENT_BUILTINS: Dict[Tuple[str, int], Callable[..., None]] = {
+    key: _make_statement_builtin(templates) for key, templates in {
+        ("sleep", 1): ("    SLEEP R0, {0}",),  # Two operand form
+        # printf_int(value) - print integer directly using syscall 50
+        ("printf_int", 1): ("    LOADI R0, 50  ; PRINT_INT syscall", "    MOV R1, {0}", "    SYSCALL R0"),
+        # strncpy(dest, src, n) - copy n bytes from src to dest
+        ("strncpy", 3): ("    STRNCPY {0}, {1}, {2}",),
+    }.items()
+}
+
+# printf(...) statement and the integer conversion spec it understands
+_RE_PRINTF_FULL = re.compile(r'printf\s*\((.+)\)$', re.DOTALL)
+_RE_FMT = re.compile(r'%d')
+# Statement shapes recognised by the translator
+# Statement classifier matched once per statement: the named group that matched
+# (m.lastgroup) is the statement kind. Alternatives are tried in priority order.
+_RE_STATEMENT_KIND = re.compile(
+    r'(?P<incdec>(?:\+\+|--)\s*[A-Za-z_]\w*\s*;*$|[A-Za-z_]\w*\s*(?:\+\+|--)\s*;*$)'
+    r'|(?P<decl>(?:const\s+)?(?:int|float|bool|char)\s)'
+    r'|(?P<compound>(?P<lhs>[A-Za-z_]\w*)\s*(?:\+=|-=|\*=|/=|%=|&=|\|=|\^=|<<=|>>=))'
+    r'|(?P<word>[A-Za-z_]\w*)'
+)
+_RE_DECL = re.compile(r'(const\s+)?(int|float|bool|char)\s+([A-Za-z_]\w*)(\s*=\s*(.+))?$')
+_RE_PROTO = re.compile(r"(?:const\s+)?(?:int|float|bool|char)\s+[A-Za-z_]\w*\s*\(\s*\)")
+_RE_COMPOUND_ASSIGN = re.compile(r'^([A-Za-z_]\w*)\s*(\+=|-=|\*=|/=|%=|&=|\|=|\^=|<<=|>>=)\s*(.+)$')
+_RE_INDEXED_LHS = re.compile(r'([A-Za-z_]\w*)\s*\[\s*(.+?)\s*\]')
+_RE_INC_POST = re.compile(r"([A-Za-z_]\w*)\s*(\+\+|--)")
+_RE_INC_PRE = re.compile(r"(\+\+|--)\s*([A-Za-z_]\w*)")
+_RE_CALL_STMT = re.compile(r"([A-Za-z_]\w*)\s*\((.*)\)\s*")
+_RE_CASE = re.compile(r"case\s+(-?\d+)\s*:")
+_RE_ASM = re.compile(r'asm\s*\(\s*"([^"]+)"\s*\)')
+_RE_ARRAY_DECL = re.compile(r'(int|float|bool|char)\s+([A-Za-z_]\w*)\s*\[\s*(\d+)\s*\](\s*=\s*\{([^}]+)\})?')
+_RE_CLASS_DEF = re.compile(r'(class|struct)\s+([A-Za-z_]\w*)\s*\{(.+)\}', re.DOTALL)
+_RE_CLASS_HEAD = re.compile(r'(class|struct)\s+([A-Za-z_]\w*)\s*\{')
+# A member declaration opening a ';'-separated segment of a class body
+_RE_MEMBER_DECL = re.compile(r'(?:^|;)\s*(int|float|bool|char)\s+([A-Za-z_]\w*)')
+# C logical operators and literals rewritten to Python in one pass by _normalize_expression
+_RE_NORMALIZE = re.compile(r'&&|\|\||!(?!=)|\btrue\b|\bfalse\b')
+_NORMALIZE_MAP = {'&&': ' and ', '||': ' or ', '!': ' not ', 'true': 'True', 'false': 'False'}
+# Condition spellings that are trivially always true
+_ALWAYS_TRUE_CONDITIONS = frozenset(("1", "true", "(1)", "(true)"))
+# Comparison operator -> (SETcc opcode, swap CMP operands, negate the result)
+_COMPARE_SETCC: Dict[type, Tuple[str, bool, bool]] = {
+    ast.Eq: ("SETZ", False, False),
+    ast.NotEq: ("SETNZ", False, False),
+    ast.Lt: ("SETL", False, False),
+    ast.Gt: ("SETL", True, False),
+    ast.GtE: ("SETL", False, True),
+    ast.LtE: ("SETL", True, True),
+}
+# Marks a node missing from the constant-value cache (None is a cached "not constant")
+_NOT_CACHED = object()
+# Binary operator -> register-register mnemonic; DIV and MOD get a zero-divisor check first
+_BINOP_MNEMONIC: Dict[type, str] = {
+    ast.Add: "ADD", ast.Sub: "SUB", ast.Mult: "MUL", ast.Div: "DIV", ast.FloorDiv: "DIV",
+    ast.Mod: "MOD", ast.BitAnd: "AND", ast.BitOr: "OR", ast.BitXor: "XOR",
+    ast.LShift: "SHL", ast.RShift: "SHR",
+}
+# Mnemonics whose CPU handler reads a sign-extended imm16 when the source field is 0x0F,
+# so a 16-bit constant right operand needs no register
+_IMMEDIATE_BINOPS = frozenset(("ADD", "SUB", "MUL", "AND", "OR", "XOR", "SHL", "SHR"))
+# Compound assignment operator -> its immediate-capable mnemonic
+_COMPOUND_IMMEDIATE_OPS: Dict[str, str] = {
+    "+=": "ADD", "-=": "SUB", "*=": "MUL", "* =": "MUL", "&=": "AND", "|=": "OR",
+    "^=": "XOR", "<<=": "SHL", ">>=": "SHR", ">> =": "SHR",
+}
+# Binary operator -> compile-time evaluator. A zero divisor raises ZeroDivisionError and
+# a negative shift count ValueError, which the callers turn into "not constant" or an error.
+_BINOP_FOLDERS: Dict[type, Callable[[int, int], int]] = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.Div: operator.floordiv, ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod,
+    ast.BitAnd: operator.and_, ast.BitOr: operator.or_, ast.BitXor: operator.xor,
+    ast.LShift: operator.lshift, ast.RShift: operator.rshift,
+}
+# Unary operator -> compile-time evaluator; logical not is lowered separately
+_UNARY_FOLDERS: Dict[type, Callable[[int], int]] = {
+    ast.UAdd: operator.pos, ast.USub: operator.neg, ast.Invert: operator.invert,
+}
+# Counted for-loop headers considered for unrolling: init, condition and step
+_RE_UNROLL_INIT = re.compile(r'(?:int\s+)?([A-Za-z_]\w*)\s*=\s*(.+)$')
+_RE_UNROLL_COND = re.compile(r'([A-Za-z_]\w*)\s*(<=?)\s*(.+)$')
+_RE_UNROLL_STEP = re.compile(r'(?:([A-Za-z_]\w*)\s*\+\+|\+\+\s*([A-Za-z_]\w*)|([A-Za-z_]\w*)\s*\+=\s*1)$')
+# for (int i = C; i < bound; i++): the counter is compared and stepped in its own register
+_RE_FOR_SIMPLE = re.compile(
+    r'\s*((?:int\s+)?([A-Za-z_]\w*)\s*=\s*-?\d+)\s*;\s*\2\s*(<=|>=|==|!=|<|>)\s*(.+?)\s*;'
+    r'\s*(?:\2\s*(\+\+|--)|(\+\+|--)\s*\2)\s*$')
+# Loop bodies containing any of these are never unrolled
+_RE_UNROLL_BLOCKER = re.compile(r'\b(?:break|continue|asm|int|float|bool|char|const|class|struct)\b')
+# Scanner tokens: each pattern matches only the characters its parser cares about, so
+# runs of ordinary characters are skipped inside the regex engine.
+_RE_STRING_LITERAL = re.compile(r'"(?:[^"\\]|\\.)*"', re.DOTALL)
+_RE_ARG_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"?|[(),]', re.DOTALL)
+_RE_PAREN_TOKEN = re.compile(r'[()]')
+_RE_BRACE_TOKEN = re.compile(r'[{}]')
+_RE_TERNARY_TOKEN = re.compile(r'\\.|["\'()?:]', re.DOTALL)
+# Instruction line templates for the shared intrinsic handlers; the opcode is a runtime
+# value there, so %-formatting a fixed template replaces building a fresh f-string.
+_T_OP1 = "    %s %s"
+_T_OP2 = "    %s %s, %s"
+_T_OP3 = "    %s %s, %s, %s"
+# Interned register names; register pools and fixed-register argument lists are built
+# from these so every register string the compiler passes around is one shared object.
+_REGS = tuple(sys.intern(f"R{i}") for i in range(16))
+# Coordinate registers read by the LINE/RECT/FILLRECT/CIRCLE/FILLCIRCLE opcodes
+_DRAW_COORD_REGS = _REGS[:4]
+# Prebuilt "OP dst, src" lines for every register pair of the register-register forms
+# emitted per expression node (16 x 16 entries per mnemonic)
+_REG_OP_LINES: Dict[str, Dict[Tuple[str, str], str]] = {
+    mnemonic: {(dst, src): _T_OP2 % (mnemonic, dst, src) for dst in _REGS for src in _REGS}
+    for mnemonic in (*dict.fromkeys(_BINOP_MNEMONIC.values()), "MOV", "CMP")
+}
+_MOV_LINES = _REG_OP_LINES["MOV"]
+_CMP_LINES = _REG_OP_LINES["CMP"]
+# Tails shared by the intrinsic handlers: the 0 result of void-like calls and the copy
+# of an R0 result into the target register
+_LOADI_ZERO_LINES: Dict[str, str] = {reg: f"    LOADI {reg}, 0" for reg in _REGS}
+_MOV_FROM_R0_LINES: Dict[str, str] = {reg: _MOV_LINES[reg, _REGS[0]] for reg in _REGS}
+
+
+def _structural_key(node: ast.AST) -> Tuple[Any, ...]:
+    """Hashable key that is equal for structurally identical AST subtrees.
+
+    Computed once per node and cached on it as ``_skey``, so repeated CSE lookups
+    on the same argument cost a getattr instead of an ast.dump string.
+    """
+    key = getattr(node, "_skey", None)
+    if key is None:
+        parts: List[Any] = [type(node)]
+        for _, value in ast.iter_fields(node):
+            if isinstance(value, ast.AST):
+                parts.append(_structural_key(value))
+            elif isinstance(value, list):
+                parts.append(tuple(_structural_key(v) if isinstance(v, ast.AST) else v for v in value))
+            else:
+                # Keep the type so 1, 1.0 and True stay distinct, as they do in ast.dump
+                parts.append((type(value), value))
+        key = tuple(parts)
+        node._skey = key
+    return key
+
+
+def _fold_crc32(value: int) -> int:
+    crc = 0xFFFFFFFF
+    for _ in range(32):
+        crc = (crc >> 1) ^ 0xEDB88320 if (crc ^ value) & 1 else crc >> 1
+        value >>= 1
+    return crc ^ 0xFFFFFFFF
+
+
+# Compile-time evaluators for the side-effect-free intrinsics, mirroring the CPU opcode
+# handlers: arguments arrive as unsigned 32-bit register values and the result is masked
+# back to one. rand/gettime/get_input and anything touching memory are deliberately absent.
+_INTRINSIC_FOLDERS: Dict[Tuple[str, int], Callable[..., int]] = {
+    ("abs", 1): lambda x: abs(to_signed32(x)),
+    ("min", 2): lambda a, b: min(to_signed32(a), to_signed32(b)),
+    ("max", 2): lambda a, b: max(to_signed32(a), to_signed32(b)),
+    ("sqrt", 1): lambda x: int(math.sqrt(abs(to_signed32(x)))),
+    ("pow", 2): lambda a, b: int(math.pow(to_signed32(a), to_signed32(b))),
+    ("log", 1): lambda x: int(math.log(abs(to_signed32(x)) + 1)),
+    ("exp", 1): lambda x: int(math.exp(to_signed32(x))),
+    ("sin", 1): lambda x: int(math.sin(to_signed32(x)) * 1000),
+    ("cos", 1): lambda x: int(math.cos(to_signed32(x)) * 1000),
+    ("tan", 1): lambda x: int(math.tan(to_signed32(x)) * 1000),
+    ("sign", 1): lambda x: (to_signed32(x) > 0) - (to_signed32(x) < 0),
+    ("saturate", 1): lambda x: max(0, min(255, to_signed32(x))),
+    ("clamp01", 1): lambda x: max(0, min(1, to_signed32(x))),
+    ("popcount", 1): lambda x: bin(x).count("1"),
+    ("popcnt", 1): lambda x: bin(x).count("1"),
+    ("lzcnt", 1): lambda x: 32 - x.bit_length(),
+    ("clz", 1): lambda x: 32 - x.bit_length(),
+    ("tzcnt", 1): lambda x: (x & -x).bit_length() - 1 if x else 32,
+    ("ctz", 1): lambda x: (x & -x).bit_length() - 1 if x else 32,
+    ("bswap", 1): lambda x: int.from_bytes(x.to_bytes(4, "little"), "big"),
+    ("crc32", 1): _fold_crc32,
+}
+
+@functools.lru_cache(maxsize=4096)
+def _parse_normalized_expression(normalized: str) -> ast.expr:
+    """Parse normalized expression text; the trees are shared by every compiler."""
+    # Code generation only reads the trees, so sharing them across compiles is safe
+    return ast.parse(normalized, mode="eval").body
+
+
+def _peephole(code: List[str]) -> List[str]:
+    """Drop redundant instructions from one statement's emitted lines.
+
+    Removes MOV X, X, a JMP to the label that immediately follows it, and the
+    CMP r, 0 / SETNZ r coercion of a register a SETcc has just set to 0/1 (kept
+    when a conditional branch reads the flags of that CMP).
+    """
+    out: List[str] = []
+    last = len(code) - 1
+    i = 0
+    while i <= last:
+        line = code[i]
+        op, _, operands = line.strip().partition(" ")
+        if op == "MOV":
+            dst, _, src = operands.partition(",")
+            if dst.strip() == src.strip():
+                i += 1
+                continue
+        elif op == "JMP":
+            if i < last and code[i + 1].strip() == operands.strip() + ":":
+                i += 1
+                continue
+        elif op == "CMP" and i < last and out:
+            reg, _, rhs = operands.partition(",")
+            reg = reg.strip()
+            if (rhs.strip() == "0" and code[i + 1].strip() == f"SETNZ {reg}"
+                    and out[-1].strip().startswith("SET")
+                    and out[-1].strip().partition(" ")[2] == reg
+                    and (i + 1 == last or not code[i + 2].lstrip().startswith("J"))):
+                i += 2
+                continue
+        out.append(line)
+        i += 1
+    return out
+
+
 class CppCompilerError(Exception):
     """Raised when the C++ compiler encounters an error."""
 
 
+def _unroll_limit_from_env(default: int = 4) -> int:
+    """Read SIMPLEOS_UNROLL; a malformed value warns and keeps the default."""
+    raw = os.environ.get("SIMPLEOS_UNROLL")
+    if raw is None:
+        return default
+    try:
+        limit = int(raw)
+    except ValueError:
+        logger.warning("Ignoring SIMPLEOS_UNROLL=%r: not an integer, using %d", raw, default)
+        return default
+    return max(limit, 0)
+
+
 class CppCompiler:
     """
     Extremely small C++ compiler that supports a subset of the language:
@@ -5502,11 +5828,133 @@ class CppCompiler:
     """
     def __init__(self, assembler_factory: Callable[[], Assembler] = None):
         self.assembler_factory = assembler_factory or Assembler
+        # Optional text stream that receives the complete assembly listing once compile()
+        # has translated every statement without errors
+        self.output_stream: Optional[IO[str]] = None
+        # Leading keyword -> (translator, statement returns) used by _translate_statement
+        self._keyword_translators: Dict[str, Tuple[Callable[[str], List[str]], bool]] = {
+            "class": (self._compile_class_definition, False),
+            "struct": (self._compile_class_definition, False),
+            "printf": (self._translate_printf, False),
+            "switch": (self._translate_switch, False),
+            "return": (self._translate_return, True),
+            "if": (self._translate_if, False),
+            "while": (self._translate_while, False),
+            "for": (self._translate_for, False),
+            "do": (self._translate_do_while, False),
+            "asm": (self._translate_inline_asm, False),
+            "break": (lambda stmt: self._translate_break(), False),
+            "continue": (lambda stmt: self._translate_continue(), False),
+        }
+        # type(node) -> emitter(node, target, code) for expressions that do not fold to a constant
+        self._expression_emitters: Dict[type, Callable[[Any, str, List[str]], None]] = {
+            ast.Constant: self._emit_expr_constant,
+            ast.UnaryOp: self._emit_expr_unary,
+            ast.Subscript: self._emit_expr_subscript,
+            ast.Name: self._emit_expr_name,
+            ast.IfExp: self._emit_expr_ifexp,
+            ast.Compare: self._emit_expr_compare,
+            ast.BoolOp: self._emit_expr_boolop,
+            ast.Call: self._emit_expr_call,
+            ast.BinOp: self._emit_expr_binop,
+        }
+        # (name, argc) -> handler(args, target, code) for intrinsic calls inside expressions;
+        # shared handlers are specialised on their opcode with functools.partial
+        partial = functools.partial
+        unary, in_place, binary = self._emit_intrinsic_unary, self._emit_intrinsic_in_place, self._emit_intrinsic_binary
+        self._intrinsics: Dict[Tuple[str, int], Callable[[List[ast.expr], str, List[str]], None]] = {
+            # Math helpers mapped directly to CPU opcodes
+            ("abs", 1): partial(unary, "ABS"),
+            ("min", 2): partial(binary, "MIN"),
+            ("max", 2): partial(binary, "MAX"),
+            ("sqrt", 1): partial(unary, "SQRT"),
+            ("pow", 2): self._emit_intrinsic_pow,
+            ("log", 1): partial(unary, "LOG"),
+            ("exp", 1): partial(unary, "EXP"),
+            ("sin", 1): partial(unary, "SIN"),
+            ("cos", 1): partial(unary, "COS"),
+            ("tan", 1): partial(unary, "TAN"),
+            ("mad", 3): self._emit_intrinsic_mad,
+            ("avg", 2): self._emit_intrinsic_avg,
+            ("absdiff", 2): self._emit_intrinsic_absdiff,
+            ("max3", 3): self._emit_intrinsic_max3,
+            ("min3", 3): self._emit_intrinsic_min3,
+            ("clamp", 3): self._emit_intrinsic_clamp,
+            ("smoothstep", 3): self._emit_intrinsic_smoothstep,
+            ("wrap", 3): self._emit_intrinsic_wrap,
+            ("move_towards", 3): self._emit_intrinsic_move_towards,
+            ("lerp", 3): self._emit_intrinsic_lerp,
+            ("lerp_int", 3): self._emit_intrinsic_lerp,
+            ("sign", 1): partial(in_place, "SIGN"),
+            ("saturate", 1): partial(in_place, "SATURATE"),
+            ("clamp01", 1): partial(in_place, "CLAMP01"),
+            # Random numbers
+            ("rand", 0): self._emit_intrinsic_rand,
+            ("rand_range", 2): self._emit_intrinsic_rand_range,
+            ("srand", 1): self._emit_intrinsic_srand,
+            # Bit manipulation
+            ("hash", 1): partial(unary, "HASH"),
+            ("crc32", 1): partial(unary, "CRC32"),
+            ("popcount", 1): partial(unary, "POPCOUNT"),
+            ("popcnt", 1): partial(unary, "POPCNT"),
+            ("lzcnt", 1): partial(unary, "LZCNT"),
+            ("clz", 1): partial(unary, "LZCNT"),
+            ("tzcnt", 1): partial(unary, "TZCNT"),
+            ("ctz", 1): partial(unary, "TZCNT"),
+            ("bsf", 1): partial(unary, "BSF"),
+            ("bsr", 1): partial(unary, "BSR"),
+            ("bswap", 1): partial(unary, "BSWAP"),
+            ("reverse", 1): partial(unary, "REVERSE"),
+            ("lowbit", 1): self._emit_intrinsic_lowbit,
+            ("is_pow2", 1): self._emit_intrinsic_is_pow2,
+            ("mul_high", 2): partial(binary, "MULH"),
+            ("divmod_q", 2): partial(binary, "DIVMOD"),
+            ("rotl", 2): partial(self._emit_intrinsic_rotate, "ROL"),
+            ("rotr", 2): partial(self._emit_intrinsic_rotate, "ROR"),
+            # Game/demo utilities and interactive I/O
+            ("sleep", 1): self._emit_intrinsic_sleep,
+            ("get_input", 0): self._emit_intrinsic_get_input,
+            ("get_string", 1): self._emit_intrinsic_get_string,
+            ("gettime", 0): self._emit_intrinsic_gettime,
+            ("swap", 2): self._emit_intrinsic_swap,
+            ("assert_true", 2): self._emit_intrinsic_assert_true,
+            ("assert_eq", 3): self._emit_intrinsic_assert_eq,
+            # Strings and memory
+            ("strlen", 1): partial(unary, "STRLEN"),
+            ("atoi", 1): partial(unary, "ATOI"),
+            ("strcmp", 2): partial(self._emit_intrinsic_string_query, "STRCMP"),
+            ("strchr", 2): partial(self._emit_intrinsic_string_query, "STRCHR"),
+            ("strstr", 2): partial(self._emit_intrinsic_string_query, "STRSTR"),
+            ("strncat", 3): partial(self._emit_intrinsic_block_op, "STRNCAT"),
+            ("strncpy", 3): partial(self._emit_intrinsic_block_op, "STRNCPY"),
+            ("memset", 3): partial(self._emit_intrinsic_block_op, "MEMSET"),
+            ("memcpy", 3): partial(self._emit_intrinsic_block_op, "MEMCPY"),
+            ("memcmp", 3): self._emit_intrinsic_memcmp,
+            ("memchr", 3): self._emit_intrinsic_memchr,
+            ("memscrub", 2): self._emit_intrinsic_memscrub,
+            ("revmem", 2): self._emit_intrinsic_revmem,
+            ("crc32_buf", 2): self._emit_intrinsic_crc32_buf,
+            # Arrays and structs
+            ("array_len", 1): self._emit_intrinsic_array_len,
+            ("array_fill", 2): self._emit_intrinsic_array_fill,
+            ("array_copy", 2): self._emit_intrinsic_array_copy,
+            ("struct_size", 1): self._emit_intrinsic_struct_size,
+            ("offsetof", 2): self._emit_intrinsic_offsetof,
+            # Graphics
+            ("pixel", 3): self._emit_intrinsic_pixel,
+            ("line", 5): partial(self._emit_intrinsic_draw, "LINE"),
+            ("rect", 5): partial(self._emit_intrinsic_draw, "RECT"),
+            ("fillrect", 5): partial(self._emit_intrinsic_draw, "FILLRECT"),
+            ("circle", 4): partial(self._emit_intrinsic_draw, "CIRCLE"),
+            ("fillcircle", 4): partial(self._emit_intrinsic_draw, "FILLCIRCLE"),
+            ("getpixel", 2): self._emit_intrinsic_getpixel,
+            ("clear", 1): self._emit_intrinsic_clear,
+        }
         self.reset()
 
     def reset(self):
         self.string_literals: List[Tuple[str, str]] = []
-        self._string_map: Dict[str, str] = {}
+        self._string_map: Dict[str, Tuple[str, int]] = {}
         self.functions: Dict[str, Dict[str, Any]] = {}
         self.warnings: List[str] = []
         self.errors: List[str] = []  # Track compilation errors
@@ -5518,14 +5966,18 @@ class CppCompiler:
         self.struct_instances: Dict[str, Dict[str, Any]] = {}
         self.struct_pointers: Dict[str, str] = {}
         # Registers dedicated to holding cas++ variables in main(). Avoid R0-R3 (syscalls/return),
-        # R13 (kernel), R14 (SP), and R15 (PC).
-        self.var_register_pool: List[str] = ["R4", "R5", "R6", "R7", "R8", "R9", "R10", "R11", "R12"]
+        # R13 (kernel), R14 (SP), and R15 (PC). Handed out first-in first-out, hence a deque.
+        self.var_register_pool: deque = deque(_REGS[4:13])
         # Temporary registers for expression evaluation. These are caller/callee-clobbered and never
         # used to hold persistent variables or stack pointers.
-        self.temp_register_pool: List[str] = ["R13", "R3", "R2", "R1"]
+        self.temp_register_pool: List[str] = [_REGS[13], _REGS[3], _REGS[2], _REGS[1]]
         self.includes: List[str] = []
         self.label_counter = 0
-        self.loop_stack: List[Dict[str, str]] = []
+        # Loop frames carry break/continue labels; loop (not switch) frames also carry a
+        # "preheader" list and "invariant_regs" (array base address -> hoisted register)
+        self.loop_stack: List[Dict[str, Any]] = []
+        # Bumped whenever the var register pool changes so cached code can't go stale
+        self._var_pool_generation = 0
         # Class support
         self.class_definitions: Dict[str, Dict[str, Any]] = {}
         self.class_instances: Dict[str, str] = {}
@@ -5535,12 +5987,17 @@ class CppCompiler:
         self.array_base_addr = 0x2000  # Base address for array storage
         # Performance optimization
         self._expression_cache: Dict[str, Any] = {}  # Cache parsed expressions
-        self._temp_register_stack: List[str] = []  # Track temp register usage
+        self._ternary_cache: Dict[str, str] = {}  # C ternary -> Python if-expression
+        self._condition_code_cache: Dict[Tuple, Tuple[Tuple[str, ...], str]] = {}  # Cache emitted conditions
+        self._const_cache: Dict[ast.AST, Optional[int]] = {}  # Folded value per expression node
+        self._unrolled_counters: Dict[str, int] = {}  # Loop counter -> value in the copy being compiled
+        self._temp_register_stack: set = set()  # Track temp registers in use
         # Debug support
         self.current_line: int = 0  # Track current line for error reporting
         self.source_lines: List[str] = []  # Store source for error context
         self.debug_enabled: bool = False  # When True, emit extra debug logging
-        self.debug_messages: List[str] = []
+        # (level, %-format, args) records, formatted only by get_debug_messages()
+        self.debug_messages: List[Tuple[str, str, Tuple[Any, ...]]] = []
         # Statistics
         self.stats = {
             "expressions_cached": 0,
@@ -5549,23 +6006,34 @@ class CppCompiler:
         }
 
     PROGRAM_BASE = 0x1000
+    # Counted for-loops with at most this many iterations are fully unrolled
+    UNROLL_LIMIT = _unroll_limit_from_env()
+
+    def log(self, message: str, *args: Any, level: str = "DEBUG"):
+        """Record a debug message and optionally emit via logger when enabled.
 
-    def log(self, message: str, level: str = "DEBUG"):
-        """Record a debug message and optionally emit via logger when enabled."""
+        `message` is a %-format applied to `args` only when the message is read,
+        so records nobody looks at cost no string formatting.
+        """
         try:
-            self.debug_messages.append(f"{level}: {message}")
+            self.debug_messages.append((level, message, args))
         except Exception:
             pass
         if not getattr(self, "debug_enabled", False):
             return
         if level == "DEBUG":
-            logger.debug("cas++: %s", message)
+            logger.debug("cas++: " + message, *args)
         elif level == "INFO":
-            logger.info("cas++: %s", message)
+            logger.info("cas++: " + message, *args)
         elif level == "WARN" or level == "WARNING":
-            logger.warning("cas++: %s", message)
+            logger.warning("cas++: " + message, *args)
         elif level == "ERROR":
-            logger.error("cas++: %s", message)
+            logger.error("cas++: " + message, *args)
+
+    def get_debug_messages(self) -> List[str]:
+        """Get the recorded debug messages as "LEVEL: text" lines"""
+        return [f"{level}: {message % args if args else message}"
+                for level, message, args in self.debug_messages]
 
     def compile(self, code: str, auto_fix_suggestions: bool = False, save_patch_path: Optional[str] = None) -> bytes:
         """Compile C++-like source to binary.
@@ -5579,7 +6047,7 @@ class CppCompiler:
         # Store source lines for error reporting
         self.source_lines = code.split('\n')
         # Debug information about this compilation
-        self.log(f"compile_start: lines={len(self.source_lines)} auto_fix={auto_fix_suggestions}", "INFO")
+        self.log("compile_start: lines=%d auto_fix=%s", len(self.source_lines), auto_fix_suggestions, level="INFO")
         
         try:
             cleaned = self._strip_comments(code)
@@ -5593,13 +6061,17 @@ class CppCompiler:
             
             body = self._extract_main_body(cleaned)
             statements = self._split_statements(body)
-            self.log(f"statements_count: {len(statements)}", "DEBUG")
+            self.log("statements_count: %d", len(statements))
             
-            assembly_lines = [
-                "; Generated by cas++ compiler",
-                f".org 0x{self.PROGRAM_BASE:04x}",
-                "main:"
-            ]
+            # Each statement's lines are written as soon as they are translated
+            # instead of growing one list for the whole program
+            assembly = io.StringIO()
+
+            def write_lines(lines: List[str]) -> None:
+                if lines:
+                    assembly.write("\n" + "\n".join(lines))
+
+            assembly.write(f"; Generated by cas++ compiler\n.org 0x{self.PROGRAM_BASE:04x}\nmain:")
             
             has_return = False
             for i, stmt in enumerate(statements):
@@ -5611,7 +6083,7 @@ class CppCompiler:
                 
                 try:
                     translated, returns = self._translate_statement(stmt)
-                    assembly_lines.extend(translated)
+                    write_lines(_peephole(translated))
                     if returns:
                         has_return = True
                 except CppCompilerError as e:
@@ -5621,13 +6093,13 @@ class CppCompiler:
                     
             # Check if we had any errors
             if self.errors:
-                self.log(f"compile_failed: errors={len(self.errors)}", "ERROR")
+                self.log("compile_failed: errors=%d", len(self.errors), level="ERROR")
                 error_msg = "Compilation failed with errors:\n" + "\n".join(self.errors)
                 raise CppCompilerError(error_msg)
             
             if not has_return:
-                assembly_lines.append("    LOADI R0, 0")
-            assembly_lines.append("    HALT")
+                write_lines(["    LOADI R0, 0"])
+            write_lines(["    HALT"])
             
         except CppCompilerError:
             raise  # Re-raise compiler errors
@@ -5635,22 +6107,24 @@ class CppCompiler:
             # Catch unexpected errors and provide context
             raise CppCompilerError(f"Unexpected error at line {self.current_line}: {e}") from e
         if self.string_literals:
-            assembly_lines.append("")
-            assembly_lines.append("; --- cas++ string literals ---")
+            write_lines(["", "; --- cas++ string literals ---"])
             for label, text in self.string_literals:
-                assembly_lines.append(f"{label}:")
-                assembly_lines.append(f"    .string {self._escape_string(text)}")
-        self.last_assembly = "\n".join(assembly_lines)
+                write_lines([f"{label}:", f"    .string {self._escape_string(text)}"])
+        self.last_assembly = assembly.getvalue()
+        # Only a listing that translated cleanly reaches output_stream, so a failed
+        # compile never leaves a partial program there
+        if self.output_stream is not None:
+            self.output_stream.write(self.last_assembly)
         assembler = self.assembler_factory()
         try:
             binary = assembler.assemble(self.last_assembly)
         except AssemblerError as exc:
-            self.log(f"assembler_error: {exc}", "ERROR")
+            self.log("assembler_error: %s", str(exc), level="ERROR")
             raise CppCompilerError(str(exc)) from exc
         if self.PROGRAM_BASE and len(binary) > self.PROGRAM_BASE:
             binary = binary[self.PROGRAM_BASE:]
         self.functions["main"] = {"statements": len(statements)}
-        self.log("compile_success", "INFO")
+        self.log("compile_success", level="INFO")
         return binary
 
     def _suggest_and_fix_misspells(self, src: str, auto_fix: bool = False, save_patch_path: Optional[str] = None) -> str:
@@ -5691,7 +6165,7 @@ class CppCompiler:
             accept = False
             if auto_fix:
                 accept = True
-                self.log(f"auto-fix: {name} -> {suggestion}", "INFO")
+                self.log("auto-fix: %s -> %s", name, suggestion, level="INFO")
             else:
                 try:
                     resp = input(prompt).strip().lower()
@@ -5702,7 +6176,7 @@ class CppCompiler:
                 # Replace occurrences of name followed by optional whitespace and '('
                 src = re.sub(rf'\b{re.escape(name)}(\s*)\(', rf'{suggestion}\1(', src)
                 applied_any = True
-                self.log(f"applied_fix: {name} -> {suggestion}", "INFO")
+                self.log("applied_fix: %s -> %s", name, suggestion, level="INFO")
 
         # If requested, write a unified diff patch file comparing original->modified
         if applied_any and save_patch_path:
@@ -5713,9 +6187,9 @@ class CppCompiler:
                 nd = src.splitlines(keepends=True)
                 diff_lines = list(difflib.unified_diff(od, nd, fromfile='original', tofile='fixed'))
                 Path(save_patch_path).write_text(''.join(diff_lines))
-                self.log(f"wrote_patch: {save_patch_path}", "INFO")
+                self.log("wrote_patch: %s", save_patch_path, level="INFO")
             except Exception as e:
-                self.log(f"failed_write_patch: {e}", "WARN")
+                self.log("failed_write_patch: %s", str(e), level="WARN")
 
         return src
 
@@ -5830,7 +6304,7 @@ class CppCompiler:
         class_text = class_text.rstrip(';').strip()
         
         # Extract class/struct name and body
-        match = re.match(r'(class|struct)\s+([A-Za-z_]\w*)\s*\{(.+)\}', class_text, re.DOTALL)
+        match = _RE_CLASS_DEF.match(class_text)
         if not match:
             raise CppCompilerError(f"Invalid class definition")
         
@@ -5841,18 +6315,11 @@ class CppCompiler:
             raise CppCompilerError(f"Class '{class_name}' already defined")
         
         # Parse class members
-        members = []
-        for line in body.split(';'):
-            line = line.strip()
-            if not line:
-                continue
-            # Look for member variable declarations
-            m = re.match(r'(int|float|bool|char)\s+([A-Za-z_]\w*)', line)
-            if m:
-                members.append({
-                    "type": m.group(1),
-                    "name": m.group(2)
-                })
+        # One scan over the body instead of splitting it into statements
+        members = [
+            {"type": m.group(1), "name": m.group(2)}
+            for m in _RE_MEMBER_DECL.finditer(body)
+        ]
         
         self.class_definitions[class_name] = {
             "members": members,
@@ -5894,156 +6361,133 @@ class CppCompiler:
             i += 1
         raise CppCompilerError("Unterminated main() body")
 
-    def _split_statements(self, body: str) -> List[str]:
-        statements: List[str] = []
-        current: List[str] = []
+    @staticmethod
+    def _statement_spans(data: bytes) -> List[Tuple[int, int]]:
+        """Scan encoded body once and return (start, end) offsets of each top-level statement."""
+        spans: List[Tuple[int, int]] = []
+        action = _CHAR_ACTION
+        brace_delta = _BRACE_DELTA
+        paren_delta = _PAREN_DELTA
+        start = 0
         in_string = False
         escape = False
         brace_depth = 0
         paren_depth = 0
-        for ch in body:
+        for i, b in enumerate(data):
+            a = action[b]
             if in_string:
-                current.append(ch)
                 if escape:
                     escape = False
-                elif ch == '\\':
+                elif a == _ACT_ESCAPE:
                     escape = True
-                elif ch == '"':
+                elif a == _ACT_QUOTE:
                     in_string = False
                 continue
-            if ch == '"':
-                in_string = True
-                current.append(ch)
-                continue
-            if ch == '(':
-                paren_depth += 1
-            elif ch == ')':
-                if paren_depth > 0:
-                    paren_depth -= 1
-            if ch == '{':
-                brace_depth += 1
-                current.append(ch)
-                continue
-            if ch == '}':
-                current.append(ch)
-                if brace_depth > 0:
-                    brace_depth -= 1
-                if brace_depth == 0 and current:
-                    statements.append("".join(current))
-                    current = []
+            if not a:
                 continue
-            if ch == ';' and brace_depth == 0 and paren_depth == 0:
-                statements.append("".join(current))
-                current = []
-            else:
-                current.append(ch)
-        if current:
-            statements.append("".join(current))
+            brace_depth += brace_delta[a]
+            paren_depth += paren_delta[a]
+            if a == _ACT_QUOTE:
+                in_string = True
+            elif a == _ACT_RBRACE:
+                # Unbalanced closers clamp at zero; closing to zero ends a block statement
+                if brace_depth <= 0:
+                    brace_depth = 0
+                    spans.append((start, i + 1))
+                    start = i + 1
+            elif a == _ACT_RPAREN:
+                if paren_depth < 0:
+                    paren_depth = 0
+            elif a == _ACT_SEMI and brace_depth == 0 and paren_depth == 0:
+                spans.append((start, i))
+                start = i + 1
+        if start < len(data):
+            spans.append((start, len(data)))
+        return spans
+
+    def _split_statements(self, body: str) -> List[str]:
+        # Slice statements out of the source by offset instead of rebuilding them char by char.
+        # Multi-byte UTF-8 sequences never map to an action, so byte offsets are safe to use.
+        data = body.encode("utf-8", "surrogatepass")
+        spans = self._statement_spans(data)
+        if len(data) == len(body):
+            statements = [body[start:end] for start, end in spans]
+        else:
+            statements = [data[start:end].decode("utf-8", "surrogatepass") for start, end in spans]
         merged: List[str] = []
+        # Whether merged[-1] opens with "do"; appending a tail never changes its prefix
+        last_is_do = False
+        # Whether merged[-1] ends with a space; a merged tail is stripped, so it never does
+        last_ends_with_space = False
         for stmt in statements:
             stripped = stmt.strip()
             if stripped.startswith("else"):
                 if merged:
-                    merged[-1] += (" " if not merged[-1].endswith(" ") else "") + stripped
+                    merged[-1] += ("" if last_ends_with_space else " ") + stripped
+                    last_ends_with_space = False
                 else:
                     merged.append(stmt)
-            elif stripped.startswith("while") and merged and merged[-1].lstrip().startswith("do"):
-                merged[-1] += (" " if not merged[-1].endswith(" ") else "") + stripped
+                    last_is_do = False
+                    last_ends_with_space = stmt.endswith(" ")
+            elif last_is_do and stripped.startswith("while"):
+                merged[-1] += ("" if last_ends_with_space else " ") + stripped
+                last_ends_with_space = False
             else:
                 merged.append(stmt)
+                last_is_do = stripped.startswith("do")
+                last_ends_with_space = stmt.endswith(" ")
         return merged
 
     def _translate_statement(self, stmt: str) -> Tuple[List[str], bool]:
         stmt = stmt.strip()
         if not stmt:
             return [], False
-        # ++i, i++, --i, i-- as standalone statements
-        incdec_code = self._compile_incdec_statement(stmt)
-        if incdec_code is not None:
-            return incdec_code, False
-        if stmt.startswith("class ") or stmt.startswith("struct "):
-            return self._compile_class_definition(stmt), False
-        # Match printf( at word boundary, not printf_int or other variants
-        if re.match(r'^printf\s*\(', stmt):
-            return self._translate_printf(stmt), False
-        if re.match(r"switch\b", stmt):
-            return self._translate_switch(stmt), False
-        if stmt.startswith("return"):
-            return self._translate_return(stmt), True
-        if stmt.startswith("if"):
-            return self._translate_if(stmt), False
-        if stmt.startswith("while"):
-            return self._translate_while(stmt), False
-        if re.match(r'(?:const\s+)?(?:int|float|bool|char)\s+', stmt):
-            # Check if it's an array declaration (but not array access in initialization)
-            # Array declaration: int arr[5]; or int arr[5] = {...}
-            # Not array access: int x = arr[1];
-            if '[' in stmt and ']' in stmt and '=' not in stmt.split('[')[0]:
-                return self._compile_array_declaration(stmt), False
-            return self._compile_declaration(stmt), False
-        # Compound assignments like a += b, a <<= 1, a %= b, etc.
-        m_comp = re.match(r'^([A-Za-z_]\w*)\s*(\+=|-=|\*=|/=|%=|&=|\|=|\^=|<<=|>>=)\s*(.+)$', stmt.rstrip(';').strip())
-        if m_comp:
-            return self._compile_compound_assignment(m_comp), False
+        kind = self._classify_statement(stmt)
+        if kind is not None:
+            kind, word = kind
+            # ++i, i++, --i, i-- as standalone statements
+            if kind == "incdec":
+                incdec_code = self._compile_incdec_statement(stmt)
+                if incdec_code is not None:
+                    return incdec_code, False
+            # Dispatch on the leading identifier; printf_int, returned, iffy, ... are not
+            # keywords. Control-flow keywords are resolved here, before the assignment
+            # checks below can mistake a body such as "do { a[i] = 1; } while (...)" for
+            # an array store.
+            entry = self._keyword_translators.get(word) if word else None
+            if entry is not None:
+                translator, returns = entry
+                return translator(stmt), returns
+            if kind == "decl":
+                # Check if it's an array declaration (but not array access in initialization)
+                # Array declaration: int arr[5]; or int arr[5] = {...}
+                # Not array access: int x = arr[1];
+                brack = stmt.find('[')
+                if brack != -1 and ']' in stmt and stmt.find('=', 0, brack) == -1:
+                    return self._compile_array_declaration(stmt), False
+                return self._compile_declaration(stmt), False
+            # Compound assignments like a += b, a <<= 1, a %= b, etc.
+            if kind == "compound":
+                m_comp = _RE_COMPOUND_ASSIGN.match(stmt.rstrip(';').strip())
+                if m_comp:
+                    return self._compile_compound_assignment(m_comp), False
         if "=" in stmt:
             lhs = stmt.split("=", 1)[0].strip()
             # Check if it's a simple identifier or array access
             if lhs.isidentifier() or ('[' in lhs and ']' in lhs):
                 return self._compile_assignment(stmt), False
-        if re.fullmatch(r"break\s*;?", stmt):
-            return self._translate_break(), False
-        if re.fullmatch(r"continue\s*;?", stmt):
-            return self._translate_continue(), False
-        # Inline assembly support: asm("instruction");
-        if stmt.startswith("asm"):
-            return self._translate_inline_asm(stmt), False
-        if re.match(r"for\b", stmt):
-            return self._translate_for(stmt), False
-        if re.match(r"do\b", stmt):
-            return self._translate_do_while(stmt), False
         # bare function call like foo() or foo(a,b)
-        mcall = re.fullmatch(r"([A-Za-z_]\w*)\s*\((.*)\)\s*", stmt)
+        mcall = _RE_CALL_STMT.fullmatch(stmt)
         if mcall:
             name = mcall.group(1)
             args_str = mcall.group(2).strip()
             lines: List[str] = []
-            args = [a for a in self._split_arguments(args_str)] if args_str else []
+            args = self._split_arguments(args_str) if args_str else []
             
             # Handle built-in functions that don't return values (statement form)
-            if name == "sleep" and len(args) == 1:
-                node = self._parse_expression_node(args[0])
-                treg = self._acquire_temp_register()
-                lines.extend(self._emit_expression_to_register(node, treg))
-                lines.append(f"    SLEEP R0, {treg}")  # Two operand form
-                self._release_temp_register(treg)
-                return lines, False
-            
-            # printf_int(value) - print integer directly using syscall 50
-            if name == "printf_int" and len(args) == 1:
-                node = self._parse_expression_node(args[0])
-                treg = self._acquire_temp_register()
-                lines.extend(self._emit_expression_to_register(node, treg))
-                lines.append(f"    LOADI R0, 50  ; PRINT_INT syscall")
-                lines.append(f"    MOV R1, {treg}")
-                lines.append(f"    SYSCALL R0")
-                self._release_temp_register(treg)
-                return lines, False
-
-            # strncpy(dest, src, n) - copy n bytes from src to dest
-            if name == "strncpy" and len(args) == 3:
-                node_dst = self._parse_expression_node(args[0])
-                node_src = self._parse_expression_node(args[1])
-                node_cnt = self._parse_expression_node(args[2])
-                dst_reg = self._acquire_temp_register()
-                src_reg = self._acquire_temp_register()
-                cnt_reg = self._acquire_temp_register()
-                lines.extend(self._emit_expression_to_register(node_dst, dst_reg))
-                lines.extend(self._emit_expression_to_register(node_src, src_reg))
-                lines.extend(self._emit_expression_to_register(node_cnt, cnt_reg))
-                lines.append(f"    STRNCPY {dst_reg}, {src_reg}, {cnt_reg}")
-                self._release_temp_register(cnt_reg)
-                self._release_temp_register(src_reg)
-                self._release_temp_register(dst_reg)
+            builtin = _STATEMENT_BUILTINS.get((name, len(args)))
+            if builtin is not None:
+                builtin(self, args, lines)
                 return lines, False
             # Fallback: treat any other bare function call as an expression,
             # As a last resort, try to parse as an expression used as a statement
@@ -6051,333 +6495,40 @@ class CppCompiler:
                 expr_node = self._parse_expression_node(stmt.rstrip(";"))
                 code = []
                 treg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(expr_node, treg))
+                self._emit_expression_into(expr_node, treg, code)
                 self._release_temp_register(treg)
                 return code, False
             except CppCompilerError as e:
                 # Attach statement context to the error for better debugging
                 raise CppCompilerError(f"Error translating call statement '{stmt}': {e}")
 
-            # array_fill(arr, value) as statement form
-            if name == "array_fill" and len(args) == 2:
-                arr_name = args[0].strip()
-                if arr_name not in self.arrays:
-                    raise CppCompilerError("array_fill() first argument must be a declared array")
-                arr_info = self.arrays[arr_name]
-                base_addr = int(arr_info.get("addr", 0))
-                length_elems = int(arr_info.get("size", 0))
-                total_bytes = length_elems * 4
-                if total_bytes <= 0:
-                    return lines, False
-                addr_reg = self._acquire_temp_register()
-                val_reg = self._acquire_temp_register()
-                cnt_reg = self._acquire_temp_register()
-                lines.append(f"    LOADI {addr_reg}, {base_addr}")
-                val_node = self._parse_expression_node(args[1])
-                lines.extend(self._emit_expression_to_register(val_node, val_reg))
-                lines.append(f"    LOADI {cnt_reg}, {total_bytes}")
-                lines.append(f"    MEMSET {addr_reg}, {val_reg}, {cnt_reg}")
-                self._release_temp_register(cnt_reg)
-                self._release_temp_register(val_reg)
-                self._release_temp_register(addr_reg)
-                return lines, False
-
-            # array_zero(arr) as statement shorthand for array_fill(arr, 0)
-            if name == "array_zero" and len(args) == 1:
-                arr_name = args[0].strip()
-                if arr_name not in self.arrays:
-                    raise CppCompilerError("array_zero() requires a declared array")
-                arr_info = self.arrays[arr_name]
-                base_addr = int(arr_info.get("addr", 0))
-                length_elems = int(arr_info.get("size", 0))
-                total_bytes = length_elems * 4
-                if total_bytes <= 0:
-                    return lines, False
-                addr_reg = self._acquire_temp_register()
-                cnt_reg = self._acquire_temp_register()
-                lines.append(f"    LOADI {addr_reg}, {base_addr}")
-                lines.append(f"    LOADI {cnt_reg}, {total_bytes}")
-                lines.append(f"    MEMSET {addr_reg}, R0, {cnt_reg}")  # assumes R0=0 or caller sets
-                self._release_temp_register(cnt_reg)
-                self._release_temp_register(addr_reg)
-                return lines, False
-
-            # array_copy(dst, src) as statement form
-            if name == "array_copy" and len(args) == 2:
-                dst_name = args[0].strip()
-                src_name = args[1].strip()
-                if dst_name not in self.arrays or src_name not in self.arrays:
-                    raise CppCompilerError("array_copy() arguments must be declared arrays")
-                dst_info = self.arrays[dst_name]
-                src_info = self.arrays[src_name]
-                dst_size = int(dst_info.get("size", 0))
-                src_size = int(src_info.get("size", 0))
-                if dst_size != src_size:
-                    raise CppCompilerError("array_copy() requires arrays of the same size")
-                total_bytes = dst_size * 4
-                if total_bytes <= 0:
-                    return lines, False
-                dst_reg = self._acquire_temp_register()
-                src_reg = self._acquire_temp_register()
-                cnt_reg = self._acquire_temp_register()
-                lines.append(f"    LOADI {dst_reg}, {int(dst_info.get('addr', 0))}")
-                lines.append(f"    LOADI {src_reg}, {int(src_info.get('addr', 0))}")
-                lines.append(f"    LOADI {cnt_reg}, {total_bytes}")
-                lines.append(f"    MEMCPY {dst_reg}, {src_reg}, {cnt_reg}")
-                self._release_temp_register(cnt_reg)
-                self._release_temp_register(src_reg)
-                self._release_temp_register(dst_reg)
-                return lines, False
-
-            # strcpy(dest, src) - copy null-terminated string
-            if name == "strcpy" and len(args) == 2:
-                node_dst = self._parse_expression_node(args[0])
-                node_src = self._parse_expression_node(args[1])
-                dst_reg = self._acquire_temp_register()
-                src_reg = self._acquire_temp_register()
-                lines.extend(self._emit_expression_to_register(node_dst, dst_reg))
-                lines.extend(self._emit_expression_to_register(node_src, src_reg))
-                lines.append(f"    STRCPY {dst_reg}, {src_reg}")
-                self._release_temp_register(src_reg)
-                self._release_temp_register(dst_reg)
-                return lines, False
-
-            # strcat(dest, src) - append null-terminated string src to dest
-            if name == "strcat" and len(args) == 2:
-                node_dst = self._parse_expression_node(args[0])
-                node_src = self._parse_expression_node(args[1])
-                dst_reg = self._acquire_temp_register()
-                src_reg = self._acquire_temp_register()
-                lines.extend(self._emit_expression_to_register(node_dst, dst_reg))
-                lines.extend(self._emit_expression_to_register(node_src, src_reg))
-                lines.append(f"    STRCAT {dst_reg}, {src_reg}")
-                self._release_temp_register(src_reg)
-                self._release_temp_register(dst_reg)
-                return lines, False
-
-            # memcpy(dest, src, n) as statement form
-            if name == "memcpy" and len(args) == 3:
-                node_dst = self._parse_expression_node(args[0])
-                node_src = self._parse_expression_node(args[1])
-                node_cnt = self._parse_expression_node(args[2])
-                dst_reg = self._acquire_temp_register()
-                src_reg = self._acquire_temp_register()
-                cnt_reg = self._acquire_temp_register()
-                lines.extend(self._emit_expression_to_register(node_dst, dst_reg))
-                lines.extend(self._emit_expression_to_register(node_src, src_reg))
-                lines.extend(self._emit_expression_to_register(node_cnt, cnt_reg))
-                lines.append(f"    MEMCPY {dst_reg}, {src_reg}, {cnt_reg}")
-                self._release_temp_register(cnt_reg)
-                self._release_temp_register(src_reg)
-                self._release_temp_register(dst_reg)
-                return lines, False
-
-            # memcmp(a, b, n) as statement form (discard result)
-            if name == "memcmp" and len(args) == 3:
-                a_node = self._parse_expression_node(args[0])
-                b_node = self._parse_expression_node(args[1])
-                cnt_node = self._parse_expression_node(args[2])
-                a_reg = self._acquire_temp_register()
-                b_reg = self._acquire_temp_register()
-                cnt_reg = self._acquire_temp_register()
-                lines.extend(self._emit_expression_to_register(a_node, a_reg))
-                lines.extend(self._emit_expression_to_register(b_node, b_reg))
-                lines.extend(self._emit_expression_to_register(cnt_node, cnt_reg))
-                lines.append(f"    CMPS R0, {a_reg}, {b_reg}, {cnt_reg}")
-                self._release_temp_register(cnt_reg)
-                self._release_temp_register(b_reg)
-                self._release_temp_register(a_reg)
-                return lines, False
-
-            # itoa(value, buf, base) as statement form
-            if name == "itoa" and len(args) in (2,3):
-                val_node = self._parse_expression_node(args[0])
-                buf_node = self._parse_expression_node(args[1])
-                base_node = self._parse_expression_node(args[2]) if len(args) == 3 else None
-                val_reg = self._acquire_temp_register()
-                buf_reg = self._acquire_temp_register()
-                lines.extend(self._emit_expression_to_register(val_node, val_reg))
-                lines.extend(self._emit_expression_to_register(buf_node, buf_reg))
-                if base_node:
-                    base_reg = self._acquire_temp_register()
-                    lines.extend(self._emit_expression_to_register(base_node, base_reg))
-                    lines.append(f"    ITOA {buf_reg}, {val_reg}, {base_reg}")
-                    self._release_temp_register(base_reg)
-                else:
-                    lines.append(f"    ITOA {buf_reg}, {val_reg}")
-                self._release_temp_register(buf_reg)
-                self._release_temp_register(val_reg)
-                return lines, False
-
-            # strncat(dest, src, n) - append up to n bytes from src to dest
-            if name == "strncat" and len(args) == 3:
-                node_dst = self._parse_expression_node(args[0])
-                node_src = self._parse_expression_node(args[1])
-                node_cnt = self._parse_expression_node(args[2])
-                dst_reg = self._acquire_temp_register()
-                src_reg = self._acquire_temp_register()
-                cnt_reg = self._acquire_temp_register()
-                lines.extend(self._emit_expression_to_register(node_dst, dst_reg))
-                lines.extend(self._emit_expression_to_register(node_src, src_reg))
-                lines.extend(self._emit_expression_to_register(node_cnt, cnt_reg))
-                lines.append(f"    STRNCAT {dst_reg}, {src_reg}, {cnt_reg}")
-                self._release_temp_register(cnt_reg)
-                self._release_temp_register(src_reg)
-                self._release_temp_register(dst_reg)
-                return lines, False
-
-            # strchr(hay, needle) as statement form - call and discard return
-            if name == "strchr" and len(args) == 2:
-                node_hay = self._parse_expression_node(args[0])
-                node_needle = self._parse_expression_node(args[1])
-                hay_reg = self._acquire_temp_register()
-                needle_reg = self._acquire_temp_register()
-                lines.extend(self._emit_expression_to_register(node_hay, hay_reg))
-                lines.extend(self._emit_expression_to_register(node_needle, needle_reg))
-                # Use STRCHR opcode (result in R0) but we ignore it for statement
-                lines.append(f"    STRCHR R0, {hay_reg}, {needle_reg}")
-                self._release_temp_register(needle_reg)
-                self._release_temp_register(hay_reg)
-                return lines, False
-
-            # memchr(base, byte, n) as statement form (discard result)
-            if name == "memchr" and len(args) == 3:
-                base_node = self._parse_expression_node(args[0])
-                byte_node = self._parse_expression_node(args[1])
-                cnt_node = self._parse_expression_node(args[2])
-                base_reg = self._acquire_temp_register()
-                byte_reg = self._acquire_temp_register()
-                cnt_reg = self._acquire_temp_register()
-                lines.extend(self._emit_expression_to_register(base_node, base_reg))
-                lines.extend(self._emit_expression_to_register(byte_node, byte_reg))
-                lines.extend(self._emit_expression_to_register(cnt_node, cnt_reg))
-                lines.append(f"    MOV R0, {base_reg}")
-                lines.append(f"    MOV R1, {byte_reg}")
-                lines.append(f"    MOV R2, {cnt_reg}")
-                lines.append(f"    MEMCHR")
-                self._release_temp_register(cnt_reg)
-                self._release_temp_register(byte_reg)
-                self._release_temp_register(base_reg)
-                return lines, False
-
-            # revmem(addr, len) as statement form (in-place reverse)
-            if name == "revmem" and len(args) == 2:
-                base_node = self._parse_expression_node(args[0])
-                cnt_node = self._parse_expression_node(args[1])
-                base_reg = self._acquire_temp_register()
-                cnt_reg = self._acquire_temp_register()
-                lines.extend(self._emit_expression_to_register(base_node, base_reg))
-                lines.extend(self._emit_expression_to_register(cnt_node, cnt_reg))
-                lines.append(f"    MOV R0, {base_reg}")
-                lines.append(f"    MOV R1, {cnt_reg}")
-                lines.append(f"    REV_MEM")
-                self._release_temp_register(cnt_reg)
-                self._release_temp_register(base_reg)
-                return lines, False
-            
-            # Graphics functions (statement form)
-            if name == "pixel" and len(args) == 3:
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[0]), "R0"))
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[1]), "R1"))
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[2]), "R2"))
-                lines.append(f"    PIXEL")
-                return lines, False
-            
-            if name == "line" and len(args) == 5:
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[0]), "R0"))
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[1]), "R1"))
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[2]), "R2"))
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[3]), "R3"))
-                treg = self._acquire_temp_register()
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[4]), treg))
-                lines.append(f"    LINE {treg}")
-                self._release_temp_register(treg)
-                return lines, False
-            
-            if name == "rect" and len(args) == 5:
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[0]), "R0"))
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[1]), "R1"))
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[2]), "R2"))
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[3]), "R3"))
-                treg = self._acquire_temp_register()
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[4]), treg))
-                lines.append(f"    RECT {treg}")
-                self._release_temp_register(treg)
-                return lines, False
-            
-            if name == "fillrect" and len(args) == 5:
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[0]), "R0"))
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[1]), "R1"))
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[2]), "R2"))
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[3]), "R3"))
-                treg = self._acquire_temp_register()
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[4]), treg))
-                lines.append(f"    FILLRECT {treg}")
-                self._release_temp_register(treg)
-                return lines, False
-            
-            if name == "circle" and len(args) == 4:
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[0]), "R0"))
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[1]), "R1"))
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[2]), "R2"))
-                treg = self._acquire_temp_register()
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[3]), treg))
-                lines.append(f"    CIRCLE {treg}")
-                self._release_temp_register(treg)
-                return lines, False
-            
-            if name == "fillcircle" and len(args) == 4:
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[0]), "R0"))
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[1]), "R1"))
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[2]), "R2"))
-                treg = self._acquire_temp_register()
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[3]), treg))
-                lines.append(f"    FILLCIRCLE {treg}")
-                self._release_temp_register(treg)
-                return lines, False
-            
-            if name == "clear" and len(args) == 1:
-                treg = self._acquire_temp_register()
-                lines.extend(self._emit_expression_to_register(self._parse_expression_node(args[0]), treg))
-                lines.append(f"    CLEAR {treg}")
-                self._release_temp_register(treg)
-                return lines, False
-            
-            if name == "swap" and len(args) == 2:
-                # Parse variable names
-                var1 = args[0].strip()
-                var2 = args[1].strip()
-                if var1 in self.var_registers and var2 in self.var_registers:
-                    reg1 = self.var_registers[var1]
-                    reg2 = self.var_registers[var2]
-                    lines.append(f"    XCHG {reg1}, {reg2}")
-                    return lines, False
-            
-            # push args right-to-left
-            for arg in reversed([a for a in args if a]):
-                node = self._parse_expression_node(arg)
-                treg = self._acquire_temp_register()
-                lines.extend(self._emit_expression_to_register(node, treg))
-                lines.append(f"    PUSH {treg}")
-                self._release_temp_register(treg)
-            if name in self.var_registers:
-                reg = self._require_variable(name)
-                lines.append(f"    CALLR {reg}")
-            else:
-                lines.append(f"    CALL {name}")
-            if args:
-                lines.append(f"    ADDI R14, {len(args)*4}")
-            return lines, False
         self.warnings.append(f"Unsupported statement ignored: {stmt}")
         return [], False
 
+    @staticmethod
+    def _classify_statement(stmt: str) -> Optional[Tuple[str, Optional[str]]]:
+        """Return (kind, leading word) for a stripped statement, or None.
+
+        kind is "incdec", "decl", "compound" or "word"; the leading word is the
+        identifier that may name a keyword translator (None for incdec/decl).
+        """
+        m = _RE_STATEMENT_KIND.match(stmt)
+        if m is None:
+            return None
+        kind = m.lastgroup
+        if kind == "compound":
+            return kind, m.group("lhs")
+        if kind == "word":
+            return kind, m.group()
+        return kind, None
+
     def _translate_printf(self, stmt: str) -> List[str]:
         # Remove trailing semicolon if present - CAREFUL: check quotes first
         stmt = stmt.rstrip(';').strip()
         
         # More flexible regex to handle various printf formats
         # Support both printf(...) and printf(...); forms
-        match = re.match(r'printf\s*\((.+)\)$', stmt, re.DOTALL)
+        match = _RE_PRINTF_FULL.match(stmt)
         if not match:
             # Try to provide helpful error message
             if 'printf' in stmt and '(' in stmt:
@@ -6399,13 +6550,14 @@ class CppCompiler:
         remainder = remainder.strip()
         
         if remainder:
-            if not remainder.startswith(","):
+            if remainder[0] != ",":
                 raise CppCompilerError("printf arguments must be separated by commas")
             extra_args = self._split_arguments(remainder[1:].strip())
             
             # Try to evaluate as constants first
             const_values = []
             dynamic_args = []
+            all_const = True
             for arg in extra_args:
                 if not arg:
                     continue
@@ -6417,40 +6569,25 @@ class CppCompiler:
                     # It's a variable/expression - handle at runtime
                     const_values.append(None)
                     dynamic_args.append(arg)
+                    all_const = False
             
             # If all arguments are constants, do compile-time substitution
-            if all(v is not None for v in const_values):
-                for value in const_values:
-                    if "%d" in text_value:
-                        text_value = text_value.replace("%d", str(value), 1)
-                    else:
-                        text_value = f"{text_value}{value}"
-                label = self._add_string_literal(text_value)
-                length = len(text_value.encode('utf-8'))
-                lines.extend([
-                    "    LOADI R0, 1",
-                    "    LOADI R1, 1",
-                    f"    LOADI R2, {label}",
-                    f"    LOADI R3, {length}",
-                    "    SYSCALL R0"
-                ])
-            else:
-                # Handle runtime substitution by splitting format string and printing parts
-                parts = text_value.split("%d")
+            if all_const:
+                # Substitute every spec in one pass; unmatched specs stay verbatim
+                # and surplus values are appended at the end.
+                values = iter([str(value) for value in const_values])
+                text_value = _RE_FMT.sub(lambda spec: next(values, spec.group()), text_value)
+                text_value += "".join(values)
+                self._emit_print_literal(text_value, lines)
+            else:
+                # Handle runtime substitution by printing the literal chunks between specs
+                parts = _RE_FMT.split(text_value)
                 arg_idx = 0
                 
                 for i, part in enumerate(parts):
                     # Print the string part
                     if part:
-                        label = self._add_string_literal(part)
-                        length = len(part.encode('utf-8'))
-                        lines.extend([
-                            "    LOADI R0, 1",
-                            "    LOADI R1, 1",
-                            f"    LOADI R2, {label}",
-                            f"    LOADI R3, {length}",
-                            "    SYSCALL R0"
-                        ])
+                        self._emit_print_literal(part, lines)
                     
                     # Print the variable (if not last part)
                     if i < len(parts) - 1 and arg_idx < len(dynamic_args):
@@ -6458,7 +6595,7 @@ class CppCompiler:
                             # Evaluate expression into a register
                             node = self._parse_expression_node(dynamic_args[arg_idx])
                             temp_reg = self._acquire_temp_register()
-                            lines.extend(self._emit_expression_to_register(node, temp_reg))
+                            self._emit_expression_into(node, temp_reg, lines)
                             # Print integer syscall (syscall 50)
                             lines.extend([
                                 "    LOADI R0, 50",
@@ -6476,15 +6613,7 @@ class CppCompiler:
                         arg_idx += 1
         else:
             # No arguments, just print the string
-            label = self._add_string_literal(text_value)
-            length = len(text_value.encode('utf-8'))
-            lines.extend([
-                "    LOADI R0, 1",
-                "    LOADI R1, 1",
-                f"    LOADI R2, {label}",
-                f"    LOADI R3, {length}",
-                "    SYSCALL R0"
-            ])
+            self._emit_print_literal(text_value, lines)
         
         return lines
 
@@ -6497,7 +6626,7 @@ class CppCompiler:
         else:
             node = ast.Constant(value=0)
         code = ["    ; return statement"]
-        code.extend(self._emit_expression_to_register(node, "R0"))
+        self._emit_expression_into(node, "R0", code)
         return code
     
     def _translate_if(self, stmt: str) -> List[str]:
@@ -6533,6 +6662,11 @@ class CppCompiler:
             if tail:
                 self.warnings.append(f"Ignoring unexpected tokens after else block: {tail}")
         cond_lines, false_jump = self._emit_condition_code(condition)
+        # Constant conditions keep only the branch that can run
+        if false_jump is None:
+            return true_code
+        if false_jump == "JMP":
+            return else_code
         lines: List[str] = []
         lines.extend(cond_lines)
         if else_code:
@@ -6558,9 +6692,9 @@ class CppCompiler:
             raise CppCompilerError("while statement missing body")
         start_label = self._new_label("while_begin")
         end_label = self._new_label("while_end")
-        cond_code, false_jump = self._emit_condition_code(condition)
-        self.loop_stack.append({"break": end_label, "continue": start_label})
+        frame = self._push_loop_frame(end_label, start_label)
         try:
+            cond_code, false_jump = self._emit_condition_code(condition)
             if remainder.startswith("{"):
                 body_text, tail = self._extract_block(remainder)
                 if tail.strip():
@@ -6569,10 +6703,14 @@ class CppCompiler:
             else:
                 body_code, _ = self._translate_statement(remainder)
         finally:
-            self.loop_stack.pop()
-        lines = [f"{start_label}:"]
+            self._pop_loop_frame(frame)
+        if false_jump == "JMP":
+            # Never entered: the body is compiled for its declarations but not emitted
+            return []
+        lines = frame["preheader"] + [f"{start_label}:"]
         lines.extend(cond_code)
-        lines.append(f"    {false_jump} {end_label}")
+        if false_jump:
+            lines.append(f"    {false_jump} {end_label}")
         lines.extend(body_code)
         lines.append(f"    JMP {start_label}")
         lines.append(f"{end_label}:")
@@ -6623,7 +6761,7 @@ class CppCompiler:
                 # Flush previous case/default
                 if current_kind is not None:
                     cases.append((current_kind, current_val, "\n".join(current_buf)))
-                m = re.match(r"case\s+(-?\d+)\s*:", stripped)
+                m = _RE_CASE.match(stripped)
                 if not m:
                     raise CppCompilerError(f"Invalid case label: {stripped}")
                 current_kind = "case"
@@ -6652,7 +6790,7 @@ class CppCompiler:
         cond_reg = self._acquire_temp_register()
         cond_node = self._parse_expression_node(condition.strip())
         lines: List[str] = []
-        lines.extend(self._emit_expression_to_register(cond_node, cond_reg))
+        self._emit_expression_into(cond_node, cond_reg, lines)
 
         # First pass: create labels and comparison jumps for each case
         case_labels: List[Tuple[int, str]] = []
@@ -6707,6 +6845,11 @@ class CppCompiler:
     def _translate_for(self, stmt: str) -> List[str]:
         header, remainder = self._extract_parenthesized(stmt)
         header = header.strip()
+        simple = _RE_FOR_SIMPLE.match(header)
+        if simple:
+            lines = self._translate_for_simple_counter(simple, remainder.strip())
+            if lines is not None:
+                return lines
         parts: List[str] = []
         current: List[str] = []
         depth = 0
@@ -6721,14 +6864,17 @@ class CppCompiler:
                 current = []
             else:
                 current.append(ch)
-        if current:
-            parts.append("".join(current).strip())
+        # The increment may be empty, as in for (;;) or for (i = 0; i < n;)
+        parts.append("".join(current).strip())
         if len(parts) != 3:
             raise CppCompilerError("for loop header must be 'init; condition; increment'")
         init_src, cond_src, post_src = parts
         remainder = remainder.strip()
         if not remainder:
             raise CppCompilerError("for statement missing body")
+        unrolled = self._try_unroll_for(init_src, cond_src, post_src, remainder)
+        if unrolled is not None:
+            return unrolled
         lines: List[str] = []
         if init_src:
             init_code, _ = self._translate_statement(init_src)
@@ -6736,12 +6882,69 @@ class CppCompiler:
         cond_label = self._new_label("for_cond")
         end_label = self._new_label("for_end")
         post_label = self._new_label("for_post")
-        lines.append(f"{cond_label}:")
-        if cond_src:
-            cond_code, false_jump = self._emit_condition_code(cond_src)
-            lines.extend(cond_code)
-            lines.append(f"    {false_jump} {end_label}")
-        self.loop_stack.append({"break": end_label, "continue": post_label})
+        loop_lines = [f"{cond_label}:"]
+        frame = self._push_loop_frame(end_label, post_label)
+        try:
+            false_jump = None
+            if cond_src:
+                cond_code, false_jump = self._emit_condition_code(cond_src)
+                loop_lines.extend(cond_code)
+                if false_jump:
+                    loop_lines.append(f"    {false_jump} {end_label}")
+            if remainder.startswith("{"):
+                body_text, tail = self._extract_block(remainder)
+                if tail.strip():
+                    self.warnings.append(f"Ignoring tokens after for block: {tail.strip()}")
+                body_code = self._compile_block(body_text)
+            else:
+                body_code, _ = self._translate_statement(remainder)
+            loop_lines.extend(body_code)
+            loop_lines.append(f"{post_label}:")
+            if post_src:
+                post_code, _ = self._translate_statement(post_src)
+                loop_lines.extend(post_code)
+        finally:
+            self._pop_loop_frame(frame)
+        if false_jump == "JMP":
+            # Never entered: only the init statement runs
+            return lines
+        lines.extend(frame["preheader"])
+        lines.extend(loop_lines)
+        lines.append(f"    JMP {cond_label}")
+        lines.append(f"{end_label}:")
+        return lines
+
+    def _translate_for_simple_counter(self, match: re.Match, remainder: str) -> Optional[List[str]]:
+        """Compile `for (int i = C; i < bound; i++)` with the counter kept in its register.
+
+        The bound must be a 16-bit constant or a variable. The header then becomes
+        CMP/Jcc on the counter register plus INC/DEC, with no temporaries and no
+        re-translation of the init and step statements. Returns None otherwise.
+        """
+        init_src, name, cmp_op, bound_src = match.group(1, 2, 3, 4)
+        step = match.group(5) or match.group(6)
+        if not remainder:
+            raise CppCompilerError("for statement missing body")
+        post_src = f"{name}{step}"
+        unrolled = self._try_unroll_for(init_src, f"{name} {cmp_op} {bound_src}", post_src, remainder)
+        if unrolled is not None:
+            return unrolled
+        if bound_src in self.var_registers and bound_src != name:
+            bound = None
+        else:
+            try:
+                bound = self._try_constant_value(self._parse_expression_node(bound_src))
+            except CppCompilerError:
+                return None
+            if bound is None or not -32768 <= bound <= 32767:
+                return None
+        lines, _ = self._translate_statement(init_src)
+        reg = self._require_variable(name)
+        operand = self.var_registers[bound_src] if bound is None else bound
+        cond_label = self._new_label("for_cond")
+        end_label = self._new_label("for_end")
+        post_label = self._new_label("for_post")
+        frame = self._push_loop_frame(end_label, post_label)
         try:
             if remainder.startswith("{"):
                 body_text, tail = self._extract_block(remainder)
@@ -6751,16 +6954,106 @@ class CppCompiler:
             else:
                 body_code, _ = self._translate_statement(remainder)
         finally:
-            self.loop_stack.pop()
+            self._pop_loop_frame(frame)
+        false_jump = {
+            "==": "JNE",
+            "!=": "JE",
+            ">": "JLE",
+            ">=": "JL",
+            "<": "JGE",
+            "<=": "JG",
+        }[cmp_op]
+        lines.extend(frame["preheader"])
+        lines.append(f"{cond_label}:")
+        lines.append(f"    CMP {reg}, {operand}")
+        lines.append(f"    {false_jump} {end_label}")
         lines.extend(body_code)
         lines.append(f"{post_label}:")
-        if post_src:
-            post_code, _ = self._translate_statement(post_src)
-            lines.extend(post_code)
+        lines.append(f"    {'INC' if step == '++' else 'DEC'} {reg}")
         lines.append(f"    JMP {cond_label}")
         lines.append(f"{end_label}:")
         return lines
 
+    def _try_unroll_for(self, init_src: str, cond_src: str, post_src: str,
+                        remainder: str) -> Optional[List[str]]:
+        """Fully unroll `for (i = C0; i < C1; i++)` when the trip count is small.
+
+        The body is emitted once per iteration with the counter folded to that
+        iteration's value, so no condition or back-edge is emitted. The counter's
+        register is only stepped between copies when the emitted code still reads
+        it; otherwise it is loaded once with its final value. Returns None when
+        the loop does not have that shape.
+        """
+        init = _RE_UNROLL_INIT.match(init_src)
+        cond = _RE_UNROLL_COND.match(cond_src)
+        step = _RE_UNROLL_STEP.match(post_src)
+        if not (init and cond and step):
+            return None
+        name = init.group(1)
+        if cond.group(1) != name or name not in (step.group(1), step.group(2), step.group(3)):
+            return None
+        if remainder.startswith("{"):
+            body_text, tail = self._extract_block(remainder)
+            if tail.strip():
+                return None
+        else:
+            body_text = None
+        body_src = remainder if body_text is None else body_text
+        if _RE_UNROLL_BLOCKER.search(body_src):
+            return None
+        if any(cls in body_src for cls in self.class_definitions):
+            return None
+        # The counter must only be read by the body
+        if re.search(rf'\b{name}\s*(?:[-+*/%&|^]|<<|>>)?=(?!=)|\b{name}\s*(?:\+\+|--)|(?:\+\+|--)\s*{name}\b', body_src):
+            return None
+        try:
+            start = self._try_constant_value(self._parse_expression_node(init.group(2)))
+            stop = self._try_constant_value(self._parse_expression_node(cond.group(3)))
+        except CppCompilerError:
+            return None
+        if start is None or stop is None:
+            return None
+        if cond.group(2) == "<=":
+            stop += 1
+        if not 0 < stop - start <= self.UNROLL_LIMIT:
+            return None
+        init_code, _ = self._translate_statement(init_src)
+        reg = self._require_variable(name)
+        # Folded values that involve the counter are only valid for one copy, so
+        # each copy folds into its own cache and the outer cache is left untouched
+        outer_cache = self._const_cache
+        copies = []
+        try:
+            for value in range(start, stop):
+                # self.variables feeds the compile-time tracking of compound assignments
+                self.variables[name] = self._unrolled_counters[name] = value
+                self._const_cache = {}
+                if body_text is None:
+                    body_code, _ = self._translate_statement(body_src)
+                else:
+                    body_code = self._compile_block(body_text)
+                copies.append((value, body_code))
+        finally:
+            self._unrolled_counters.pop(name, None)
+            self._const_cache = outer_cache
+        self.variables[name] = stop
+        # A copy still reads the register where a use did not fold (or a call may see it)
+        reg_use = re.compile(rf'\b(?:{reg}|CALLR?)\b')
+        step_counter = any(reg_use.search(line.split(";", 1)[0])
+                           for _, body_code in copies for line in body_code)
+        lines = init_code if step_counter else []
+        for value, body_code in copies:
+            # The comment also keeps the assembler from fusing the counter's LOADI
+            # with an ADD at the top of the body
+            lines.append(f"    ; {name} = {value} (unrolled)")
+            lines.extend(body_code)
+            if step_counter:
+                lines.append(f"    INC {reg}")
+        if not step_counter:
+            self._emit_load_immediate(reg, stop, lines)
+        self.stats["optimizations_applied"] += 1
+        return lines
+
     def _translate_do_while(self, stmt: str) -> List[str]:
         remainder = stmt[len("do"):].strip()
         if not remainder.startswith("{"):
@@ -6773,18 +7066,21 @@ class CppCompiler:
         start_label = self._new_label("do_begin")
         cond_label = self._new_label("do_cond")
         end_label = self._new_label("do_end")
-        lines: List[str] = [f"{start_label}:"]
-        self.loop_stack.append({"break": end_label, "continue": cond_label})
+        frame = self._push_loop_frame(end_label, cond_label)
         try:
             body_code = self._compile_block(body_text)
+            cond_code, false_jump = self._emit_condition_code(condition)
         finally:
-            self.loop_stack.pop()
+            self._pop_loop_frame(frame)
+        lines: List[str] = frame["preheader"] + [f"{start_label}:"]
         lines.extend(body_code)
         lines.append(f"{cond_label}:")
-        cond_code, false_jump = self._emit_condition_code(condition)
         lines.extend(cond_code)
-        lines.append(f"    {false_jump} {end_label}")
-        lines.append(f"    JMP {start_label}")
+        if false_jump != "JMP":
+            # Constant-false conditions fall through after one pass; true ones loop
+            if false_jump:
+                lines.append(f"    {false_jump} {end_label}")
+            lines.append(f"    JMP {start_label}")
         lines.append(f"{end_label}:")
         return lines
 
@@ -6802,7 +7098,7 @@ class CppCompiler:
     
     def _translate_inline_asm(self, stmt: str) -> List[str]:
         """Translate inline assembly: asm("NOP"); or asm("ADD R1, R2");"""
-        match = re.match(r'asm\s*\(\s*"([^"]+)"\s*\)', stmt)
+        match = _RE_ASM.match(stmt)
         if not match:
             raise CppCompilerError(f"Invalid inline assembly syntax: {stmt}")
         
@@ -6821,7 +7117,9 @@ class CppCompiler:
         return lines
 
     def _new_label(self, prefix: str = "L") -> str:
-        label = f"{prefix}_{self.label_counter}"
+        # Interned so loop/branch frames, cached condition code and every jump that
+        # names the label share one string object
+        label = sys.intern(f"{prefix}_{self.label_counter}")
         self.label_counter += 1
         return label
 
@@ -6831,13 +7129,13 @@ class CppCompiler:
             raise CppCompilerError("Missing '(' in if statement")
         depth = 0
         expr_start = start + 1
-        for i in range(start, len(stmt)):
-            ch = stmt[i]
-            if ch == '(':
+        for m in _RE_PAREN_TOKEN.finditer(stmt, start):
+            if m.group() == '(':
                 depth += 1
-            elif ch == ')':
+            else:
                 depth -= 1
                 if depth == 0:
+                    i = m.start()
                     return stmt[expr_start:i], stmt[i+1:]
         raise CppCompilerError("Unmatched parentheses in if condition")
 
@@ -6846,12 +7144,13 @@ class CppCompiler:
             raise CppCompilerError("Expected '{' to start block")
         depth = 0
         start = 1
-        for i, ch in enumerate(text):
-            if ch == '{':
+        for m in _RE_BRACE_TOKEN.finditer(text):
+            if m.group() == '{':
                 depth += 1
-            elif ch == '}':
+            else:
                 depth -= 1
                 if depth == 0:
+                    i = m.start()
                     return text[start:i], text[i+1:]
         raise CppCompilerError("Unmatched braces in block")
 
@@ -6865,41 +7164,119 @@ class CppCompiler:
                 return left, op, right
         return condition, None, None
 
-    def _emit_condition_code(self, condition: str) -> Tuple[List[str], str]:
-        left_expr, operator, right_expr = self._parse_condition(condition)
+    def _emit_condition_code(self, condition: str) -> Tuple[List[str], Optional[str]]:
+        """Return (code, jump) where jump branches away when the condition is false.
+
+        jump is a mnemonic, or for bare truth tests "CBZ <reg>," with its register
+        operand, so callers always emit it as f"{jump} {label}".
+
+        A condition that folds to a constant produces no code: jump is "JMP" when it
+        is always false and None when it is always true (no branch is needed).
+        """
+        # while (1) / while (true): the usual spellings of a main loop skip the cache
+        # key and the parse entirely
+        if condition.strip() in _ALWAYS_TRUE_CONDITIONS:
+            return [], None
+        # Code for a condition depends only on its text and the register/array bindings in
+        # scope. Every change to var_register_pool bumps its generation and other
+        # declarations grow a symbol table, so together they version those bindings; the
+        # free temp registers and the loop's hoisted array bases are part of the key.
+        frame = self.loop_stack[-1] if self.loop_stack else {}
+        key = (condition, tuple(self.temp_register_pool), self._var_pool_generation,
+               len(self.arrays), len(self.class_instances), len(self.struct_instances),
+               tuple(frame.get("invariant_regs", {}).items()),
+               tuple(self._unrolled_counters.items()))
+        cached = self._condition_code_cache.get(key)
+        if cached is not None:
+            self.stats["expressions_cached"] += 1
+            return list(cached[0]), cached[1]
+        code, jump = self._compile_condition_code(condition)
+        # Code that defines labels must be regenerated so every copy gets fresh labels
+        if (tuple(self.temp_register_pool) == key[1] and self._var_pool_generation == key[2]
+                and not any(line.endswith(":") for line in code)):
+            self._condition_code_cache[key] = (tuple(code), jump)
+        return code, jump
+
+    def _compile_condition_code(self, condition: str) -> Tuple[List[str], Optional[str]]:
+        left_expr, cmp_op, right_expr = self._parse_condition(condition)
         code: List[str] = []
-        left_reg = self._acquire_temp_register()
-        code.extend(self._emit_expression_to_register(self._parse_expression_node(left_expr), left_reg))
-        jump = "JE"
-        if operator:
-            right_reg = self._acquire_temp_register()
-            code.extend(self._emit_expression_to_register(self._parse_expression_node(right_expr), right_reg))
-            code.append(f"    CMP {left_reg}, {right_reg}")
-            jump = {
-                "==": "JNE",
-                "!=": "JE",
-                ">": "JLE",
-                ">=": "JL",
-                "<": "JGE",
-                "<=": "JG",
-            }[operator]
-            self._release_temp_register(right_reg)
-        else:
-            zero_reg = self._acquire_temp_register()
-            code.extend(self._emit_load_immediate(zero_reg, 0))
-            code.append(f"    CMP {left_reg}, {zero_reg}")
-            jump = "JE"
-            self._release_temp_register(zero_reg)
-        self._release_temp_register(left_reg)
+        outcome = self._fold_condition(left_expr, cmp_op, right_expr)
+        if outcome is not None:
+            return code, None if outcome else "JMP"
+        with self._temp_register() as left_reg:
+            self._emit_expression_into(self._parse_expression_node(left_expr), left_reg, code)
+            if cmp_op:
+                right_node = self._parse_expression_node(right_expr)
+                right_const = self._try_constant_value(right_node)
+                if right_const is not None and -32768 <= right_const <= 32767:
+                    # CMP takes a sign-extended 16-bit immediate; no temp needed
+                    code.append(f"    CMP {left_reg}, {right_const}")
+                else:
+                    with self._temp_register() as right_reg:
+                        self._emit_expression_into(right_node, right_reg, code)
+                        code.append(f"    CMP {left_reg}, {right_reg}")
+                jump = {
+                    "==": "JNE",
+                    "!=": "JE",
+                    ">": "JLE",
+                    ">=": "JL",
+                    "<": "JGE",
+                    "<=": "JG",
+                }[cmp_op]
+            else:
+                # Bare truth test: CBZ branches on the register itself, so the jump
+                # carries left_reg as its first operand and no CMP is needed
+                jump = f"CBZ {left_reg},"
         return code, jump
 
+    def _fold_condition(self, left_expr: str, cmp_op: Optional[str],
+                        right_expr: Optional[str]) -> Optional[bool]:
+        """Evaluate a condition whose operands are both 16-bit constants, else None."""
+        # Wider constants are loaded only partially by _emit_load_immediate, so folding
+        # them would not match what the emitted code does
+        try:
+            left = self._try_constant_value(self._parse_expression_node(left_expr))
+            if left is None or not -32768 <= left <= 32767:
+                return None
+            if not cmp_op:
+                return left != 0
+            right = self._try_constant_value(self._parse_expression_node(right_expr))
+        except CppCompilerError:
+            return None
+        if right is None or not -32768 <= right <= 32767:
+            return None
+        return {
+            "==": left == right,
+            "!=": left != right,
+            ">": left > right,
+            ">=": left >= right,
+            "<": left < right,
+            "<=": left <= right,
+        }[cmp_op]
+
     def _add_string_literal(self, literal: str) -> str:
-        if literal in self._string_map:
-            return self._string_map[literal]
+        return self._intern_string_literal(literal)[0]
+
+    def _intern_string_literal(self, literal: str) -> Tuple[str, int]:
+        """Return (label, UTF-8 byte length) for a literal, interning it on first use."""
+        # Literals are interned by content so repeated parts ("\n", ": ") share one label
+        entry = self._string_map.get(literal)
+        if entry is not None:
+            return entry
         label = f"__str_{len(self.string_literals)}"
         self.string_literals.append((label, literal))
-        self._string_map[literal] = label
-        return label
+        entry = (label, len(literal.encode('utf-8')))
+        self._string_map[literal] = entry
+        return entry
+
+    def _emit_print_literal(self, literal: str, lines: List[str]) -> None:
+        """Append a write(1, literal, len) syscall for a string literal to `lines`."""
+        label, length = self._intern_string_literal(literal)
+        lines.append("    LOADI R0, 1")
+        lines.append("    LOADI R1, 1")
+        lines.append(f"    LOADI R2, {label}")
+        lines.append(f"    LOADI R3, {length}")
+        lines.append("    SYSCALL R0")
 
     def _escape_string(self, text_value: str) -> str:
         escaped = text_value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n").replace("\t", "\\t")
@@ -6913,86 +7290,65 @@ class CppCompiler:
         """
         if not argument.startswith('"'):
             raise CppCompilerError("printf requires a string literal as the first argument")
-        escape = False
-        for idx in range(1, len(argument)):
-            ch = argument[idx]
-            if escape:
-                # After backslash, accept any character
-                escape = False
-                continue
-            if ch == '\\':
-                # Start of escape sequence
-                escape = True
-                continue
-            if ch == '"':
-                # Found closing quote - return the quoted string and remainder
-                return argument[:idx + 1], argument[idx + 1:]
+        # A backslash escapes any following character; the first unescaped quote closes
+        match = _RE_STRING_LITERAL.match(argument)
+        if match:
+            end = match.end()
+            return argument[:end], argument[end:]
         # If we get here, the quote was never closed
         raise CppCompilerError(f"Unterminated string literal in printf - check for unescaped quotes: {argument[:60]}...")
 
     def _split_arguments(self, arg_string: str) -> List[str]:
+        # Jump between string literals, parentheses and commas; everything else is
+        # skipped by the regex engine. String literals are consumed whole.
         args = []
-        current = []
         depth = 0
-        in_string = False
-        escape = False
-        for ch in arg_string:
-            if in_string:
-                current.append(ch)
-                if escape:
-                    escape = False
-                elif ch == '\\':
-                    escape = True
-                elif ch == '"':
-                    in_string = False
-                continue
-            if ch == '"':
-                in_string = True
-                current.append(ch)
-                continue
-            if ch == '(':
+        start = 0
+        for m in _RE_ARG_TOKEN.finditer(arg_string):
+            tok = m.group()
+            if tok == '(':
                 depth += 1
-            elif ch == ')':
+            elif tok == ')':
                 if depth > 0:
                     depth -= 1
-            if ch == ',' and depth == 0:
-                args.append("".join(current).strip())
-                current = []
-            else:
-                current.append(ch)
-        if current:
-            trailing = "".join(current).strip()
-            if trailing:
-                args.append(trailing)
+            elif tok == ',' and depth == 0:
+                args.append(arg_string[start:m.start()].strip())
+                start = m.end()
+        trailing = arg_string[start:].strip()
+        if trailing:
+            args.append(trailing)
         return args
 
     def _parse_expression_node(self, expr: str):
-        # Check cache first for performance
-        if expr in self._expression_cache:
+        # Check cache first for performance. Entries are keyed on the raw source text so
+        # repeated arguments (x, i, buf[0]) skip both normalization and ast.parse; the
+        # cache is cleared by reset() at the start of every compilation.
+        cache = self._expression_cache
+        node = cache.get(expr)
+        if node is not None:
             self.stats["expressions_cached"] += 1
-            return self._expression_cache[expr]
+            return node
         
-        expr = self._normalize_expression(expr)
+        normalized = self._normalize_expression(expr)
+        # Raw spellings that normalize to the same text (true/True, a&&b/a and b)
+        # share one parse
         try:
-            node = ast.parse(expr, mode="eval").body
-            # Cache the parsed expression
-            self._expression_cache[expr] = node
-            return node
+            node = _parse_normalized_expression(normalized)
         except SyntaxError as exc:
-            raise CppCompilerError(f"Invalid expression '{expr}': {exc}")
+            raise CppCompilerError(f"Invalid expression '{normalized}': {exc}")
+        # Cache the parsed expression
+        cache[expr] = node
+        return node
 
     def _normalize_expression(self, expr: str) -> str:
-        expr = expr.replace('&&', ' and ')
-        expr = expr.replace('||', ' or ')
-        expr = re.sub(r'!(?!=)', ' not ', expr)
-        expr = re.sub(r'\btrue\b', 'True', expr)
-        expr = re.sub(r'\bfalse\b', 'False', expr)
+        expr = _RE_NORMALIZE.sub(lambda m: _NORMALIZE_MAP[m.group()], expr)
         # Convert C-style ternary operator a ? b : c -> Python's (b) if (a) else (c)
-        try:
-            expr = self._convert_c_ternary(expr)
-        except Exception:
-            # If conversion fails, leave expression unchanged and let parser report syntax
-            pass
+        if '?' in expr:
+            try:
+                expr = self._convert_c_ternary(expr)
+            except Exception:
+                # If conversion fails, leave expression unchanged and let parser report syntax
+                pass
         return expr
 
     def _convert_c_ternary(self, expr: str) -> str:
@@ -7006,69 +7362,14 @@ class CppCompiler:
         # Quick exit if no ternary
         if '?' not in s:
             return s
-
-        def find_top_level_question(s):
-            in_str = False
-            escape = False
-            depth = 0
-            for i, ch in enumerate(s):
-                if escape:
-                    escape = False
-                    continue
-                if ch == '\\':
-                    escape = True
-                    continue
-                if ch == '"' or ch == "'":
-                    in_str = not in_str
-                    continue
-                if in_str:
-                    continue
-                if ch == '(':
-                    depth += 1
-                elif ch == ')':
-                    if depth > 0:
-                        depth -= 1
-                elif ch == '?' and depth == 0:
-                    return i
-            return -1
-
-        def find_matching_colon(s, qpos):
-            in_str = False
-            escape = False
-            depth = 0
-            tern_level = 0
-            for i in range(qpos+1, len(s)):
-                ch = s[i]
-                if escape:
-                    escape = False
-                    continue
-                if ch == '\\':
-                    escape = True
-                    continue
-                if ch == '"' or ch == "'":
-                    in_str = not in_str
-                    continue
-                if in_str:
-                    continue
-                if ch == '(':
-                    depth += 1
-                elif ch == ')':
-                    if depth > 0:
-                        depth -= 1
-                elif ch == '?' and depth == 0:
-                    tern_level += 1
-                elif ch == ':' and depth == 0:
-                    if tern_level == 0:
-                        return i
-                    tern_level -= 1
-            return -1
-
-        qpos = find_top_level_question(s)
-        if qpos == -1:
-            return s
-        cpos = find_matching_colon(s, qpos)
-        if cpos == -1:
-            # malformed ternary; leave as-is
+        converted = self._ternary_cache.get(s)
+        if converted is not None:
+            return converted
+
+        qpos, cpos = self._find_ternary_split(s)
+        if qpos == -1 or cpos == -1:
+            # no top-level ternary, or a malformed one; leave as-is
+            self._ternary_cache[s] = s
             return s
         test = s[:qpos].strip()
         true_part = s[qpos+1:cpos].strip()
@@ -7078,15 +7379,53 @@ class CppCompiler:
         true_py = self._convert_c_ternary(true_part)
         false_py = self._convert_c_ternary(false_part)
         new_expr = f"({true_py}) if ({test_py}) else ({false_py})"
+        self._ternary_cache[s] = new_expr
         return new_expr
 
+    @staticmethod
+    def _find_ternary_split(s: str) -> Tuple[int, int]:
+        """Return the offsets of the first top-level '?' and its matching ':'.
+
+        Both scans share one pass over the tokens; -1 marks a missing position.
+        """
+        in_str = False
+        depth = 0
+        qpos = -1
+        tern_level = 0
+        for m in _RE_TERNARY_TOKEN.finditer(s):
+            ch = m.group()
+            if ch[0] == '\\':
+                continue
+            if ch == '"' or ch == "'":
+                in_str = not in_str
+                continue
+            if in_str:
+                continue
+            if ch == '(':
+                depth += 1
+            elif ch == ')':
+                if depth > 0:
+                    depth -= 1
+            elif depth:
+                continue
+            elif ch == '?':
+                if qpos == -1:
+                    qpos = m.start()
+                else:
+                    tern_level += 1
+            elif ch == ':' and qpos != -1:
+                if tern_level == 0:
+                    return qpos, m.start()
+                tern_level -= 1
+        return qpos, -1
+
     def _compile_declaration(self, stmt: str) -> List[str]:
         stmt = stmt.rstrip(";").strip()
         # Ignore zero-arg function prototypes like "int foo()"; not variable declarations
-        if re.fullmatch(r"(?:const\s+)?(?:int|float|bool|char)\s+[A-Za-z_]\w*\s*\(\s*\)", stmt):
+        if _RE_PROTO.fullmatch(stmt):
             return []
 
-        match = re.match(r'(const\s+)?(int|float|bool|char)\s+([A-Za-z_]\w*)(\s*=\s*(.+))?$', stmt)
+        match = _RE_DECL.match(stmt)
         if not match:
             raise CppCompilerError(f"Invalid declaration: {stmt}")
 
@@ -7104,7 +7443,7 @@ class CppCompiler:
         if init_expr:
             expr = init_expr.strip()
             node = self._parse_expression_node(expr)
-            code.extend(self._emit_expression_to_register(node, reg))
+            self._emit_expression_into(node, reg, code)
             try:
                 self.variables[name] = self._evaluate_expression(expr)
             except CppCompilerError:
@@ -7129,7 +7468,7 @@ class CppCompiler:
         
         # Check for array assignment: arr[index] = value
         if '[' in lhs and ']' in lhs:
-            match = re.match(r'([A-Za-z_]\w*)\s*\[\s*(.+?)\s*\]', lhs)
+            match = _RE_INDEXED_LHS.match(lhs)
             if match:
                 arr_name = match.group(1)
                 index_expr = match.group(2)
@@ -7144,31 +7483,21 @@ class CppCompiler:
                 code: List[str] = []
                 
                 # Evaluate the value to store
-                val_reg = self._acquire_temp_register()
-                node = self._parse_expression_node(expr)
-                code.extend(self._emit_expression_to_register(node, val_reg))
-                
-                # Evaluate index
-                idx_reg = self._acquire_temp_register()
-                idx_node = self._parse_expression_node(index_expr)
-                code.extend(self._emit_expression_to_register(idx_node, idx_reg))
-                # Bounds check: 0 <= index < size
-                if size > 0:
-                    code.extend(self._emit_bounds_check(idx_reg, size))
-                
-                # Calculate address: base + (index * 4)
-                addr_reg = self._acquire_temp_register()
-                code.append(f"    LOADI {addr_reg}, 4")
-                code.append(f"    MUL {idx_reg}, {addr_reg}")  # idx_reg = index * 4
-                code.append(f"    LOADI {addr_reg}, {base_addr}")
-                code.append(f"    ADD {idx_reg}, {addr_reg}")  # idx_reg = base + (index * 4)
-                
-                # Store value to memory
-                code.append(f"    STORE {val_reg}, {idx_reg}")
-                
-                self._release_temp_register(addr_reg)
-                self._release_temp_register(idx_reg)
-                self._release_temp_register(val_reg)
+                with self._temp_register() as val_reg:
+                    node = self._parse_expression_node(expr)
+                    self._emit_expression_into(node, val_reg, code)
+                    
+                    # Evaluate index
+                    with self._temp_register() as idx_reg:
+                        idx_node = self._parse_expression_node(index_expr)
+                        self._emit_expression_into(idx_node, idx_reg, code)
+                        # Bounds check: 0 <= index < size
+                        if size > 0:
+                            self._emit_bounds_check(idx_reg, size, code)
+                        self._emit_element_address(idx_reg, base_addr, code)
+                        
+                        # Store value to memory
+                        code.append(f"    STORE {val_reg}, {idx_reg}")
                 
                 return code
         
@@ -7194,38 +7523,48 @@ class CppCompiler:
         reg = self._require_variable(name)
         node = self._parse_expression_node(expr)
         code: List[str] = []
-        # Evaluate RHS into a temporary register
-        treg = self._acquire_temp_register()
-        try:
-            code.extend(self._emit_expression_to_register(node, treg))
-            if op == "+=":
-                code.append(f"    ADD {reg}, {treg}")
-            elif op == "-=":
-                code.append(f"    SUB {reg}, {treg}")
-            elif op == "* =" or op == "*=":
-                code.append(f"    MUL {reg}, {treg}")
-            elif op == "/=":
-                # Division assignment with runtime div-by-zero check
-                code.extend(self._emit_div_zero_check(treg))
-                code.append(f"    DIV {reg}, {treg}")
-            elif op == "%=":
-                # Modulo assignment with runtime div-by-zero check
-                code.extend(self._emit_div_zero_check(treg))
-                code.append(f"    MOD {reg}, {treg}")
-            elif op == "&=":
-                code.append(f"    AND {reg}, {treg}")
-            elif op == "|=":
-                code.append(f"    OR {reg}, {treg}")
-            elif op == "^=":
-                code.append(f"    XOR {reg}, {treg}")
-            elif op == "<<=":
-                code.append(f"    SHL {reg}, {treg}")
-            elif op == ">> =" or op == ">>=":
-                code.append(f"    SHR {reg}, {treg}")
-            else:
-                raise CppCompilerError(f"Unsupported compound assignment operator '{op}'")
-        finally:
-            self._release_temp_register(treg)
+        step = self._try_constant_value(node) if op in ("+=", "-=") else None
+        if step is not None and op == "-=":
+            step = -step
+        if step in (1, -1):
+            # x += 1 / x -= 1 update the register in place without a temporary
+            code.append(f"    {'INC' if step == 1 else 'DEC'} {reg}")
+        else:
+            mnemonic = _COMPOUND_IMMEDIATE_OPS.get(op)
+            imm = self._try_constant_value(node) if mnemonic is not None else None
+            if imm is not None and -32768 <= imm <= 32767:
+                # x op= constant: OP reg, imm with no temporary, as for binary expressions
+                code.append(_T_OP2 % (mnemonic, reg, imm))
+            else:
+                # Evaluate RHS into a temporary register
+                with self._temp_register() as treg:
+                    self._emit_expression_into(node, treg, code)
+                    if op == "+=":
+                        code.append(f"    ADD {reg}, {treg}")
+                    elif op == "-=":
+                        code.append(f"    SUB {reg}, {treg}")
+                    elif op == "* =" or op == "*=":
+                        code.append(f"    MUL {reg}, {treg}")
+                    elif op == "/=":
+                        # Division assignment with runtime div-by-zero check
+                        self._emit_div_zero_check(treg, code)
+                        code.append(f"    DIV {reg}, {treg}")
+                    elif op == "%=":
+                        # Modulo assignment with runtime div-by-zero check
+                        self._emit_div_zero_check(treg, code)
+                        code.append(f"    MOD {reg}, {treg}")
+                    elif op == "&=":
+                        code.append(f"    AND {reg}, {treg}")
+                    elif op == "|=":
+                        code.append(f"    OR {reg}, {treg}")
+                    elif op == "^=":
+                        code.append(f"    XOR {reg}, {treg}")
+                    elif op == "<<=":
+                        code.append(f"    SHL {reg}, {treg}")
+                    elif op == ">> =" or op == ">>=":
+                        code.append(f"    SHR {reg}, {treg}")
+                    else:
+                        raise CppCompilerError(f"Unsupported compound assignment operator '{op}'")
         # Best-effort constant tracking
         try:
             if name in self.variables:
@@ -7266,12 +7605,12 @@ class CppCompiler:
         core = stmt.rstrip(";").strip()
         name: Optional[str] = None
         delta = 0
-        m = re.fullmatch(r"([A-Za-z_]\w*)\s*(\+\+|--)", core)
+        m = _RE_INC_POST.fullmatch(core)
         if m:
             name = m.group(1)
             delta = 1 if m.group(2) == "++" else -1
         else:
-            m2 = re.fullmatch(r"(\+\+|--)\s*([A-Za-z_]\w*)", core)
+            m2 = _RE_INC_PRE.fullmatch(core)
             if m2:
                 delta = 1 if m2.group(1) == "++" else -1
                 name = m2.group(2)
@@ -7286,10 +7625,47 @@ class CppCompiler:
     def _allocate_var_register(self, name: str) -> str:
         if not self.var_register_pool:
             raise CppCompilerError("Out of registers for variable allocation")
-        reg = self.var_register_pool.pop(0)
+        reg = self.var_register_pool.popleft()
+        self._var_pool_generation += 1
         self.var_registers[name] = reg
         return reg
 
+    def _push_loop_frame(self, break_label: str, continue_label: str) -> Dict[str, Any]:
+        frame = {"break": break_label, "continue": continue_label,
+                 "preheader": [], "invariant_regs": {}}
+        self.loop_stack.append(frame)
+        return frame
+
+    def _pop_loop_frame(self, frame: Dict[str, Any]) -> None:
+        """Pop a loop frame and hand its hoisted registers back to the var pool."""
+        self.loop_stack.pop()
+        regs = list(frame["invariant_regs"].values())
+        if regs:
+            self.var_register_pool.extendleft(reversed(regs))
+            self._var_pool_generation += 1
+
+    def _loop_invariant_base(self, base_addr: int) -> Optional[str]:
+        """Return a register holding base_addr for the innermost loop, or None.
+
+        The LOADI is placed in the loop preheader so the body only adds the base.
+        A few var registers are always left free for declarations in the body.
+        """
+        for frame in reversed(self.loop_stack):
+            if "preheader" in frame:
+                break
+        else:
+            return None
+        invariant_regs = frame["invariant_regs"]
+        reg = invariant_regs.get(base_addr)
+        if reg is None:
+            if len(self.var_register_pool) <= 3:
+                return None
+            reg = self.var_register_pool.popleft()
+            self._var_pool_generation += 1
+            invariant_regs[base_addr] = reg
+            frame["preheader"].append(f"    LOADI {reg}, {base_addr}")
+        return reg
+
     def _require_variable(self, name: str) -> str:
         if name not in self.var_registers:
             raise CppCompilerError(f"Use of undeclared variable '{name}'")
@@ -7299,23 +7675,37 @@ class CppCompiler:
         if not self.temp_register_pool:
             raise CppCompilerError("Out of temporary registers for expression evaluation")
         reg = self.temp_register_pool.pop()
-        self._temp_register_stack.append(reg)
+        self._temp_register_stack.add(reg)
         # Debug logging for register allocation
-        try:
-            self.log(f"acquire_temp: {reg} (pool now: {self.temp_register_pool})", "DEBUG")
-        except Exception:
-            pass
+        if self.debug_enabled:
+            self.log("acquire_temp: %s (pool now: %s)", reg, list(self.temp_register_pool))
         return reg
 
-    def _release_temp_register(self, reg: str):
+    def _release_temp_register(self, reg: str) -> None:
         if reg in self._temp_register_stack:
-            self._temp_register_stack.remove(reg)
+            self._temp_register_stack.discard(reg)
             self.stats["registers_reused"] += 1
         self.temp_register_pool.append(reg)
+        if self.debug_enabled:
+            self.log("release_temp: %s (pool now: %s)", reg, list(self.temp_register_pool))
+
+    def _reads_register(self, nodes: List[ast.expr], reg: str) -> bool:
+        """True if any variable read by the expressions in `nodes` lives in `reg`."""
+        var_registers = self.var_registers
+        return any(
+            isinstance(sub, ast.Name) and var_registers.get(sub.id) == reg
+            for node in nodes
+            for sub in ast.walk(node)
+        )
+
+    @contextlib.contextmanager
+    def _temp_register(self) -> Iterator[str]:
+        """Acquire a temp register for the duration of a with-block."""
+        reg = self._acquire_temp_register()
         try:
-            self.log(f"release_temp: {reg} (pool now: {self.temp_register_pool})", "DEBUG")
-        except Exception:
-            pass
+            yield reg
+        finally:
+            self._release_temp_register(reg)
     
     def _release_all_temp_registers(self):
         """Release all temp registers - useful for cleanup"""
@@ -7324,10 +7714,24 @@ class CppCompiler:
             if reg not in self.temp_register_pool:
                 self.temp_register_pool.append(reg)
 
-    def _emit_load_immediate(self, target: str, value: int) -> List[str]:
+    def _emit_element_address(self, idx_reg: str, base_addr: int, code: List[str]) -> None:
+        """Turn an element index in idx_reg into its word address (base + index * 4)."""
+        # Two doublings stand in for the shift by 2
+        code.append(f"    ADD {idx_reg}, {idx_reg}")
+        code.append(f"    ADD {idx_reg}, {idx_reg}")  # idx_reg = index * 4
+        base_reg = self._loop_invariant_base(base_addr)
+        if base_reg is not None:
+            code.append(f"    ADD {idx_reg}, {base_reg}")  # idx_reg = base + (index * 4)
+            return
+        with self._temp_register() as addr_reg:
+            code.append(f"    LOADI {addr_reg}, {base_addr}")
+            code.append(f"    ADD {idx_reg}, {addr_reg}")  # idx_reg = base + (index * 4)
+
+    def _emit_load_immediate(self, target: str, value: int, code: List[str]) -> None:
         # Handle values that fit in 16-bit signed
         if -32768 <= value <= 32767:
-            return [f"    LOADI {target}, {value}"]
+            code.append(f"    LOADI {target}, {value}")
+            return
         
         # For larger values, load in parts
         # This is a workaround for 32-bit constants
@@ -7335,7 +7739,6 @@ class CppCompiler:
         low = value & 0xFFFF
         high = (value >> 16) & 0xFFFF
         
-        code = []
         if high == 0:
             # Only low part needed
             code.append(f"    LOADI {target}, {low}")
@@ -7344,1224 +7747,876 @@ class CppCompiler:
             self.warnings.append(f"Large constant 0x{value:08x} may not load correctly")
             # Just load the low part for now
             code.append(f"    LOADI {target}, {low & 0x7FFF}")
-        
-        return code
 
     def _emit_expression_to_register(self, node, target: str) -> List[str]:
         code: List[str] = []
-        # Handle constant string literals explicitly (return address to string)
-        if isinstance(node, ast.Constant) and isinstance(node.value, str):
-            label = self._add_string_literal(node.value)
-            return [f"    LOADI {target}, {label}"]
+        self._emit_expression_into(node, target, code)
+        return code
+
+    def _emit_expression_into(self, node: ast.expr, target: str, out: List[str]) -> None:
+        """Append code evaluating `node` into register `target` to `out`.
 
+        Nested sub-expressions append into the same list, so a deep expression
+        tree builds its code without intermediate lists. Anything that folds to a
+        constant is loaded directly; other nodes dispatch on their exact type
+        through self._expression_emitters.
+        """
         const_val = self._try_constant_value(node)
         if const_val is not None:
-            code.extend(self._emit_load_immediate(target, const_val))
-            return code
-        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
-            code.extend(self._emit_expression_to_register(node.operand, target))
-            lbl_true = self._new_label("not_is_zero")
-            lbl_done = self._new_label("not_done")
+            self._emit_load_immediate(target, const_val, out)
+            return
+        emitter = self._expression_emitters.get(type(node))
+        if emitter is None:
+            self._raise_unsupported_expression(node)
+        emitter(node, target, out)
+
+    def _raise_unsupported_expression(self, node: ast.AST) -> None:
+        # Emit a helpful debug message about unsupported node types
+        try:
+            nodetype = type(node).__name__
+        except Exception:
+            nodetype = str(node)
+        self.log("unsupported_expression_node: %s", nodetype, level="ERROR")
+        raise CppCompilerError("Unsupported expression construct")
+
+    # ------------------------------------------------------------------
+    # Expression emitters, dispatched on type(node) through self._expression_emitters
+    # ------------------------------------------------------------------
+    def _emit_expr_constant(self, node: ast.Constant, target: str, code: List[str]) -> None:
+        # Numeric constants were folded already; string literals load their address
+        if not isinstance(node.value, str):
+            self._raise_unsupported_expression(node)
+        label = self._add_string_literal(node.value)
+        code.append(f"    LOADI {target}, {label}")
+
+    def _emit_expr_unary(self, node: ast.UnaryOp, target: str, code: List[str]) -> None:
+        self._emit_expression_into(node.operand, target, code)
+        if isinstance(node.op, ast.Not):
+            # Branchless logical not: 1 exactly when the operand compared equal to zero
             code.append(f"    CMP {target}, 0")
-            code.append(f"    JE {lbl_true}")
-            code.append(f"    LOADI {target}, 0")
-            code.append(f"    JMP {lbl_done}")
-            code.append(f"{lbl_true}:")
-            code.append(f"    LOADI {target}, 1")
-            code.append(f"{lbl_done}:")
-            return code
-        if isinstance(node, ast.UnaryOp):
-            code.extend(self._emit_expression_to_register(node.operand, target))
-            if isinstance(node.op, ast.USub):
-                code.append(f"    NEG {target}")
-            elif isinstance(node.op, ast.UAdd):
-                pass
-            else:
-                raise CppCompilerError("Unsupported unary operator")
-            return code
-        if isinstance(node, ast.Subscript):
-            # Handle array access: arr[index]
-            if isinstance(node.value, ast.Name):
-                arr_name = node.value.id
-                if arr_name in self.arrays:
-                    arr_info = self.arrays[arr_name]
-                    base_addr = arr_info["addr"]
-                    size = int(arr_info.get("size", 0))
-                    
-                    # Evaluate index
-                    idx_reg = self._acquire_temp_register()
-                    code.extend(self._emit_expression_to_register(node.slice, idx_reg))
+            code.append(f"    SETZ {target}")
+        elif isinstance(node.op, ast.USub):
+            code.append(f"    NEG {target}")
+        elif not isinstance(node.op, ast.UAdd):
+            raise CppCompilerError("Unsupported unary operator")
+
+    def _emit_expr_subscript(self, node: ast.Subscript, target: str, code: List[str]) -> None:
+        # Handle array access: arr[index]
+        if isinstance(node.value, ast.Name):
+            arr_name = node.value.id
+            if arr_name in self.arrays:
+                arr_info = self.arrays[arr_name]
+                base_addr = arr_info["addr"]
+                size = int(arr_info.get("size", 0))
+                
+                # Evaluate index
+                with self._temp_register() as idx_reg:
+                    self._emit_expression_into(node.slice, idx_reg, code)
                     # Bounds check: 0 <= index < size
                     if size > 0:
-                        code.extend(self._emit_bounds_check(idx_reg, size))
-                    
-                    # Calculate address: base + (index * 4)
-                    addr_reg = self._acquire_temp_register()
-                    code.append(f"    LOADI {addr_reg}, 4")
-                    code.append(f"    MUL {idx_reg}, {addr_reg}")  # idx_reg = index * 4
-                    code.append(f"    LOADI {addr_reg}, {base_addr}")
-                    code.append(f"    ADD {idx_reg}, {addr_reg}")  # idx_reg = base + (index * 4)
+                        self._emit_bounds_check(idx_reg, size, code)
+                    self._emit_element_address(idx_reg, base_addr, code)
                     
                     # Load value from memory
                     code.append(f"    LOAD {target}, {idx_reg}")
-                    
-                    self._release_temp_register(addr_reg)
-                    self._release_temp_register(idx_reg)
-                    return code
-            raise CppCompilerError("Array subscript not supported in this context")
-        
-        if isinstance(node, ast.Name):
-            # If this name refers to a declared array, return its base address
-            if node.id in self.arrays:
-                base_addr = self.arrays[node.id]["addr"]
-                code.append(f"    LOADI {target}, {base_addr}")
-                return code
-            src = self._require_variable(node.id)
-            if src != target:
-                code.append(f"    MOV {target}, {src}")
-            return code
+                return
+        raise CppCompilerError("Array subscript not supported in this context")
+
+    def _emit_expr_name(self, node: ast.Name, target: str, code: List[str]) -> None:
+        # If this name refers to a declared array, return its base address
+        if node.id in self.arrays:
+            base_addr = self.arrays[node.id]["addr"]
+            code.append(f"    LOADI {target}, {base_addr}")
+            return
+        src = self._require_variable(node.id)
+        if src != target:
+            code.append(_MOV_LINES.get((target, src)) or f"    MOV {target}, {src}")
+
+    def _emit_expr_ifexp(self, node: ast.IfExp, target: str, code: List[str]) -> None:
         # Ternary conditional operator: <test> ? <body> : <orelse>
-        if isinstance(node, ast.IfExp):
-            # Evaluate test into a temp register
-            test_reg = self._acquire_temp_register()
-            code.extend(self._emit_expression_to_register(node.test, test_reg))
-            lbl_true = self._new_label('tern_true')
-            lbl_done = self._new_label('tern_done')
-            # If test == 0 -> false branch
-            code.append(f"    CMP {test_reg}, 0")
-            code.append(f"    JE {lbl_true}")
-            # true branch: evaluate body into target
-            code.extend(self._emit_expression_to_register(node.body, target))
-            code.append(f"    JMP {lbl_done}")
-            # false branch
-            code.append(f"{lbl_true}:")
-            code.extend(self._emit_expression_to_register(node.orelse, target))
-            code.append(f"{lbl_done}:")
-            self._release_temp_register(test_reg)
-            return code
-        if isinstance(node, ast.Compare):
-            if len(node.ops) != 1 or len(node.comparators) != 1:
-                raise CppCompilerError("Chained comparisons not supported")
-            left = node.left
-            right = node.comparators[0]
-            op = node.ops[0]
-            code.extend(self._emit_expression_to_register(left, target))
-            rhs_code, rhs_reg, should_release = self._load_operand(right)
-            code.extend(rhs_code)
-            code.append(f"    CMP {target}, {rhs_reg}")
-            lbl_true = self._new_label("cmp_true")
-            lbl_done = self._new_label("cmp_done")
-            code.append(f"    LOADI {target}, 0")
-            if isinstance(op, ast.Eq):
-                jmp_true = "JE"
-            elif isinstance(op, ast.NotEq):
-                jmp_true = "JNE"
-            elif isinstance(op, ast.Gt):
-                jmp_true = "JG"
-            elif isinstance(op, ast.GtE):
-                jmp_true = "JGE"
-            elif isinstance(op, ast.Lt):
-                jmp_true = "JL"
-            elif isinstance(op, ast.LtE):
-                jmp_true = "JLE"
-            else:
-                raise CppCompilerError("Unsupported comparison operator")
-            code.append(f"    {jmp_true} {lbl_true}")
-            code.append(f"    JMP {lbl_done}")
-            code.append(f"{lbl_true}:")
-            code.append(f"    LOADI {target}, 1")
-            code.append(f"{lbl_done}:")
-            if should_release:
-                self._release_temp_register(rhs_reg)
-            return code
-        if isinstance(node, ast.BoolOp):
-            if not isinstance(node.op, (ast.And, ast.Or)):
-                raise CppCompilerError("Unsupported boolean operator")
-            code.extend(self._emit_expression_to_register(node.values[0], target))
-            code.extend(self._emit_coerce_to_bool(target))
-            if isinstance(node.op, ast.And):
-                lbl_done = self._new_label("and_done")
-                code.append(f"    CMP {target}, 0")
-                code.append(f"    JE {lbl_done}")
-                for rhs in node.values[1:]:
-                    treg = self._acquire_temp_register()
-                    code.extend(self._emit_expression_to_register(rhs, treg))
-                    code.append(f"    MOV {target}, {treg}")
-                    self._release_temp_register(treg)
-                    code.extend(self._emit_coerce_to_bool(target))
-                code.append(f"{lbl_done}:")
-                return code
-            else:
-                lbl_done = self._new_label("or_done")
-                code.append(f"    CMP {target}, 0")
+        # Evaluate test into a temp register
+        test_reg = self._acquire_temp_register()
+        self._emit_expression_into(node.test, test_reg, code)
+        lbl_true = self._new_label('tern_true')
+        lbl_done = self._new_label('tern_done')
+        # If test == 0 -> false branch
+        code.append(f"    CMP {test_reg}, 0")
+        code.append(f"    JE {lbl_true}")
+        # true branch: evaluate body into target
+        self._emit_expression_into(node.body, target, code)
+        code.append(f"    JMP {lbl_done}")
+        # false branch
+        code.append(f"{lbl_true}:")
+        self._emit_expression_into(node.orelse, target, code)
+        code.append(f"{lbl_done}:")
+        self._release_temp_register(test_reg)
+
+    def _emit_expr_compare(self, node: ast.Compare, target: str, code: List[str]) -> None:
+        if len(node.ops) != 1 or len(node.comparators) != 1:
+            raise CppCompilerError("Chained comparisons not supported")
+        left = node.left
+        right = node.comparators[0]
+        op = node.ops[0]
+        self._emit_expression_into(left, target, code)
+        rhs_reg, should_release = self._load_operand(right, code)
+        # Branchless: CMP then SETcc target. Only SETZ/SETNZ/SETL have one-byte opcodes,
+        # so > and <= swap the operands and >= and <= negate the SETL result.
+        entry = _COMPARE_SETCC.get(type(op))
+        if entry is None:
+            raise CppCompilerError("Unsupported comparison operator")
+        setcc, swap, negate = entry
+        if swap:
+            code.append(_CMP_LINES.get((rhs_reg, target)) or f"    CMP {rhs_reg}, {target}")
+        else:
+            code.append(_CMP_LINES.get((target, rhs_reg)) or f"    CMP {target}, {rhs_reg}")
+        code.append(f"    {setcc} {target}")
+        if negate:
+            code.append(f"    CMP {target}, 0")
+            code.append(f"    SETZ {target}")
+        if should_release:
+            self._release_temp_register(rhs_reg)
+
+    def _emit_expr_boolop(self, node: ast.BoolOp, target: str, code: List[str]) -> None:
+        if not isinstance(node.op, (ast.And, ast.Or)):
+            raise CppCompilerError("Unsupported boolean operator")
+        is_and = isinstance(node.op, ast.And)
+        lbl_done = self._new_label("and_done" if is_and else "or_done")
+        *leading, last = node.values
+        for value in leading:
+            self._emit_expression_into(value, target, code)
+            if is_and:
+                # A zero operand already is the 0 result, so no coercion before the exit
+                code.append(f"    CBZ {target}, {lbl_done}")
+            else:
+                # Coercion leaves the flags of the CMP for the short-circuit exit
+                self._emit_coerce_to_bool(target, code)
                 code.append(f"    JNE {lbl_done}")
-                for rhs in node.values[1:]:
-                    treg = self._acquire_temp_register()
-                    code.extend(self._emit_expression_to_register(rhs, treg))
-                    code.append(f"    MOV {target}, {treg}")
-                    self._release_temp_register(treg)
-                    code.extend(self._emit_coerce_to_bool(target))
-                code.append(f"{lbl_done}:")
-                return code
-        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
-            fname = node.func.id
-            # Small debug trace of intrinsic resolution
-            self.log(f"emit_call: {fname} args={len(node.args)} target={target}", "DEBUG")
-            # Intrinsic math helpers mapped directly to CPU opcodes
-            if fname == "abs" and len(node.args) == 1:
-                # abs(x) -> ABS target, target
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    ABS {target}, {target}")
-                return code
-            if fname in ("min", "max") and len(node.args) == 2:
-                # min(a,b) / max(a,b) -> MIN/MAX target, rhs_reg
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                rhs_code, rhs_reg, should_release = self._load_operand(node.args[1])
-                code.extend(rhs_code)
-                op = "MIN" if fname == "min" else "MAX"
-                code.append(f"    {op} {target}, {rhs_reg}")
-                if should_release:
-                    self._release_temp_register(rhs_reg)
-                return code
-            if fname == "sqrt" and len(node.args) == 1:
-                # sqrt(x) -> SQRT target, target
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    SQRT {target}, {target}")
-                return code
-            if fname == "pow" and len(node.args) == 2:
-                # pow(a,b) -> POW target, rhs_reg
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                rhs_code, rhs_reg, should_release = self._load_operand(node.args[1])
-                code.extend(rhs_code)
-                code.append(f"    POW {target}, {rhs_reg}")
-                if should_release:
-                    self._release_temp_register(rhs_reg)
-                return code
-            if fname == "log" and len(node.args) == 1:
-                # log(x) -> LOG target, target
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    LOG {target}, {target}")
-                return code
-            if fname == "exp" and len(node.args) == 1:
-                # exp(x) -> EXP target, target
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    EXP {target}, {target}")
-                return code
-            if fname == "sin" and len(node.args) == 1:
-                # sin(x) -> SIN target, target
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    SIN {target}, {target}")
-                return code
-            if fname == "cos" and len(node.args) == 1:
-                # cos(x) -> COS target, target
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    COS {target}, {target}")
-                return code
-            if fname == "tan" and len(node.args) == 1:
-                # tan(x) -> TAN target, target
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    TAN {target}, {target}")
-                return code
-            # Non-math utility intrinsics
-            if fname == "rand" and len(node.args) == 0:
-                # rand() -> RANDOM target
-                code.append(f"    RANDOM {target}")
-                return code
-            if fname == "rand_range" and len(node.args) == 2:
-                # rand_range(lo, hi) -> uniform integer in [lo, hi] when hi >= lo
-                # Fallback: if span <= 0, just return lo
-                lo_reg = self._acquire_temp_register()
-                hi_reg = self._acquire_temp_register()
-                span_reg = self._acquire_temp_register()
-                tmp_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], lo_reg))
-                code.extend(self._emit_expression_to_register(node.args[1], hi_reg))
-                # span = hi - lo + 1
-                code.append(f"    MOV {span_reg}, {hi_reg}")
-                code.append(f"    SUB {span_reg}, {lo_reg}")
-                code.append(f"    ADD {span_reg}, 1")
-                lbl_bad = self._new_label("rand_range_bad")
-                lbl_ok = self._new_label("rand_range_ok")
-                lbl_done = self._new_label("rand_range_done")
-                # If span <= 0, branch to bad
-                code.append(f"    CMP {span_reg}, 0")
-                code.append(f"    JLE {lbl_bad}")
+        self._emit_expression_into(last, target, code)
+        self._emit_coerce_to_bool(target, code)
+        code.append(f"{lbl_done}:")
+
+    def _emit_expr_call(self, node: ast.Call, target: str, code: List[str]) -> None:
+        if not isinstance(node.func, ast.Name):
+            self._raise_unsupported_expression(node)
+        fname = node.func.id
+        args = node.args
+        argc = len(args)
+        # Small debug trace of intrinsic resolution, only built when debugging
+        if self.debug_enabled:
+            self.log("emit_call: %s args=%d target=%s", fname, argc, target)
+        handler = self._intrinsics.get((fname, argc))
+        if handler is not None:
+            handler(args, target, code)
+            return
+
+        # Regular function calls
+        if args:
+            # One temp suffices: each argument is pushed before the next
+            # one is evaluated into the same register. Variables that are
+            # not arrays are pushed straight from their own register.
+            emit = self._emit_expression_into
+            treg = self._acquire_temp_register()
+            push = f"    PUSH {treg}"
+            var_registers = self.var_registers
+            arrays = self.arrays
+            for arg in reversed(args):
+                if isinstance(arg, ast.Name) and arg.id in var_registers and arg.id not in arrays:
+                    code.append(f"    PUSH {var_registers[arg.id]}")
+                    continue
+                emit(arg, treg, code)
+                code.append(push)
+            self._release_temp_register(treg)
+        if fname in self.var_registers:
+            reg = self._require_variable(fname)
+            code.append(f"    CALLR {reg}")
+        else:
+            code.append(f"    CALL {fname}")
+        if args:
+            code.append(f"    ADDI R14, {argc*4}")
+        if target != "R0":
+            code.append(_MOV_FROM_R0_LINES[target])
+
+    def _emit_expr_binop(self, node: ast.BinOp, target: str, code: List[str]) -> None:
+        self._emit_expression_into(node.left, target, code)
+        mnemonic = _BINOP_MNEMONIC.get(type(node.op))
+        if mnemonic in _IMMEDIATE_BINOPS:
+            imm = self._try_constant_value(node.right)
+            if imm is not None and -32768 <= imm <= 32767:
+                # OP target, imm: no temp register and no LOADI for the constant
+                code.append(_T_OP2 % (mnemonic, target, imm))
+                return
+        rhs_reg, should_release = self._load_operand(node.right, code)
+        self._emit_binop(node.op, target, rhs_reg, code)
+        if should_release:
+            self._release_temp_register(rhs_reg)
+
+    # ------------------------------------------------------------------
+    # Intrinsic call handlers, dispatched through self._intrinsics
+    # ------------------------------------------------------------------
+    def _emit_intrinsic_unary(self, opcode: str, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # f(x) -> OP target, target
+        self._emit_expression_into(args[0], target, code)
+        code.append(_T_OP2 % (opcode, target, target))
+
+    def _emit_intrinsic_in_place(self, opcode: str, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # f(x) -> OP target (single operand form)
+        self._emit_expression_into(args[0], target, code)
+        code.append(_T_OP1 % (opcode, target))
+
+    def _emit_intrinsic_binary(self, opcode: str, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # f(a, b) -> OP target, rhs_reg
+        self._emit_expression_into(args[0], target, code)
+        rhs_reg, should_release = self._load_operand(args[1], code)
+        code.append(_T_OP2 % (opcode, target, rhs_reg))
+        if should_release:
+            self._release_temp_register(rhs_reg)
+
+    def _emit_intrinsic_pow(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # pow(base, exp) -> POW target, exp_reg; small constant exponents become a MUL chain
+        exp = self._try_constant_value(args[1])
+        if exp is None or not 0 <= exp <= 8:
+            self._emit_intrinsic_binary("POW", args, target, code)
+            return
+        if exp == 0:
+            if any(isinstance(sub, ast.Call) for sub in ast.walk(args[0])):
+                # Keep the side effects of the base, only its value is dropped
+                self._emit_expression_into(args[0], target, code)
+            code.append(f"    LOADI {target}, 1")
+            return
+        self._emit_expression_into(args[0], target, code)
+        bits = bin(exp)[3:]
+        if "1" not in bits:
+            # Powers of two only ever square the accumulator
+            code.extend([_T_OP2 % ("MUL", target, target)] * len(bits))
+            return
+        # Left-to-right square-and-multiply over the bits below the leading one
+        with self._temp_register() as base_reg:
+            code.append(_T_OP2 % ("MOV", base_reg, target))
+            for bit in bits:
+                code.append(_T_OP2 % ("MUL", target, target))
+                if bit == "1":
+                    code.append(_T_OP2 % ("MUL", target, base_reg))
+
+    def _emit_intrinsic_rotate(self, opcode: str, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # rotl/rotr(value, shift) -> ROL/ROR target, shift_reg
+        self._emit_expression_into(args[0], target, code)
+        with self._temp_register() as shift_reg:
+            self._emit_expression_into(args[1], shift_reg, code)
+            code.append(_T_OP2 % (opcode, target, shift_reg))
+
+    def _emit_intrinsic_string_query(self, opcode: str, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # strcmp/strchr/strstr(a, b) -> OP target, a_reg, b_reg
+        with self._temp_register() as a_reg, self._temp_register() as b_reg:
+            self._emit_expression_into(args[0], a_reg, code)
+            self._emit_expression_into(args[1], b_reg, code)
+            code.append(_T_OP3 % (opcode, target, a_reg, b_reg))
+
+    def _emit_intrinsic_block_op(self, opcode: str, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # memset/memcpy/strncat/strncpy(dest, src, n) -> OP dest, src_reg, cnt_reg; returns dest
+        if target == _REGS[0] or self._reads_register(args[1:], target):
+            # R0 is scratch for nested division checks and calls, and a variable target read
+            # by src/n must keep its value until they are evaluated: stage dest in a temp
+            with self._temp_register() as dst_reg, self._temp_register() as src_reg, self._temp_register() as cnt_reg:
+                self._emit_expression_into(args[0], dst_reg, code)
+                self._emit_expression_into(args[1], src_reg, code)
+                self._emit_expression_into(args[2], cnt_reg, code)
+                code.extend((
+                    _T_OP3 % (opcode, dst_reg, src_reg, cnt_reg),
+                    _T_OP2 % ("MOV", target, dst_reg),
+                ))
+            return
+        # The dest pointer is also the return value, so evaluate it straight into target
+        self._emit_expression_into(args[0], target, code)
+        with self._temp_register() as src_reg, self._temp_register() as cnt_reg:
+            self._emit_expression_into(args[1], src_reg, code)
+            self._emit_expression_into(args[2], cnt_reg, code)
+            code.append(_T_OP3 % (opcode, target, src_reg, cnt_reg))
+
+    def _emit_intrinsic_draw(self, opcode: str, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # line/rect/fillrect/circle/fillcircle(..., color) -> coordinates in R0.., OP color_reg
+        *coords, color = args
+        held = self._emit_fixed_register_args(coords, _DRAW_COORD_REGS, code)
+        with self._temp_register() as color_reg:
+            color_src = held.get(_structural_key(color))
+            if color_src is not None:
+                code.append(_T_OP2 % ("MOV", color_reg, color_src))
+            else:
+                self._emit_expression_into(color, color_reg, code)
+            code.append(_T_OP1 % (opcode, color_reg))
+        code.append(_LOADI_ZERO_LINES[target])  # Return 0
+
+    def _emit_fixed_register_args(self, args: List[ast.expr], regs: Tuple[str, ...], code: List[str]) -> Dict[Tuple[Any, ...], str]:
+        """Evaluate args into the fixed argument registers regs, in order.
+
+        An argument repeated verbatim (same _structural_key) is copied from the register
+        that already holds it instead of being evaluated again. Returns the
+        key -> register map of values still live once all args are loaded.
+        """
+        held: Dict[Tuple[Any, ...], str] = {}
+        for arg, reg in zip(args, regs):
+            key = _structural_key(arg)
+            src = held.get(key)
+            if src is not None:
+                code.append(_T_OP2 % ("MOV", reg, src))
+                continue
+            self._emit_expression_into(arg, reg, code)
+            if not isinstance(arg, (ast.Name, ast.Constant)):
+                # Compound arguments may use temps (R1-R3) and R0 scratch, so the
+                # registers loaded so far can no longer be trusted as copy sources
+                held.clear()
+            if not any(isinstance(sub, ast.Call) for sub in ast.walk(arg)):
+                held[key] = reg
+        return held
+
+    def _emit_intrinsic_rand(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # rand() -> RANDOM target
+        code.append(f"    RANDOM {target}")
+
+    def _emit_intrinsic_rand_range(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # rand_range(lo, hi) -> uniform integer in [lo, hi] when hi >= lo
+        # Fallback: if span <= 0, just return lo
+        with self._temp_register() as lo_reg, self._temp_register() as hi_reg, self._temp_register() as span_reg, self._temp_register() as tmp_reg:
+            self._emit_expression_into(args[0], lo_reg, code)
+            self._emit_expression_into(args[1], hi_reg, code)
+            # span = hi - lo + 1
+            code.extend((
+                f"    MOV {span_reg}, {hi_reg}",
+                f"    SUB {span_reg}, {lo_reg}",
+                f"    ADD {span_reg}, 1",
+            ))
+            lbl_bad = self._new_label("rand_range_bad")
+            lbl_ok = self._new_label("rand_range_ok")
+            lbl_done = self._new_label("rand_range_done")
+            # If span <= 0, branch to bad
+            code.extend((
+                f"    CMP {span_reg}, 0",
+                f"    JLE {lbl_bad}",
                 # Good span: RANDOM -> tmp_reg, MOD by span, add lo
-                code.append(f"    RANDOM {tmp_reg}")
-                # Guard against zero span just in case
-                code.extend(self._emit_div_zero_check(span_reg))
-                code.append(f"    MOD {tmp_reg}, {span_reg}")
-                code.append(f"    ADD {tmp_reg}, {lo_reg}")
-                code.append(f"    MOV {target}, {tmp_reg}")
-                code.append(f"    JMP {lbl_done}")
-                code.append(f"{lbl_bad}:")
-                code.append(f"    MOV {target}, {lo_reg}")
-                code.append(f"{lbl_done}:")
-                self._release_temp_register(tmp_reg)
-                self._release_temp_register(span_reg)
-                self._release_temp_register(hi_reg)
-                self._release_temp_register(lo_reg)
-                return code
-            if fname == "hash" and len(node.args) == 1:
-                # hash(x) -> HASH target, target
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    HASH {target}, {target}")
-                return code
-            if fname == "crc32" and len(node.args) == 1:
-                # crc32(x) -> CRC32 target, target
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    CRC32 {target}, {target}")
-                return code
-            if fname == "popcount" and len(node.args) == 1:
-                # popcount(x) -> POPCOUNT target, target
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    POPCOUNT {target}, {target}")
-                return code
-            if fname == "lzcnt" and len(node.args) == 1:
-                # lzcnt(x) -> LZCNT target, target
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    LZCNT {target}, {target}")
-                return code
-            if fname == "tzcnt" and len(node.args) == 1:
-                # tzcnt(x) -> TZCNT target, target
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    TZCNT {target}, {target}")
-                return code
-            if fname == "lowbit" and len(node.args) == 1:
-                # lowbit(x) -> lowest set bit (x & -x)
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                tmp_reg = self._acquire_temp_register()
-                code.append(f"    MOV {tmp_reg}, {target}")
-                code.append(f"    NEG {tmp_reg}")
-                code.append(f"    AND {target}, {tmp_reg}")
-                self._release_temp_register(tmp_reg)
-                return code
-            if fname == "is_pow2" and len(node.args) == 1:
-                # is_pow2(x) -> 1 if x is a power of two, else 0
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                tmp_reg = self._acquire_temp_register()
-                code.append(f"    MOV {tmp_reg}, {target}")
-                code.append(f"    SUB {tmp_reg}, 1")
-                code.append(f"    AND {tmp_reg}, {target}")
-                lbl_not = self._new_label("is_pow2_not")
-                lbl_done = self._new_label("is_pow2_done")
-                code.append(f"    CMP {target}, 0")
-                code.append(f"    JLE {lbl_not}")
-                code.append(f"    CMP {tmp_reg}, 0")
-                code.append(f"    JNE {lbl_not}")
-                code.append(f"    LOADI {target}, 1")
-                code.append(f"    JMP {lbl_done}")
-                code.append(f"{lbl_not}:")
-                code.append(f"    LOADI {target}, 0")
-                code.append(f"{lbl_done}:")
-                self._release_temp_register(tmp_reg)
-                return code
-            if fname == "bsf" and len(node.args) == 1:
-                # bsf(x) -> BSF target, target (index of least significant set bit)
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    BSF {target}, {target}")
-                return code
-            if fname == "bsr" and len(node.args) == 1:
-                # bsr(x) -> BSR target, target (index of most significant set bit)
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    BSR {target}, {target}")
-                return code
-            if fname == "mul_high" and len(node.args) == 2:
-                # mul_high(a, b) -> high 32 bits of 64-bit product using MULH
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                rhs_code, rhs_reg, should_release = self._load_operand(node.args[1])
-                code.extend(rhs_code)
-                code.append(f"    MULH {target}, {rhs_reg}")
-                if should_release:
-                    self._release_temp_register(rhs_reg)
-                return code
-            if fname == "divmod_q" and len(node.args) == 2:
-                # divmod_q(a, b) -> quotient using DIVMOD (remainder discarded)
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                rhs_code, rhs_reg, should_release = self._load_operand(node.args[1])
-                code.extend(rhs_code)
-                code.append(f"    DIVMOD {target}, {rhs_reg}")
-                if should_release:
-                    self._release_temp_register(rhs_reg)
-                return code
-            if fname == "rotl" and len(node.args) == 2:
-                # rotl(value, shift) -> ROL target, shift_reg (rotate left)
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                shift_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[1], shift_reg))
-                code.append(f"    ROL {target}, {shift_reg}")
-                self._release_temp_register(shift_reg)
-                return code
-            if fname == "rotr" and len(node.args) == 2:
-                # rotr(value, shift) -> ROR target, shift_reg (rotate right)
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                shift_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[1], shift_reg))
-                code.append(f"    ROR {target}, {shift_reg}")
-                self._release_temp_register(shift_reg)
-                return code
-            if fname == "bswap" and len(node.args) == 1:
-                # bswap(x) -> BSWAP target, target
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    BSWAP {target}, {target}")
-                return code
-            # Game/Demo utility functions
-            if fname == "sleep" and len(node.args) == 1:
-                # sleep(ms) -> SLEEP R0, src_reg (two operand form, dst unused)
-                src_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], src_reg))
-                code.append(f"    SLEEP R0, {src_reg}")
-                code.append(f"    LOADI {target}, 0")  # Return 0
-                self._release_temp_register(src_reg)
-                return code
-            # Input/Output functions for interactive programs
-            if fname == "get_input" and len(node.args) == 0:
-                # get_input() -> syscall 46 (INPUT_INT) - read integer from stdin
-                code.append(f"    LOADI R0, 46  ; INPUT_INT syscall")
-                code.append(f"    SYSCALL R0")
-                code.append(f"    MOV {target}, R0")
-                return code
-            if fname == "get_string" and len(node.args) == 1:
-                # get_string(buf_addr) -> syscall 45 (INPUT) - read string from stdin
-                buf_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], buf_reg))
-                code.append(f"    LOADI R0, 45  ; INPUT syscall")
-                code.append(f"    MOV R1, {buf_reg}")
-                code.append(f"    LOADI R2, 256  ; max length")
-                code.append(f"    SYSCALL R0")
-                code.append(f"    MOV {target}, R0  ; Return length read")
-                self._release_temp_register(buf_reg)
-                return code
-            if fname == "gettime" and len(node.args) == 0:
-                # gettime() -> GETTIME target, R0 (two operand form)
-                code.append(f"    GETTIME {target}, R0")
-                return code
-            if fname == "swap" and len(node.args) == 2:
-                # swap(a, b) - swap two variables
-                if not isinstance(node.args[0], ast.Name) or not isinstance(node.args[1], ast.Name):
-                    raise CppCompilerError("swap() requires two variable names")
-                reg_a = self._require_variable(node.args[0].id)
-                reg_b = self._require_variable(node.args[1].id)
-                code.append(f"    XCHG {reg_a}, {reg_b}")
-                code.append(f"    LOADI {target}, 0")  # Return 0
-                return code
-            if fname == "assert_true" and len(node.args) == 2:
-                # assert_true(cond, code) - if !cond, set R0=code and HALT
-                cond_reg = self._acquire_temp_register()
-                code_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], cond_reg))
-                code.extend(self._emit_expression_to_register(node.args[1], code_reg))
-                lbl_ok = self._new_label("assert_true_ok")
-                code.append(f"    CMP {cond_reg}, 0")
-                code.append(f"    JNE {lbl_ok}")
-                code.append(f"    MOV R0, {code_reg}")
-                code.append("    HALT")
-                code.append(f"{lbl_ok}:")
-                code.append(f"    LOADI {target}, 0")
-                self._release_temp_register(code_reg)
-                self._release_temp_register(cond_reg)
-                return code
-            if fname == "assert_eq" and len(node.args) == 3:
-                # assert_eq(a, b, code) - if a != b, set R0=code and HALT
-                a_reg = self._acquire_temp_register()
-                b_reg = self._acquire_temp_register()
-                code_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], a_reg))
-                code.extend(self._emit_expression_to_register(node.args[1], b_reg))
-                code.extend(self._emit_expression_to_register(node.args[2], code_reg))
-                lbl_ok2 = self._new_label("assert_eq_ok")
-                code.append(f"    CMP {a_reg}, {b_reg}")
-                code.append(f"    JE {lbl_ok2}")
-                code.append(f"    MOV R0, {code_reg}")
-                code.append("    HALT")
-                code.append(f"{lbl_ok2}:")
-                code.append(f"    LOADI {target}, 0")
-                self._release_temp_register(code_reg)
-                self._release_temp_register(b_reg)
-                self._release_temp_register(a_reg)
-                return code
-            if fname == "wrap" and len(node.args) == 3:
-                # wrap(value, min, max) -> wrap integer into [min, max] range
-                val_reg = self._acquire_temp_register()
-                lo_reg = self._acquire_temp_register()
-                hi_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], val_reg))
-                code.extend(self._emit_expression_to_register(node.args[1], lo_reg))
-                code.extend(self._emit_expression_to_register(node.args[2], hi_reg))
-                lbl_low = self._new_label("wrap_low")
-                lbl_high = self._new_label("wrap_high")
-                lbl_done = self._new_label("wrap_done")
-                # if val < lo -> max
-                code.append(f"    CMP {val_reg}, {lo_reg}")
-                code.append(f"    JL {lbl_low}")
+                f"    RANDOM {tmp_reg}",
+            ))
+            # Guard against zero span just in case
+            self._emit_div_zero_check(span_reg, code)
+            code.extend((
+                f"    MOD {tmp_reg}, {span_reg}",
+                f"    ADD {tmp_reg}, {lo_reg}",
+                f"    MOV {target}, {tmp_reg}",
+                f"    JMP {lbl_done}",
+                f"{lbl_bad}:",
+                f"    MOV {target}, {lo_reg}",
+                f"{lbl_done}:",
+            ))
+
+    def _emit_intrinsic_lowbit(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # lowbit(x) -> lowest set bit (x & -x)
+        self._emit_expression_into(args[0], target, code)
+        with self._temp_register() as tmp_reg:
+            code.extend((
+                f"    MOV {tmp_reg}, {target}",
+                f"    NEG {tmp_reg}",
+                f"    AND {target}, {tmp_reg}",
+            ))
+
+    def _emit_intrinsic_is_pow2(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # is_pow2(x) -> 1 if x is a power of two, else 0
+        self._emit_expression_into(args[0], target, code)
+        with self._temp_register() as tmp_reg:
+            code.extend((
+                f"    MOV {tmp_reg}, {target}",
+                f"    SUB {tmp_reg}, 1",
+                f"    AND {tmp_reg}, {target}",
+            ))
+            lbl_not = self._new_label("is_pow2_not")
+            lbl_done = self._new_label("is_pow2_done")
+            code.extend((
+                f"    CMP {target}, 0",
+                f"    JLE {lbl_not}",
+                f"    CMP {tmp_reg}, 0",
+                f"    JNE {lbl_not}",
+                f"    LOADI {target}, 1",
+                f"    JMP {lbl_done}",
+                f"{lbl_not}:",
+                _LOADI_ZERO_LINES[target],
+                f"{lbl_done}:",
+            ))
+
+    def _emit_intrinsic_sleep(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # sleep(ms) -> SLEEP R0, target (two operand form, dst unused); target is
+        # free until the 0 result is loaded, so it carries the operand
+        self._emit_expression_into(args[0], target, code)
+        code.extend((
+            f"    SLEEP R0, {target}",
+            _LOADI_ZERO_LINES[target],  # Return 0
+        ))
+
+    def _emit_intrinsic_get_input(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # get_input() -> syscall 46 (INPUT_INT) - read integer from stdin
+        code.extend((
+            f"    LOADI R0, 46  ; INPUT_INT syscall",
+            f"    SYSCALL R0",
+            _MOV_FROM_R0_LINES[target],
+        ))
+
+    def _emit_intrinsic_get_string(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # get_string(buf_addr) -> syscall 45 (INPUT) - read string from stdin
+        with self._temp_register() as buf_reg:
+            self._emit_expression_into(args[0], buf_reg, code)
+            code.extend((
+                f"    LOADI R0, 45  ; INPUT syscall",
+                f"    MOV R1, {buf_reg}",
+                f"    LOADI R2, 256  ; max length",
+                f"    SYSCALL R0",
+                f"    MOV {target}, R0  ; Return length read",
+            ))
+
+    def _emit_intrinsic_gettime(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # gettime() -> GETTIME target, R0 (two operand form)
+        code.append(f"    GETTIME {target}, R0")
+
+    def _emit_intrinsic_swap(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # swap(a, b) - swap two variables
+        if not isinstance(args[0], ast.Name) or not isinstance(args[1], ast.Name):
+            raise CppCompilerError("swap() requires two variable names")
+        reg_a = self._require_variable(args[0].id)
+        reg_b = self._require_variable(args[1].id)
+        code.extend((
+            f"    XCHG {reg_a}, {reg_b}",
+            _LOADI_ZERO_LINES[target],  # Return 0
+        ))
+
+    def _emit_intrinsic_assert_true(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # assert_true(cond, code) - if !cond, set R0=code and HALT
+        with self._temp_register() as cond_reg, self._temp_register() as code_reg:
+            self._emit_expression_into(args[0], cond_reg, code)
+            self._emit_expression_into(args[1], code_reg, code)
+            lbl_ok = self._new_label("assert_true_ok")
+            code.extend((
+                f"    CMP {cond_reg}, 0",
+                f"    JNE {lbl_ok}",
+                f"    MOV R0, {code_reg}",
+                "    HALT",
+                f"{lbl_ok}:",
+                _LOADI_ZERO_LINES[target],
+            ))
+
+    def _emit_intrinsic_assert_eq(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # assert_eq(a, b, code) - if a != b, set R0=code and HALT
+        with self._temp_register() as a_reg, self._temp_register() as b_reg, self._temp_register() as code_reg:
+            self._emit_expression_into(args[0], a_reg, code)
+            self._emit_expression_into(args[1], b_reg, code)
+            self._emit_expression_into(args[2], code_reg, code)
+            lbl_ok2 = self._new_label("assert_eq_ok")
+            code.extend((
+                f"    CMP {a_reg}, {b_reg}",
+                f"    JE {lbl_ok2}",
+                f"    MOV R0, {code_reg}",
+                "    HALT",
+                f"{lbl_ok2}:",
+                _LOADI_ZERO_LINES[target],
+            ))
+
+    def _emit_intrinsic_wrap(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # wrap(value, min, max) -> wrap integer into [min, max] range
+        with self._temp_register() as val_reg, self._temp_register() as lo_reg, self._temp_register() as hi_reg:
+            self._emit_expression_into(args[0], val_reg, code)
+            self._emit_expression_into(args[1], lo_reg, code)
+            self._emit_expression_into(args[2], hi_reg, code)
+            lbl_low = self._new_label("wrap_low")
+            lbl_high = self._new_label("wrap_high")
+            lbl_done = self._new_label("wrap_done")
+            # if val < lo -> max
+            code.extend((
+                f"    CMP {val_reg}, {lo_reg}",
+                f"    JL {lbl_low}",
                 # if val > hi -> min
-                code.append(f"    CMP {val_reg}, {hi_reg}")
-                code.append(f"    JG {lbl_high}")
-                code.append(f"    MOV {target}, {val_reg}")
-                code.append(f"    JMP {lbl_done}")
-                code.append(f"{lbl_low}:")
-                code.append(f"    MOV {target}, {hi_reg}")
-                code.append(f"    JMP {lbl_done}")
-                code.append(f"{lbl_high}:")
-                code.append(f"    MOV {target}, {lo_reg}")
-                code.append(f"{lbl_done}:")
-                self._release_temp_register(hi_reg)
-                self._release_temp_register(lo_reg)
-                self._release_temp_register(val_reg)
-                return code
-            if fname == "move_towards" and len(node.args) == 3:
-                # move_towards(pos, target_pos, step) -> stepwise move without overshoot
-                pos_reg = self._acquire_temp_register()
-                tgt_reg = self._acquire_temp_register()
-                step_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], pos_reg))
-                code.extend(self._emit_expression_to_register(node.args[1], tgt_reg))
-                code.extend(self._emit_expression_to_register(node.args[2], step_reg))
-                lbl_eq = self._new_label("mt_eq")
-                lbl_lt = self._new_label("mt_lt")
-                lbl_gt = self._new_label("mt_gt")
-                lbl_done = self._new_label("mt_done")
-                # if pos == target -> done
-                code.append(f"    CMP {pos_reg}, {tgt_reg}")
-                code.append(f"    JE {lbl_eq}")
+                f"    CMP {val_reg}, {hi_reg}",
+                f"    JG {lbl_high}",
+                f"    MOV {target}, {val_reg}",
+                f"    JMP {lbl_done}",
+                f"{lbl_low}:",
+                f"    MOV {target}, {hi_reg}",
+                f"    JMP {lbl_done}",
+                f"{lbl_high}:",
+                f"    MOV {target}, {lo_reg}",
+                f"{lbl_done}:",
+            ))
+
+    def _emit_intrinsic_move_towards(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # move_towards(pos, target_pos, step) -> stepwise move without overshoot
+        with self._temp_register() as pos_reg, self._temp_register() as tgt_reg, self._temp_register() as step_reg:
+            self._emit_expression_into(args[0], pos_reg, code)
+            self._emit_expression_into(args[1], tgt_reg, code)
+            self._emit_expression_into(args[2], step_reg, code)
+            lbl_eq = self._new_label("mt_eq")
+            lbl_lt = self._new_label("mt_lt")
+            lbl_gt = self._new_label("mt_gt")
+            lbl_done = self._new_label("mt_done")
+            # if pos == target -> done
+            code.extend((
+                f"    CMP {pos_reg}, {tgt_reg}",
+                f"    JE {lbl_eq}",
                 # if pos < target
-                code.append(f"    JL {lbl_lt}")
+                f"    JL {lbl_lt}",
                 # else pos > target
-                code.append(f"    JMP {lbl_gt}")
-                code.append(f"{lbl_lt}:")
+                f"    JMP {lbl_gt}",
+                f"{lbl_lt}:",
                 # forward = pos + step; clamp to target
-                code.append(f"    MOV {target}, {pos_reg}")
-                code.append(f"    ADD {target}, {step_reg}")
-                code.append(f"    CMP {target}, {tgt_reg}")
-                code.append(f"    JLE {lbl_done}")
-                code.append(f"    MOV {target}, {tgt_reg}")
-                code.append(f"    JMP {lbl_done}")
-                code.append(f"{lbl_gt}:")
+                f"    MOV {target}, {pos_reg}",
+                f"    ADD {target}, {step_reg}",
+                f"    CMP {target}, {tgt_reg}",
+                f"    JLE {lbl_done}",
+                f"    MOV {target}, {tgt_reg}",
+                f"    JMP {lbl_done}",
+                f"{lbl_gt}:",
                 # backward = pos - step; clamp to target
-                code.append(f"    MOV {target}, {pos_reg}")
-                code.append(f"    SUB {target}, {step_reg}")
-                code.append(f"    CMP {target}, {tgt_reg}")
-                code.append(f"    JGE {lbl_done}")
-                code.append(f"    MOV {target}, {tgt_reg}")
-                code.append(f"    JMP {lbl_done}")
-                code.append(f"{lbl_eq}:")
-                code.append(f"    MOV {target}, {pos_reg}")
-                code.append(f"{lbl_done}:")
-                self._release_temp_register(step_reg)
-                self._release_temp_register(tgt_reg)
-                self._release_temp_register(pos_reg)
-                return code
-            if fname == "reverse" and len(node.args) == 1:
-                # reverse(x) -> REVERSE target, target (reverse bits)
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    REVERSE {target}, {target}")
-                return code
-            if fname == "strlen" and len(node.args) == 1:
-                # strlen(addr) -> STRLEN target, addr_reg
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    STRLEN {target}, {target}")
-                return code
-            if fname == "abs" and len(node.args) == 1:
-                # abs(x) -> absolute value
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    ABS {target}, {target}")
-                return code
-            if fname == "min" and len(node.args) == 2:
-                # min(a, b) -> minimum of two values
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                b_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[1], b_reg))
-                code.append(f"    MIN {target}, {b_reg}")
-                self._release_temp_register(b_reg)
-                return code
-
-            # clamp(x, lo, hi) -> min(max(x, lo), hi)
-            if fname == "clamp" and len(node.args) == 3:
-                # Evaluate x into target
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                lo_reg = self._acquire_temp_register()
-                hi_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[1], lo_reg))
-                code.extend(self._emit_expression_to_register(node.args[2], hi_reg))
-                lbl_low = self._new_label("clamp_low")
-                lbl_high = self._new_label("clamp_high")
-                lbl_done = self._new_label("clamp_done")
-                # if x < lo -> lo
-                code.append(f"    CMP {target}, {lo_reg}")
-                code.append(f"    JL {lbl_low}")
+                f"    MOV {target}, {pos_reg}",
+                f"    SUB {target}, {step_reg}",
+                f"    CMP {target}, {tgt_reg}",
+                f"    JGE {lbl_done}",
+                f"    MOV {target}, {tgt_reg}",
+                f"    JMP {lbl_done}",
+                f"{lbl_eq}:",
+                f"    MOV {target}, {pos_reg}",
+                f"{lbl_done}:",
+            ))
+
+    def _emit_intrinsic_clamp(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # clamp(x, lo, hi) -> min(max(x, lo), hi)
+        # Evaluate x into target
+        self._emit_expression_into(args[0], target, code)
+        with self._temp_register() as lo_reg, self._temp_register() as hi_reg:
+            self._emit_expression_into(args[1], lo_reg, code)
+            self._emit_expression_into(args[2], hi_reg, code)
+            lbl_low = self._new_label("clamp_low")
+            lbl_high = self._new_label("clamp_high")
+            lbl_done = self._new_label("clamp_done")
+            # if x < lo -> lo
+            code.extend((
+                f"    CMP {target}, {lo_reg}",
+                f"    JL {lbl_low}",
                 # if x > hi -> hi
-                code.append(f"    CMP {target}, {hi_reg}")
-                code.append(f"    JG {lbl_high}")
-                code.append(f"    JMP {lbl_done}")
-                code.append(f"{lbl_low}:")
-                code.append(f"    MOV {target}, {lo_reg}")
-                code.append(f"    JMP {lbl_done}")
-                code.append(f"{lbl_high}:")
-                code.append(f"    MOV {target}, {hi_reg}")
-                code.append(f"{lbl_done}:")
-                self._release_temp_register(hi_reg)
-                self._release_temp_register(lo_reg)
-                return code
-
-            # smoothstep(x, edge0, edge1) -> integer smooth clamp alias
-            if fname == "smoothstep" and len(node.args) == 3:
-                # Implement as clamp(x, edge0, edge1) in integer space
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                lo_reg = self._acquire_temp_register()
-                hi_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[1], lo_reg))
-                code.extend(self._emit_expression_to_register(node.args[2], hi_reg))
-                lbl_low = self._new_label("smooth_low")
-                lbl_high = self._new_label("smooth_high")
-                lbl_done = self._new_label("smooth_done")
-                # if x < edge0 -> edge0
-                code.append(f"    CMP {target}, {lo_reg}")
-                code.append(f"    JL {lbl_low}")
+                f"    CMP {target}, {hi_reg}",
+                f"    JG {lbl_high}",
+                f"    JMP {lbl_done}",
+                f"{lbl_low}:",
+                f"    MOV {target}, {lo_reg}",
+                f"    JMP {lbl_done}",
+                f"{lbl_high}:",
+                f"    MOV {target}, {hi_reg}",
+                f"{lbl_done}:",
+            ))
+
+    def _emit_intrinsic_smoothstep(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # smoothstep(x, edge0, edge1) -> integer smooth clamp alias
+        # Implement as clamp(x, edge0, edge1) in integer space
+        self._emit_expression_into(args[0], target, code)
+        with self._temp_register() as lo_reg, self._temp_register() as hi_reg:
+            self._emit_expression_into(args[1], lo_reg, code)
+            self._emit_expression_into(args[2], hi_reg, code)
+            lbl_low = self._new_label("smooth_low")
+            lbl_high = self._new_label("smooth_high")
+            lbl_done = self._new_label("smooth_done")
+            # if x < edge0 -> edge0
+            code.extend((
+                f"    CMP {target}, {lo_reg}",
+                f"    JL {lbl_low}",
                 # if x > edge1 -> edge1
-                code.append(f"    CMP {target}, {hi_reg}")
-                code.append(f"    JG {lbl_high}")
-                code.append(f"    JMP {lbl_done}")
-                code.append(f"{lbl_low}:")
-                code.append(f"    MOV {target}, {lo_reg}")
-                code.append(f"    JMP {lbl_done}")
-                code.append(f"{lbl_high}:")
-                code.append(f"    MOV {target}, {hi_reg}")
-                code.append(f"{lbl_done}:")
-                self._release_temp_register(hi_reg)
-                self._release_temp_register(lo_reg)
-                return code
-
-            # mad(a, b, c) -> a * b + c
-            if fname == "mad" and len(node.args) == 3:
-                a_reg = self._acquire_temp_register()
-                b_reg = self._acquire_temp_register()
-                c_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], a_reg))
-                code.extend(self._emit_expression_to_register(node.args[1], b_reg))
-                code.extend(self._emit_expression_to_register(node.args[2], c_reg))
-                code.append(f"    MOV {target}, {a_reg}")
-                code.append(f"    MUL {target}, {b_reg}")
-                code.append(f"    ADD {target}, {c_reg}")
-                self._release_temp_register(c_reg)
-                self._release_temp_register(b_reg)
-                self._release_temp_register(a_reg)
-                return code
-
-            # avg(a, b) -> (a + b) / 2
-            if fname == "avg" and len(node.args) == 2:
-                a_reg = self._acquire_temp_register()
-                b_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], a_reg))
-                code.extend(self._emit_expression_to_register(node.args[1], b_reg))
-                code.append(f"    MOV {target}, {a_reg}")
-                code.append(f"    ADD {target}, {b_reg}")
-                code.append(f"    SHRI {target}, 1")
-                self._release_temp_register(b_reg)
-                self._release_temp_register(a_reg)
-                return code
-
-            # absdiff(a, b) -> |a - b|
-            if fname == "absdiff" and len(node.args) == 2:
-                a_reg = self._acquire_temp_register()
-                b_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], a_reg))
-                code.extend(self._emit_expression_to_register(node.args[1], b_reg))
-                code.append(f"    MOV {target}, {a_reg}")
-                code.append(f"    ABSDIFF {target}, {b_reg}")
-                self._release_temp_register(b_reg)
-                self._release_temp_register(a_reg)
-                return code
-
-            # max3(a, b, c) -> max(a, max(b, c))
-            if fname == "max3" and len(node.args) == 3:
-                a_reg = self._acquire_temp_register()
-                b_reg = self._acquire_temp_register()
-                c_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], a_reg))
-                code.extend(self._emit_expression_to_register(node.args[1], b_reg))
-                code.extend(self._emit_expression_to_register(node.args[2], c_reg))
-                # max of a and b in target
-                code.append(f"    MOV {target}, {a_reg}")
-                code.append(f"    CMP {target}, {b_reg}")
-                lbl_gt = self._new_label("max3_gt")
-                lbl_done = self._new_label("max3_done")
-                code.append(f"    JL {lbl_gt}")
-                code.append(f"    MOV {target}, {b_reg}")
-                code.append(f"{lbl_gt}:")
+                f"    CMP {target}, {hi_reg}",
+                f"    JG {lbl_high}",
+                f"    JMP {lbl_done}",
+                f"{lbl_low}:",
+                f"    MOV {target}, {lo_reg}",
+                f"    JMP {lbl_done}",
+                f"{lbl_high}:",
+                f"    MOV {target}, {hi_reg}",
+                f"{lbl_done}:",
+            ))
+
+    def _emit_intrinsic_mad(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # mad(a, b, c) -> a * b + c
+        with self._temp_register() as a_reg, self._temp_register() as b_reg, self._temp_register() as c_reg:
+            self._emit_expression_into(args[0], a_reg, code)
+            self._emit_expression_into(args[1], b_reg, code)
+            self._emit_expression_into(args[2], c_reg, code)
+            code.extend((
+                f"    MOV {target}, {a_reg}",
+                f"    MUL {target}, {b_reg}",
+                f"    ADD {target}, {c_reg}",
+            ))
+
+    def _emit_intrinsic_avg(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # avg(a, b) -> (a + b) / 2
+        with self._temp_register() as a_reg, self._temp_register() as b_reg:
+            self._emit_expression_into(args[0], a_reg, code)
+            self._emit_expression_into(args[1], b_reg, code)
+            code.extend((
+                f"    MOV {target}, {a_reg}",
+                f"    ADD {target}, {b_reg}",
+                f"    SHRI {target}, 1",
+            ))
+
+    def _emit_intrinsic_absdiff(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # absdiff(a, b) -> |a - b|
+        with self._temp_register() as a_reg, self._temp_register() as b_reg:
+            self._emit_expression_into(args[0], a_reg, code)
+            self._emit_expression_into(args[1], b_reg, code)
+            code.extend((
+                f"    MOV {target}, {a_reg}",
+                f"    ABSDIFF {target}, {b_reg}",
+            ))
+
+    def _emit_intrinsic_max3(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # max3(a, b, c) -> max(a, max(b, c))
+        with self._temp_register() as a_reg, self._temp_register() as b_reg, self._temp_register() as c_reg:
+            self._emit_expression_into(args[0], a_reg, code)
+            self._emit_expression_into(args[1], b_reg, code)
+            self._emit_expression_into(args[2], c_reg, code)
+            # max of a and b in target
+            code.extend((
+                f"    MOV {target}, {a_reg}",
+                f"    CMP {target}, {b_reg}",
+            ))
+            lbl_gt = self._new_label("max3_gt")
+            lbl_done = self._new_label("max3_done")
+            code.extend((
+                f"    JL {lbl_gt}",
+                f"    MOV {target}, {b_reg}",
+                f"{lbl_gt}:",
                 # now compare with c
-                code.append(f"    CMP {target}, {c_reg}")
-                lbl_gt2 = self._new_label("max3_gt2")
-                code.append(f"    JL {lbl_gt2}")
-                code.append(f"    JMP {lbl_done}")
-                code.append(f"{lbl_gt2}:")
-                code.append(f"    MOV {target}, {c_reg}")
-                code.append(f"{lbl_done}:")
-                self._release_temp_register(c_reg)
-                self._release_temp_register(b_reg)
-                self._release_temp_register(a_reg)
-                return code
-            if fname == "min3" and len(node.args) == 3:
-                # min3(a, b, c) -> minimum of three values
-                a_reg = self._acquire_temp_register()
-                b_reg = self._acquire_temp_register()
-                c_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], a_reg))
-                code.extend(self._emit_expression_to_register(node.args[1], b_reg))
-                code.extend(self._emit_expression_to_register(node.args[2], c_reg))
-                # target = min(a, b, c)
-                code.append(f"    MOV {target}, {a_reg}")
-                code.append(f"    MIN {target}, {b_reg}")
-                code.append(f"    MIN {target}, {c_reg}")
-                self._release_temp_register(c_reg)
-                self._release_temp_register(b_reg)
-                self._release_temp_register(a_reg)
-                return code
-            if fname == "max" and len(node.args) == 2:
-                # max(a, b) -> maximum of two values
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                b_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[1], b_reg))
-                code.append(f"    MAX {target}, {b_reg}")
-                self._release_temp_register(b_reg)
-                return code
-            if fname == "memset" and len(node.args) == 3:
-                # memset(addr, value, count) -> MEMSET
-                addr_reg = self._acquire_temp_register()
-                val_reg = self._acquire_temp_register()
-                cnt_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], addr_reg))
-                code.extend(self._emit_expression_to_register(node.args[1], val_reg))
-                code.extend(self._emit_expression_to_register(node.args[2], cnt_reg))
-                code.append(f"    MEMSET {addr_reg}, {val_reg}, {cnt_reg}")
-                code.append(f"    MOV {target}, {addr_reg}")
-                self._release_temp_register(cnt_reg)
-                self._release_temp_register(val_reg)
-                self._release_temp_register(addr_reg)
-                return code
-            # New useful functions for games/graphics
-            if fname == "lerp" and len(node.args) == 3:
-                # lerp(a, b, t) -> Linear interpolation
-                # LERP dst, src, imm where dst=a, src=b, imm=t (0-255)
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                b_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[1], b_reg))
-                # Try to get t as constant
-                t_val = self._try_constant_value(node.args[2])
-                if t_val is not None:
-                    # Clamp t to 0-255
-                    t_val = max(0, min(255, t_val))
-                    code.append(f"    LERP {target}, {b_reg}, {t_val}")
-                else:
-                    # Dynamic t - need to use a different approach
-                    # For now, emit a warning and use 128 (0.5)
-                    self.warnings.append("lerp() with non-constant t uses t=128 (0.5)")
-                    code.append(f"    LERP {target}, {b_reg}, 128")
-                self._release_temp_register(b_reg)
-                return code
-            if fname == "lerp_int" and len(node.args) == 3:
-                # lerp_int(a, b, t) -> integer lerp alias to lerp()
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                b_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[1], b_reg))
-                t_val = self._try_constant_value(node.args[2])
-                if t_val is not None:
-                    t_val = max(0, min(255, t_val))
-                    code.append(f"    LERP {target}, {b_reg}, {t_val}")
-                else:
-                    self.warnings.append("lerp_int() with non-constant t uses t=128 (0.5)")
-                    code.append(f"    LERP {target}, {b_reg}, 128")
-                self._release_temp_register(b_reg)
-                return code
-            if fname == "sign" and len(node.args) == 1:
-                # sign(x) -> -1, 0, or 1
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    SIGN {target}")
-                return code
-            if fname == "saturate" and len(node.args) == 1:
-                # saturate(x) -> clamp to 0-255 (useful for colors)
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    SATURATE {target}")
-                return code
-            if fname == "clamp01" and len(node.args) == 1:
-                # clamp01(x) -> clamp signed integer into [0,1]
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    CLAMP01 {target}")
-                return code
-            # Math functions
-            if fname == "sqrt" and len(node.args) == 1:
-                # sqrt(x) -> square root
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    SQRT {target}, {target}")
-                return code
-            if fname == "pow" and len(node.args) == 2:
-                # pow(base, exp) -> power
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                exp_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[1], exp_reg))
-                code.append(f"    POW {target}, {exp_reg}")
-                self._release_temp_register(exp_reg)
-                return code
-            if fname == "rand" and len(node.args) == 0:
-                # rand() -> random number
-                code.append(f"    RANDOM {target}, R0")
-                return code
-            if fname == "srand" and len(node.args) == 1:
-                # srand(seed) -> set random seed
-                seed_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], seed_reg))
-                code.append(f"    SETSEED {seed_reg}, R0")
-                code.append(f"    LOADI {target}, 0")
-                self._release_temp_register(seed_reg)
-                return code
-            if fname == "popcnt" and len(node.args) == 1:
-                # popcnt(x) -> count set bits
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    POPCNT {target}, {target}")
-                return code
-            if fname == "clz" and len(node.args) == 1:
-                # clz(x) -> count leading zeros
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    LZCNT {target}, {target}")
-                return code
-            if fname == "ctz" and len(node.args) == 1:
-                # ctz(x) -> count trailing zeros
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    TZCNT {target}, {target}")
-                return code
-            # String and comparison utilities
-            if fname == "strcmp" and len(node.args) == 2:
-                # strcmp(addr1, addr2) -> compare strings
-                addr1_reg = self._acquire_temp_register()
-                addr2_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], addr1_reg))
-                code.extend(self._emit_expression_to_register(node.args[1], addr2_reg))
-                code.append(f"    STRCMP {target}, {addr1_reg}, {addr2_reg}")
-                self._release_temp_register(addr2_reg)
-                self._release_temp_register(addr1_reg)
-                return code
-
-            # strchr(hay, needle) -> STRCHR target, hay_reg, needle_reg
-            if fname == "strchr" and len(node.args) == 2:
-                hay_reg = self._acquire_temp_register()
-                needle_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], hay_reg))
-                code.extend(self._emit_expression_to_register(node.args[1], needle_reg))
-                code.append(f"    STRCHR {target}, {hay_reg}, {needle_reg}")
-                self._release_temp_register(needle_reg)
-                self._release_temp_register(hay_reg)
-                return code
-
-            # strncat(dest, src, n) -> STRNCAT dst_reg, src_reg, cnt_reg
-            if fname == "strncat" and len(node.args) == 3:
-                dst_reg = self._acquire_temp_register()
-                src_reg = self._acquire_temp_register()
-                cnt_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], dst_reg))
-                code.extend(self._emit_expression_to_register(node.args[1], src_reg))
-                code.extend(self._emit_expression_to_register(node.args[2], cnt_reg))
-                code.append(f"    STRNCAT {dst_reg}, {src_reg}, {cnt_reg}")
-                code.append(f"    MOV {target}, {dst_reg}")
-                self._release_temp_register(cnt_reg)
-                self._release_temp_register(src_reg)
-                self._release_temp_register(dst_reg)
-                return code
-
-            # atoi(str) -> ATOI target
-            if fname == "atoi" and len(node.args) == 1:
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    ATOI {target}, {target}")
-                return code
-            # memcpy(dest, src, n) -> MEMCPY dst_reg, src_reg, cnt_reg
-            if fname == "memcpy" and len(node.args) == 3:
-                dst_reg = self._acquire_temp_register()
-                src_reg = self._acquire_temp_register()
-                cnt_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], dst_reg))
-                code.extend(self._emit_expression_to_register(node.args[1], src_reg))
-                code.extend(self._emit_expression_to_register(node.args[2], cnt_reg))
-                code.append(f"    MEMCPY {dst_reg}, {src_reg}, {cnt_reg}")
-                code.append(f"    MOV {target}, {dst_reg}")
-                self._release_temp_register(cnt_reg)
-                self._release_temp_register(src_reg)
-                self._release_temp_register(dst_reg)
-                return code
-
-            # memscrub(addr, len) -> securely scrub memory region
-            if fname == "memscrub" and len(node.args) == 2:
-                base_reg = self._acquire_temp_register()
-                cnt_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], base_reg))
-                code.extend(self._emit_expression_to_register(node.args[1], cnt_reg))
-                code.append(f"    MOV R0, {base_reg}")
-                code.append(f"    MOV R1, {cnt_reg}")
-                code.append(f"    MEMSCRUB")
-                code.append(f"    LOADI {target}, 0")
-                self._release_temp_register(cnt_reg)
-                self._release_temp_register(base_reg)
-                return code
-
-            # --- Higher-level array helpers ---
-            if fname == "array_len" and len(node.args) == 1:
-                # array_len(arr) -> compile-time array length
-                if isinstance(node.args[0], ast.Name) and node.args[0].id in self.arrays:
-                    arr_info = self.arrays[node.args[0].id]
-                    size = int(arr_info.get("size", 0))
-                    code.append(f"    LOADI {target}, {size}")
-                    return code
-                raise CppCompilerError("array_len() requires an array identifier")
-
-            if fname == "array_fill" and len(node.args) == 2:
-                # array_fill(arr, value) -> fill entire array with value
-                if not isinstance(node.args[0], ast.Name) or node.args[0].id not in self.arrays:
-                    raise CppCompilerError("array_fill() first argument must be a declared array")
-                arr_info = self.arrays[node.args[0].id]
-                base_addr = int(arr_info.get("addr", 0))
-                length_elems = int(arr_info.get("size", 0))
-                total_bytes = length_elems * 4
-                if total_bytes <= 0:
-                    code.append(f"    LOADI {target}, 0")
-                    return code
-                addr_reg = self._acquire_temp_register()
-                val_reg = self._acquire_temp_register()
-                cnt_reg = self._acquire_temp_register()
-                code.append(f"    LOADI {addr_reg}, {base_addr}")
-                code.extend(self._emit_expression_to_register(node.args[1], val_reg))
-                code.append(f"    LOADI {cnt_reg}, {total_bytes}")
-                code.append(f"    MEMSET {addr_reg}, {val_reg}, {cnt_reg}")
-                code.append(f"    LOADI {target}, 0")
-                self._release_temp_register(cnt_reg)
-                self._release_temp_register(val_reg)
-                self._release_temp_register(addr_reg)
-                return code
-
-            if fname == "array_copy" and len(node.args) == 2:
-                # array_copy(dst, src) -> copy entire array (sizes must match)
-                if not (isinstance(node.args[0], ast.Name) and isinstance(node.args[1], ast.Name)):
-                    raise CppCompilerError("array_copy() requires two array identifiers")
-                dst_name = node.args[0].id
-                src_name = node.args[1].id
-                if dst_name not in self.arrays or src_name not in self.arrays:
-                    raise CppCompilerError("array_copy() arguments must be declared arrays")
-                dst_info = self.arrays[dst_name]
-                src_info = self.arrays[src_name]
-                dst_size = int(dst_info.get("size", 0))
-                src_size = int(src_info.get("size", 0))
-                if dst_size != src_size:
-                    raise CppCompilerError("array_copy() requires arrays of the same size")
-                total_bytes = dst_size * 4
-                if total_bytes <= 0:
-                    code.append(f"    LOADI {target}, 0")
-                    return code
-                dst_reg = self._acquire_temp_register()
-                src_reg = self._acquire_temp_register()
-                cnt_reg = self._acquire_temp_register()
-                code.append(f"    LOADI {dst_reg}, {int(dst_info.get('addr', 0))}")
-                code.append(f"    LOADI {src_reg}, {int(src_info.get('addr', 0))}")
-                code.append(f"    LOADI {cnt_reg}, {total_bytes}")
-                code.append(f"    MEMCPY {dst_reg}, {src_reg}, {cnt_reg}")
-                code.append(f"    LOADI {target}, 0")
-                self._release_temp_register(cnt_reg)
-                self._release_temp_register(src_reg)
-                self._release_temp_register(dst_reg)
-                return code
-
-            # --- Struct/class helpers ---
-            if fname == "struct_size" and len(node.args) == 1:
-                # struct_size("Type") -> compile-time class/struct size in bytes
-                if isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str):
-                    cls_name = node.args[0].value
-                    if cls_name not in self.class_definitions:
-                        raise CppCompilerError(f"Unknown class '{cls_name}' in struct_size()")
-                    size = int(self.class_definitions[cls_name].get("size", 0))
-                    code.append(f"    LOADI {target}, {size}")
-                    return code
-                raise CppCompilerError("struct_size() expects a string literal class name")
-
-            if fname == "offsetof" and len(node.args) == 2:
-                # offsetof("Type", "field") -> field offset in bytes
-                if not (isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str)
-                        and isinstance(node.args[1], ast.Constant) and isinstance(node.args[1].value, str)):
-                    raise CppCompilerError("offsetof() expects string literal type and field names")
-                cls_name = node.args[0].value
-                field_name = node.args[1].value
-                if cls_name not in self.class_definitions:
-                    raise CppCompilerError(f"Unknown class '{cls_name}' in offsetof()")
-                members = self.class_definitions[cls_name].get("members", [])
-                offset = None
-                for idx, m in enumerate(members):
-                    if m.get("name") == field_name:
-                        offset = idx * 4  # each member is 4 bytes
-                        break
-                if offset is None:
-                    raise CppCompilerError(f"Field '{field_name}' not found in class '{cls_name}'")
-                code.append(f"    LOADI {target}, {offset}")
-                return code
-
-            # memcmp(a, b, n) -> CMPS target, a_reg, b_reg, cnt_reg
-            if fname == "memcmp" and len(node.args) == 3:
-                a_reg = self._acquire_temp_register()
-                b_reg = self._acquire_temp_register()
-                cnt_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], a_reg))
-                code.extend(self._emit_expression_to_register(node.args[1], b_reg))
-                code.extend(self._emit_expression_to_register(node.args[2], cnt_reg))
-                code.append(f"    CMPS {target}, {a_reg}, {b_reg}, {cnt_reg}")
-                self._release_temp_register(cnt_reg)
-                self._release_temp_register(b_reg)
-                self._release_temp_register(a_reg)
-                return code
-
-            # memchr(base, byte, n) -> search memory for byte, return address or 0
-            if fname == "memchr" and len(node.args) == 3:
-                base_reg = self._acquire_temp_register()
-                byte_reg = self._acquire_temp_register()
-                cnt_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], base_reg))
-                code.extend(self._emit_expression_to_register(node.args[1], byte_reg))
-                code.extend(self._emit_expression_to_register(node.args[2], cnt_reg))
-                # Move into R0,R1,R2 convention expected by CPU handler
-                code.append(f"    MOV R0, {base_reg}")
-                code.append(f"    MOV R1, {byte_reg}")
-                code.append(f"    MOV R2, {cnt_reg}")
-                code.append(f"    MEMCHR")
-                code.append(f"    MOV {target}, R0")
-                self._release_temp_register(cnt_reg)
-                self._release_temp_register(byte_reg)
-                self._release_temp_register(base_reg)
-                return code
-
-            # revmem(addr, len) -> reverse bytes in-place; returns 0
-            if fname == "revmem" and len(node.args) == 2:
-                base_reg = self._acquire_temp_register()
-                cnt_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], base_reg))
-                code.extend(self._emit_expression_to_register(node.args[1], cnt_reg))
-                code.append(f"    MOV R0, {base_reg}")
-                code.append(f"    MOV R1, {cnt_reg}")
-                code.append(f"    REV_MEM")
-                code.append(f"    LOADI {target}, 0")
-                self._release_temp_register(cnt_reg)
-                self._release_temp_register(base_reg)
-                return code
-
-            # strncpy(dest, src, n) -> STRNCPY dst_reg, src_reg, cnt_reg
-            if fname == "strncpy" and len(node.args) == 3:
-                dst_reg = self._acquire_temp_register()
-                src_reg = self._acquire_temp_register()
-                cnt_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], dst_reg))
-                code.extend(self._emit_expression_to_register(node.args[1], src_reg))
-                code.extend(self._emit_expression_to_register(node.args[2], cnt_reg))
-                code.append(f"    STRNCPY {dst_reg}, {src_reg}, {cnt_reg}")
-                code.append(f"    MOV {target}, {dst_reg}")
-                self._release_temp_register(cnt_reg)
-                self._release_temp_register(src_reg)
-                self._release_temp_register(dst_reg)
-                return code
-
-            # strstr(hay, needle) -> STRSTR target, hay_reg, needle_reg
-            if fname == "strstr" and len(node.args) == 2:
-                hay_reg = self._acquire_temp_register()
-                needle_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], hay_reg))
-                code.extend(self._emit_expression_to_register(node.args[1], needle_reg))
-                code.append(f"    STRSTR {target}, {hay_reg}, {needle_reg}")
-                self._release_temp_register(needle_reg)
-                self._release_temp_register(hay_reg)
-                return code
-            # Bit rotation
-            if fname == "rotl" and len(node.args) == 2:
-                # rotl(value, shift) -> rotate left
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                shift_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[1], shift_reg))
-                code.append(f"    ROL {target}, {shift_reg}")
-                self._release_temp_register(shift_reg)
-                return code
-            if fname == "rotr" and len(node.args) == 2:
-                # rotr(value, shift) -> rotate right
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                shift_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[1], shift_reg))
-                code.append(f"    ROR {target}, {shift_reg}")
-                self._release_temp_register(shift_reg)
-                return code
-            # Byte swap for endianness
-            if fname == "bswap" and len(node.args) == 1:
-                # bswap(x) -> byte swap (reverse byte order)
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    BSWAP {target}")
-                return code
-            if fname == "clamp" and len(node.args) == 3:
-                # clamp(x, lo, hi) implemented via MIN/MAX on registers
-                # Evaluate x into target
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                # Evaluate lo and hi into temporaries
-                lo_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[1], lo_reg))
-                hi_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[2], hi_reg))
-                # target = min(target, hi_reg)
-                code.append(f"    MIN {target}, {hi_reg}")
-                # target = max(target, lo_reg)
-                code.append(f"    MAX {target}, {lo_reg}")
-                self._release_temp_register(hi_reg)
-                self._release_temp_register(lo_reg)
-                return code
-            # Graphics functions
-            if fname == "pixel" and len(node.args) == 3:
-                # pixel(x, y, color) -> PIXEL (uses R0=x, R1=y, R2=color)
-                code.extend(self._emit_expression_to_register(node.args[0], "R0"))
-                code.extend(self._emit_expression_to_register(node.args[1], "R1"))
-                code.extend(self._emit_expression_to_register(node.args[2], "R2"))
-                code.append(f"    PIXEL")
-                code.append(f"    LOADI {target}, 0")  # Return 0
-                return code
-            if fname == "line" and len(node.args) == 5:
-                # line(x1, y1, x2, y2, color) -> LINE
-                code.extend(self._emit_expression_to_register(node.args[0], "R0"))
-                code.extend(self._emit_expression_to_register(node.args[1], "R1"))
-                code.extend(self._emit_expression_to_register(node.args[2], "R2"))
-                code.extend(self._emit_expression_to_register(node.args[3], "R3"))
-                color_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[4], color_reg))
-                code.append(f"    LINE {color_reg}")
-                self._release_temp_register(color_reg)
-                code.append(f"    LOADI {target}, 0")  # Return 0
-                return code
-            if fname == "rect" and len(node.args) == 5:
-                # rect(x, y, w, h, color) -> RECT
-                code.extend(self._emit_expression_to_register(node.args[0], "R0"))
-                code.extend(self._emit_expression_to_register(node.args[1], "R1"))
-                code.extend(self._emit_expression_to_register(node.args[2], "R2"))
-                code.extend(self._emit_expression_to_register(node.args[3], "R3"))
-                color_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[4], color_reg))
-                code.append(f"    RECT {color_reg}")
-                self._release_temp_register(color_reg)
-                code.append(f"    LOADI {target}, 0")  # Return 0
-                return code
-            if fname == "fillrect" and len(node.args) == 5:
-                # fillrect(x, y, w, h, color) -> FILLRECT
-                code.extend(self._emit_expression_to_register(node.args[0], "R0"))
-                code.extend(self._emit_expression_to_register(node.args[1], "R1"))
-                code.extend(self._emit_expression_to_register(node.args[2], "R2"))
-                code.extend(self._emit_expression_to_register(node.args[3], "R3"))
-                color_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[4], color_reg))
-                code.append(f"    FILLRECT {color_reg}")
-                self._release_temp_register(color_reg)
-                code.append(f"    LOADI {target}, 0")  # Return 0
-                return code
-            if fname == "circle" and len(node.args) == 4:
-                # circle(cx, cy, r, color) -> CIRCLE
-                code.extend(self._emit_expression_to_register(node.args[0], "R0"))
-                code.extend(self._emit_expression_to_register(node.args[1], "R1"))
-                code.extend(self._emit_expression_to_register(node.args[2], "R2"))
-                color_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[3], color_reg))
-                code.append(f"    CIRCLE {color_reg}")
-                self._release_temp_register(color_reg)
-                code.append(f"    LOADI {target}, 0")  # Return 0
-                return code
-            if fname == "fillcircle" and len(node.args) == 4:
-                # fillcircle(cx, cy, r, color) -> FILLCIRCLE
-                code.extend(self._emit_expression_to_register(node.args[0], "R0"))
-                code.extend(self._emit_expression_to_register(node.args[1], "R1"))
-                code.extend(self._emit_expression_to_register(node.args[2], "R2"))
-                color_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[3], color_reg))
-                code.append(f"    FILLCIRCLE {color_reg}")
-                self._release_temp_register(color_reg)
-                code.append(f"    LOADI {target}, 0")  # Return 0
-                return code
-            if fname == "getpixel" and len(node.args) == 2:
-                # getpixel(x, y) -> GETPIXEL (returns color)
-                code.extend(self._emit_expression_to_register(node.args[0], "R1"))
-                code.extend(self._emit_expression_to_register(node.args[1], "R2"))
-                code.append(f"    GETPIXEL {target}")
-                return code
-            if fname == "clear" and len(node.args) == 1:
-                # clear(color) -> CLEAR
-                color_reg = self._acquire_temp_register()
-                code.extend(self._emit_expression_to_register(node.args[0], color_reg))
-                code.append(f"    CLEAR {color_reg}")
-                self._release_temp_register(color_reg)
-                code.append(f"    LOADI {target}, 0")  # Return 0
-                return code
-            # Bit helper intrinsics
-            if fname == "popcount" and len(node.args) == 1:
-                # popcount(x) -> POPCOUNT target, target
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    POPCOUNT {target}, {target}")
-                return code
-            if fname == "lzcnt" and len(node.args) == 1:
-                # lzcnt(x) -> LZCNT target, target
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    LZCNT {target}, {target}")
-                return code
-            if fname == "tzcnt" and len(node.args) == 1:
-                # tzcnt(x) -> TZCNT target, target
-                code.extend(self._emit_expression_to_register(node.args[0], target))
-                code.append(f"    TZCNT {target}, {target}")
-                return code
-
-            # Regular function calls
-            if node.args:
-                for arg in reversed(node.args):
-                    treg = self._acquire_temp_register()
-                    code.extend(self._emit_expression_to_register(arg, treg))
-                    code.append(f"    PUSH {treg}")
-                    self._release_temp_register(treg)
-            if fname in self.var_registers:
-                reg = self._require_variable(fname)
-                code.append(f"    CALLR {reg}")
-            else:
-                code.append(f"    CALL {fname}")
-            if node.args:
-                code.append(f"    ADDI R14, {len(node.args)*4}")
-            if target != "R0":
-                code.append(f"    MOV {target}, R0")
-            return code
-        if isinstance(node, ast.BinOp):
-            code.extend(self._emit_expression_to_register(node.left, target))
-            rhs_code, rhs_reg, should_release = self._load_operand(node.right)
-            code.extend(rhs_code)
-            code.extend(self._emit_binop(node.op, target, rhs_reg))
-            if should_release:
-                self._release_temp_register(rhs_reg)
-            return code
-        # Emit a helpful debug message about unsupported node types
-        try:
-            nodetype = type(node).__name__
-        except Exception:
-            nodetype = str(node)
-        self.log(f"unsupported_expression_node: {nodetype}", "ERROR")
-        raise CppCompilerError("Unsupported expression construct")
-
-    def _emit_coerce_to_bool(self, reg: str) -> List[str]:
-        lines: List[str] = []
-        lbl_true = self._new_label("bool_true")
-        lbl_done = self._new_label("bool_done")
-        lines.append(f"    CMP {reg}, 0")
-        lines.append(f"    JE {lbl_done}")
-        lines.append(f"    LOADI {reg}, 1")
-        lines.append(f"    JMP {lbl_done}")
-        lines.append(f"{lbl_done}:")
-        lines.append(f"    CMP {reg}, 0")
-        lines.append(f"    JNE {lbl_true}")
-        lines.append(f"    LOADI {reg}, 0")
-        lines.append(f"{lbl_true}:")
-        return lines
-
-    def _emit_div_zero_check(self, divisor_reg: str) -> List[str]:
-        """Generate division-by-zero checking code for integer ops.
+                f"    CMP {target}, {c_reg}",
+            ))
+            lbl_gt2 = self._new_label("max3_gt2")
+            code.extend((
+                f"    JL {lbl_gt2}",
+                f"    JMP {lbl_done}",
+                f"{lbl_gt2}:",
+                f"    MOV {target}, {c_reg}",
+                f"{lbl_done}:",
+            ))
+
+    def _emit_intrinsic_min3(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # min3(a, b, c) -> minimum of three values
+        with self._temp_register() as a_reg, self._temp_register() as b_reg, self._temp_register() as c_reg:
+            self._emit_expression_into(args[0], a_reg, code)
+            self._emit_expression_into(args[1], b_reg, code)
+            self._emit_expression_into(args[2], c_reg, code)
+            # target = min(a, b, c)
+            code.extend((
+                f"    MOV {target}, {a_reg}",
+                f"    MIN {target}, {b_reg}",
+                f"    MIN {target}, {c_reg}",
+            ))
+
+    def _emit_intrinsic_lerp(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # lerp(a, b, t) / lerp_int(a, b, t) -> Linear interpolation, t in 0-255
+        self._emit_expression_into(args[0], target, code)
+        with self._temp_register() as b_reg:
+            self._emit_expression_into(args[1], b_reg, code)
+            # Try to get t as constant
+            t_val = self._try_constant_value(args[2])
+            if t_val is not None:
+                # LERP dst, src, imm where dst=a, src=b, imm=t clamped to 0-255
+                t_val = max(0, min(255, t_val))
+                code.append(f"    LERP {target}, {b_reg}, {t_val}")
+            else:
+                # Dynamic t: target = a + ((b - a) * t) >> 8 with an arithmetic shift, the
+                # same arithmetic LERP does; IDIV floors like SAR and has a register encoding
+                with self._temp_register() as t_reg:
+                    self._emit_expression_into(args[2], t_reg, code)
+                    code.extend((
+                        f"    SATURATE {t_reg}",
+                        f"    SUB {b_reg}, {target}",
+                        f"    MUL {b_reg}, {t_reg}",
+                        f"    LOADI {t_reg}, 256",
+                        f"    IDIV {b_reg}, {t_reg}",
+                        f"    ADD {target}, {b_reg}",
+                    ))
+
+    def _emit_intrinsic_srand(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # srand(seed) -> set random seed; the seed is evaluated into target, which
+        # is free until the 0 result is loaded
+        self._emit_expression_into(args[0], target, code)
+        code.extend((
+            f"    SETSEED {target}, R0",
+            _LOADI_ZERO_LINES[target],
+        ))
+
+    def _emit_intrinsic_memscrub(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # memscrub(addr, len) -> securely scrub memory region
+        with self._temp_register() as base_reg, self._temp_register() as cnt_reg:
+            self._emit_expression_into(args[0], base_reg, code)
+            self._emit_expression_into(args[1], cnt_reg, code)
+            code.extend((
+                f"    MOV R0, {base_reg}",
+                f"    MOV R1, {cnt_reg}",
+                f"    MEMSCRUB",
+                _LOADI_ZERO_LINES[target],
+            ))
+
+    def _emit_intrinsic_array_len(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # array_len(arr) -> compile-time array length
+        if isinstance(args[0], ast.Name) and args[0].id in self.arrays:
+            arr_info = self.arrays[args[0].id]
+            size = int(arr_info.get("size", 0))
+            code.append(f"    LOADI {target}, {size}")
+            return
+        raise CppCompilerError("array_len() requires an array identifier")
+
+    def _emit_intrinsic_array_fill(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # array_fill(arr, value) -> fill entire array with value
+        if not isinstance(args[0], ast.Name) or args[0].id not in self.arrays:
+            raise CppCompilerError("array_fill() first argument must be a declared array")
+        arr_info = self.arrays[args[0].id]
+        base_addr = int(arr_info.get("addr", 0))
+        length_elems = int(arr_info.get("size", 0))
+        total_bytes = length_elems * 4
+        if total_bytes <= 0:
+            code.append(_LOADI_ZERO_LINES[target])
+            return
+        with self._temp_register() as addr_reg, self._temp_register() as val_reg, self._temp_register() as cnt_reg:
+            code.append(f"    LOADI {addr_reg}, {base_addr}")
+            self._emit_expression_into(args[1], val_reg, code)
+            code.extend((
+                f"    LOADI {cnt_reg}, {total_bytes}",
+                f"    MEMSET {addr_reg}, {val_reg}, {cnt_reg}",
+                _LOADI_ZERO_LINES[target],
+            ))
+
+    def _emit_intrinsic_array_copy(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # array_copy(dst, src) -> copy entire array (sizes must match)
+        if not (isinstance(args[0], ast.Name) and isinstance(args[1], ast.Name)):
+            raise CppCompilerError("array_copy() requires two array identifiers")
+        dst_name = args[0].id
+        src_name = args[1].id
+        if dst_name not in self.arrays or src_name not in self.arrays:
+            raise CppCompilerError("array_copy() arguments must be declared arrays")
+        dst_info = self.arrays[dst_name]
+        src_info = self.arrays[src_name]
+        dst_size = int(dst_info.get("size", 0))
+        src_size = int(src_info.get("size", 0))
+        if dst_size != src_size:
+            raise CppCompilerError("array_copy() requires arrays of the same size")
+        total_bytes = dst_size * 4
+        if total_bytes <= 0:
+            code.append(_LOADI_ZERO_LINES[target])
+            return
+        with self._temp_register() as dst_reg, self._temp_register() as src_reg, self._temp_register() as cnt_reg:
+            code.extend((
+                f"    LOADI {dst_reg}, {int(dst_info.get('addr', 0))}",
+                f"    LOADI {src_reg}, {int(src_info.get('addr', 0))}",
+                f"    LOADI {cnt_reg}, {total_bytes}",
+                f"    MEMCPY {dst_reg}, {src_reg}, {cnt_reg}",
+                _LOADI_ZERO_LINES[target],
+            ))
+
+    def _emit_intrinsic_struct_size(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # struct_size("Type") -> compile-time class/struct size in bytes
+        if isinstance(args[0], ast.Constant) and isinstance(args[0].value, str):
+            cls_name = args[0].value
+            if cls_name not in self.class_definitions:
+                raise CppCompilerError(f"Unknown class '{cls_name}' in struct_size()")
+            size = int(self.class_definitions[cls_name].get("size", 0))
+            code.append(f"    LOADI {target}, {size}")
+            return
+        raise CppCompilerError("struct_size() expects a string literal class name")
+
+    def _emit_intrinsic_offsetof(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # offsetof("Type", "field") -> field offset in bytes
+        if not (isinstance(args[0], ast.Constant) and isinstance(args[0].value, str)
+                and isinstance(args[1], ast.Constant) and isinstance(args[1].value, str)):
+            raise CppCompilerError("offsetof() expects string literal type and field names")
+        cls_name = args[0].value
+        field_name = args[1].value
+        if cls_name not in self.class_definitions:
+            raise CppCompilerError(f"Unknown class '{cls_name}' in offsetof()")
+        members = self.class_definitions[cls_name].get("members", [])
+        offset = None
+        for idx, m in enumerate(members):
+            if m.get("name") == field_name:
+                offset = idx * 4  # each member is 4 bytes
+                break
+        if offset is None:
+            raise CppCompilerError(f"Field '{field_name}' not found in class '{cls_name}'")
+        code.append(f"    LOADI {target}, {offset}")
+
+    def _emit_intrinsic_memcmp(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # memcmp(a, b, n) -> CMPS target, a_reg, b_reg, cnt_reg
+        with self._temp_register() as a_reg, self._temp_register() as b_reg, self._temp_register() as cnt_reg:
+            self._emit_expression_into(args[0], a_reg, code)
+            self._emit_expression_into(args[1], b_reg, code)
+            self._emit_expression_into(args[2], cnt_reg, code)
+            code.append(f"    CMPS {target}, {a_reg}, {b_reg}, {cnt_reg}")
+
+    def _emit_intrinsic_memchr(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # memchr(base, byte, n) -> search memory for byte, return address or 0
+        with self._temp_register() as base_reg, self._temp_register() as byte_reg, self._temp_register() as cnt_reg:
+            self._emit_expression_into(args[0], base_reg, code)
+            self._emit_expression_into(args[1], byte_reg, code)
+            self._emit_expression_into(args[2], cnt_reg, code)
+            # Move into R0,R1,R2 convention expected by CPU handler
+            code.extend((
+                f"    MOV R0, {base_reg}",
+                f"    MOV R1, {byte_reg}",
+                f"    MOV R2, {cnt_reg}",
+                f"    MEMCHR",
+                _MOV_FROM_R0_LINES[target],
+            ))
+
+    def _emit_intrinsic_revmem(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # revmem(addr, len) -> reverse bytes in-place; returns 0
+        with self._temp_register() as base_reg, self._temp_register() as cnt_reg:
+            self._emit_expression_into(args[0], base_reg, code)
+            self._emit_expression_into(args[1], cnt_reg, code)
+            code.extend((
+                f"    MOV R0, {base_reg}",
+                f"    MOV R1, {cnt_reg}",
+                f"    REV_MEM",
+                _LOADI_ZERO_LINES[target],
+            ))
+
+    def _emit_intrinsic_crc32_buf(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # crc32_buf(addr, len) -> CRC32 of a whole buffer in one instruction
+        with self._temp_register() as base_reg, self._temp_register() as cnt_reg:
+            self._emit_expression_into(args[0], base_reg, code)
+            self._emit_expression_into(args[1], cnt_reg, code)
+            code.extend((
+                f"    MOV R0, {base_reg}",
+                f"    MOV R1, {cnt_reg}",
+                f"    CRC32_BUF",
+                _MOV_FROM_R0_LINES[target],
+            ))
+
+    def _emit_intrinsic_pixel(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # pixel(x, y, color) -> PIXEL (uses R0=x, R1=y, R2=color)
+        self._emit_fixed_register_args(args, _REGS[:3], code)
+        code.extend((
+            f"    PIXEL",
+            _LOADI_ZERO_LINES[target],  # Return 0
+        ))
+
+    def _emit_intrinsic_getpixel(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # getpixel(x, y) -> GETPIXEL (returns color)
+        self._emit_fixed_register_args(args, _REGS[1:3], code)
+        code.append(f"    GETPIXEL {target}")
+
+    def _emit_intrinsic_clear(self, args: List[ast.expr], target: str, code: List[str]) -> None:
+        # clear(color) -> CLEAR. The result register is overwritten with 0 afterwards,
+        # so it doubles as the operand register and no temp is taken from the pool.
+        self._emit_expression_into(args[0], target, code)
+        code.append(f"    CLEAR {target}")
+        code.append(_LOADI_ZERO_LINES[target])  # Return 0
+
+    def _emit_coerce_to_bool(self, reg: str, code: List[str]) -> None:
+        # Branchless 0/1 normalisation; SETNZ does not touch the flags set by the CMP
+        code.append(f"    CMP {reg}, 0")
+        code.append(f"    SETNZ {reg}")
+
+    def _emit_div_zero_check(self, divisor_reg: str, lines: List[str]) -> None:
+        """Append division-by-zero checking code for integer ops to `lines`.
 
         This emits a small check that branches to a trap label if the divisor
         is zero. The trap currently halts the program, which is the safest
         behavior for cas++ programs inside SimpleOS.
         """
-        lines: List[str] = []
         err_lbl = self._new_label("div_zero")
         ok_lbl = self._new_label("div_ok")
         lines.append("    ; Division by zero check")
@@ -8573,15 +8628,13 @@ class CppCompiler:
         lines.append("    ; Division by zero - halting")
         lines.append("    HALT")
         lines.append(f"{ok_lbl}:")
-        return lines
 
-    def _emit_bounds_check(self, index_reg: str, size: int) -> List[str]:
-        """Generate array bounds checking code for 0 <= index < size.
+    def _emit_bounds_check(self, index_reg: str, size: int, lines: List[str]) -> None:
+        """Append array bounds checking code for 0 <= index < size to `lines`.
 
         This is used for all array subscripts so that out-of-bounds access
         halts the program instead of silently corrupting memory.
         """
-        lines: List[str] = []
         err_lbl = self._new_label("bounds_error")
         ok_lbl = self._new_label("bounds_ok")
         lines.append("    ; Array bounds check")
@@ -8598,106 +8651,99 @@ class CppCompiler:
         lines.append("    ; Array bounds error - halting")
         lines.append("    HALT")
         lines.append(f"{ok_lbl}:")
-        return lines
 
-    def _load_operand(self, node) -> Tuple[List[str], str, bool]:
+    def _load_operand(self, node: ast.expr, code: List[str]) -> Tuple[str, bool]:
+        """Make `node` available in a register, appending any code to `code`.
+
+        Returns the register and whether it is a temp the caller must release.
+        Variables are used in place; everything else goes through a temp.
+        """
         if isinstance(node, ast.Name):
-            return [], self._require_variable(node.id), False
-        const_val = self._try_constant_value(node)
-        if const_val is not None:
-            tmp = self._acquire_temp_register()
-            return self._emit_load_immediate(tmp, const_val), tmp, True
+            return self._require_variable(node.id), False
         tmp = self._acquire_temp_register()
-        code = self._emit_expression_to_register(node, tmp)
-        return code, tmp, True
-
-    def _emit_binop(self, op, target: str, rhs_reg: str) -> List[str]:
-        if isinstance(op, ast.Add):
-            return [f"    ADD {target}, {rhs_reg}"]
-        if isinstance(op, ast.Sub):
-            return [f"    SUB {target}, {rhs_reg}"]
-        if isinstance(op, ast.Mult):
-            return [f"    MUL {target}, {rhs_reg}"]
-        if isinstance(op, ast.Div) or isinstance(op, ast.FloorDiv):
-            # Inject a runtime division-by-zero check before DIV
-            lines: List[str] = []
-            lines.extend(self._emit_div_zero_check(rhs_reg))
-            lines.append(f"    DIV {target}, {rhs_reg}")
-            return lines
-        if isinstance(op, ast.Mod):
-            # Inject a runtime division-by-zero check before MOD as well
-            lines: List[str] = []
-            lines.extend(self._emit_div_zero_check(rhs_reg))
-            lines.append(f"    MOD {target}, {rhs_reg}")
-            return lines
-        if isinstance(op, ast.BitAnd):
-            return [f"    AND {target}, {rhs_reg}"]
-        if isinstance(op, ast.BitOr):
-            return [f"    OR {target}, {rhs_reg}"]
-        if isinstance(op, ast.BitXor):
-            return [f"    XOR {target}, {rhs_reg}"]
-        if isinstance(op, ast.LShift):
-            return [f"    SHL {target}, {rhs_reg}"]
-        if isinstance(op, ast.RShift):
-            return [f"    SHR {target}, {rhs_reg}"]
-        raise CppCompilerError("Unsupported binary operator")
-
-    def _try_constant_value(self, node) -> Optional[int]:
+        self._emit_expression_into(node, tmp, code)
+        return tmp, True
+
+    def _emit_binop(self, op: ast.operator, target: str, rhs_reg: str, code: List[str]) -> None:
+        mnemonic = _BINOP_MNEMONIC.get(type(op))
+        if mnemonic is None:
+            raise CppCompilerError("Unsupported binary operator")
+        if mnemonic == "DIV" or mnemonic == "MOD":
+            # Inject a runtime division-by-zero check before DIV/MOD
+            self._emit_div_zero_check(rhs_reg, code)
+        code.append(_REG_OP_LINES[mnemonic].get((target, rhs_reg))
+                    or _T_OP2 % (mnemonic, target, rhs_reg))
+
+    def _try_constant_value(self, node: ast.expr) -> Optional[int]:
+        # Literals are the common leaf and cheaper to convert than to look up
         if isinstance(node, ast.Constant):
             if isinstance(node.value, (int, float, bool)):
                 return int(node.value)
             return None
-        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
-            inner = self._try_constant_value(node.operand)
-            if inner is None:
+        # The value depends only on the subtree, so it is memoized per node for the whole
+        # compile; parsed trees are shared, and each subtree is folded once
+        cache = self._const_cache
+        value = cache.get(node, _NOT_CACHED)
+        if value is _NOT_CACHED:
+            value = cache[node] = self._fold_constant_node(node)
+        return value
+
+    def _fold_constant_node(self, node: ast.expr) -> Optional[int]:
+        if isinstance(node, ast.UnaryOp):
+            unary = _UNARY_FOLDERS.get(type(node.op))
+            if unary is None:
                 return None
-            return inner if isinstance(node.op, ast.UAdd) else -inner
-        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Invert):
             inner = self._try_constant_value(node.operand)
-            if inner is None:
-                return None
-            return ~inner
+            return None if inner is None else unary(inner)
         if isinstance(node, ast.BinOp):
+            folder = _BINOP_FOLDERS.get(type(node.op))
+            if folder is None:
+                return None
             left = self._try_constant_value(node.left)
             right = self._try_constant_value(node.right)
             if left is None or right is None:
                 return None
-            if isinstance(node.op, ast.Add):
-                return left + right
-            if isinstance(node.op, ast.Sub):
-                return left - right
-            if isinstance(node.op, ast.Mult):
-                return left * right
-            if isinstance(node.op, (ast.Div, ast.FloorDiv)):
-                if right == 0:
-                    return None
-                return left // right
-            if isinstance(node.op, ast.Mod):
-                if right == 0:
-                    return None
-                return left % right
-            if isinstance(node.op, ast.BitAnd):
-                return left & right
-            if isinstance(node.op, ast.BitOr):
-                return left | right
-            if isinstance(node.op, ast.BitXor):
-                return left ^ right
-            if isinstance(node.op, ast.LShift):
-                if right < 0:
-                    return None
-                return left << right
-            if isinstance(node.op, ast.RShift):
-                if right < 0:
-                    return None
-                return left >> right
+            try:
+                return folder(left, right)
+            except (ArithmeticError, ValueError):
+                # Zero divisor or negative shift: leave it to the runtime code
+                return None
+        if isinstance(node, ast.Call):
+            return self._fold_intrinsic_call(node)
+        if isinstance(node, ast.Name):
+            # Only the counter of an unrolled loop has a known value here
+            return self._unrolled_counters.get(node.id)
         return None
 
+    def _fold_intrinsic_call(self, node: ast.Call) -> Optional[int]:
+        """Evaluate a pure intrinsic whose arguments are all constants.
+
+        Only folds when every argument and the result fit a single 16-bit LOADI, so
+        the folded program loads exactly the value the CPU opcode would produce.
+        """
+        if not isinstance(node.func, ast.Name):
+            return None
+        folder = _INTRINSIC_FOLDERS.get((node.func.id, len(node.args)))
+        if folder is None:
+            return None
+        args = []
+        for arg in node.args:
+            value = self._try_constant_value(arg)
+            if value is None or not -32768 <= value <= 32767:
+                return None
+            args.append(value & 0xFFFFFFFF)
+        try:
+            result = to_signed32(folder(*args) & 0xFFFFFFFF)
+        except (ArithmeticError, ValueError):
+            return None
+        return result if -32768 <= result <= 32767 else None
+
     def _compile_array_declaration(self, stmt: str) -> List[str]:
         """Compile array declarations like: int arr[10]; or int arr[5] = {1,2,3,4,5};"""
         stmt = stmt.rstrip(";").strip()
         
         # Parse: type name[size] or type name[size] = {...}
-        match = re.match(r'(int|float|bool|char)\s+([A-Za-z_]\w*)\s*\[\s*(\d+)\s*\](\s*=\s*\{([^}]+)\})?', stmt)
+        match = _RE_ARRAY_DECL.match(stmt)
         if not match:
             raise CppCompilerError(f"Invalid array declaration: {stmt}")
         
@@ -8723,17 +8769,23 @@ class CppCompiler:
         # Initialize array if values provided
         if init_values:
             values = [v.strip() for v in init_values.split(',')]
+            elements: List[Tuple[int, int]] = []
             for i, val in enumerate(values[:size]):  # Don't exceed array size
                 try:
-                    value = int(val)
-                    offset = addr + (i * 4)
-                    treg = self._acquire_temp_register()
-                    code.append(f"    LOADI {treg}, {value}")
-                    code.append(f"    LOADI R0, {offset}")
-                    code.append(f"    STORE {treg}, R0")
-                    self._release_temp_register(treg)
+                    elements.append((addr + i * 4, int(val)))
                 except ValueError:
                     self.warnings.append(f"Invalid array initializer value: {val}")
+            if elements:
+                # Element addresses are compile-time constants, so each store takes its
+                # address as an immediate; runs of equal values reuse the loaded value
+                with self._temp_register() as treg:
+                    append = code.append
+                    loaded = None
+                    for element_addr, value in elements:
+                        if value != loaded:
+                            append(f"    LOADI {treg}, {value}")
+                            loaded = value
+                        append(f"    STORE {treg}, {element_addr}")
         
         return code
 
@@ -8746,10 +8798,10 @@ class CppCompiler:
         stmt = stmt.rstrip(';').strip()
         
         # Extract class/struct name and body
-        match = re.match(r'(class|struct)\s+([A-Za-z_]\w*)\s*\{(.+)\}', stmt, re.DOTALL)
+        match = _RE_CLASS_DEF.match(stmt)
         if not match:
             # Maybe it's just the class header, store it for later
-            match2 = re.match(r'(class|struct)\s+([A-Za-z_]\w*)\s*\{', stmt)
+            match2 = _RE_CLASS_HEAD.match(stmt)
             if match2:
                 class_name = match2.group(2)
                 # Register empty class for now
@@ -8767,18 +8819,11 @@ class CppCompiler:
             raise CppCompilerError(f"Class '{class_name}' already defined")
         
         # Parse class members (simplified - just track member variables)
-        members = []
-        for line in body.split(';'):
-            line = line.strip()
-            if not line:
-                continue
-            # Look for member variable declarations
-            m = re.match(r'(int|float|bool|char)\s+([A-Za-z_]\w*)', line)
-            if m:
-                members.append({
-                    "type": m.group(1),
-                    "name": m.group(2)
-                })
+        # One scan over the body instead of splitting it into statements
+        members = [
+            {"type": m.group(1), "name": m.group(2)}
+            for m in _RE_MEMBER_DECL.finditer(body)
+        ]
         
         self.class_definitions[class_name] = {
             "members": members,
@@ -8791,53 +8836,34 @@ class CppCompiler:
     def _evaluate_expression(self, expr: str) -> int:
         expr = self._normalize_expression(expr)
         try:
-            tree = ast.parse(expr, mode="eval")
+            # Same shared parse cache as code generation: constant initializers
+            # repeated across a unit (or across compiles) are parsed once
+            node = _parse_normalized_expression(expr)
         except SyntaxError as exc:
             raise CppCompilerError(f"Invalid expression '{expr}'") from exc
-        return self._eval_node(tree.body)
+        return self._eval_node(node)
 
     def _eval_node(self, node) -> int:
         if isinstance(node, ast.Constant):
             if isinstance(node.value, (int, float, bool)):
                 return int(node.value)
             raise CppCompilerError("Only numeric constants supported")
-        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
-            val = self._eval_node(node.operand)
-            return val if isinstance(node.op, ast.UAdd) else -val
-        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Invert):
-            val = self._eval_node(node.operand)
-            return ~val
+        if isinstance(node, ast.UnaryOp):
+            unary = _UNARY_FOLDERS.get(type(node.op))
+            if unary is not None:
+                return unary(self._eval_node(node.operand))
         if isinstance(node, ast.BinOp):
-            left = self._eval_node(node.left)
-            right = self._eval_node(node.right)
-            if isinstance(node.op, ast.Add):
-                return left + right
-            if isinstance(node.op, ast.Sub):
-                return left - right
-            if isinstance(node.op, ast.Mult):
-                return left * right
-            if isinstance(node.op, (ast.Div, ast.FloorDiv)):
-                if right == 0:
-                    raise CppCompilerError("Division by zero in expression")
-                return left // right
-            if isinstance(node.op, ast.Mod):
-                if right == 0:
-                    raise CppCompilerError("Modulo by zero in expression")
-                return left % right
-            if isinstance(node.op, ast.BitAnd):
-                return left & right
-            if isinstance(node.op, ast.BitOr):
-                return left | right
-            if isinstance(node.op, ast.BitXor):
-                return left ^ right
-            if isinstance(node.op, ast.LShift):
-                if right < 0:
-                    raise CppCompilerError("Negative shift count")
-                return left << right
-            if isinstance(node.op, ast.RShift):
-                if right < 0:
-                    raise CppCompilerError("Negative shift count")
-                return left >> right
+            folder = _BINOP_FOLDERS.get(type(node.op))
+            if folder is not None:
+                left = self._eval_node(node.left)
+                right = self._eval_node(node.right)
+                try:
+                    return folder(left, right)
+                except ZeroDivisionError:
+                    what = "Modulo" if isinstance(node.op, ast.Mod) else "Division"
+                    raise CppCompilerError(f"{what} by zero in expression") from None
+                except ValueError:
+                    raise CppCompilerError("Negative shift count") from None
         if isinstance(node, ast.Name):
             if node.id not in self.variables:
                 raise CppCompilerError(f"Unknown identifier '{node.id}'")
@@ -8847,6 +8873,109 @@ class CppCompiler:
 # ---------------------------
 # Host-side shell (interacts with kernel)
 # ---------------------------
+# nano editor commands -> (save the buffer, leave the editor)
+_NANO_COMMANDS: Dict[str, Tuple[bool, bool]] = {
+    ":w": (True, False),
+    ":q": (False, True),
+    ":wq": (True, True),
+}
+# Static text of the c++ help command, written with one call
+_CPP_HELP_TEXT = "\n".join((
+    "cas++ - SimpleOS C++ Compiler",
+    "=" * 40,
+    "USAGE:",
+    "  cas++ <source.cpp> [output.bin] [options]",
+    "",
+    "OPTIONS:",
+    "  --run     Compile and immediately execute the program",
+    "  --asm     Display generated assembly output",
+    "  --debug   Alias for --asm (kept for compatibility)",
+    "  --output  Show ONLY program output (no debug info)",
+    "",
+    "OTHER COMMANDS:",
+    "  compilecpp  - Alias for cas++",
+    "  cpprun      - Compile and run in a single step",
+    "  c++         - Show this help screen",
+    "",
+    "SUPPORTED FEATURES:",
+    "  • #include lines (ignored but accepted for common headers)",
+    "  • int / const int / float / bool / char declarations",
+    "  • Mutable variables mapped to CPU registers (R4-R12)",
+    "  • Arithmetic: +, -, *, /, %, ++, --, +=, -=, *=, /=",
+    "  • Bitwise: &, |, ^, ~, <<, >>, &=, |=, ^=, <<=, >>=",
+    "  • Comparison: ==, !=, <, >, <=, >=",
+    "  • Control flow: if/else, while, do-while, for, break, continue",
+    "  • Arrays: int arr[size]; with indexing arr[i]",
+    "  • Classes: Basic class support with members",
+    "",
+    "BUILT-IN FUNCTIONS:",
+    "  Math: abs(), min(), max(), sqrt(), pow(), rand(), srand()",
+    "  String: strlen(), strcmp(), memset()",
+    "  Bitwise: popcnt(), clz(), ctz(), swap(), reverse()",
+    "  Graphics: lerp(), sign(), saturate(), clamp()",
+    "  System: gettime(), sleep()",
+    "  • printf(\"text\", value1, value2, ...); with %d placeholders",
+    "  • return <expression>; (integers & simple arithmetic)",
+    "",
+    "NEW CPU INSTRUCTIONS:",
+    "  • MULH  - Multiply High (upper 32 bits of 64-bit result)",
+    "  • DIVMOD - Combined division and modulo",
+    "  • AVGB  - Average of two values (useful for blending)",
+    "",
+    "OPTIMIZATIONS:",
+    "  • Expression caching for faster compilation",
+    "  • Register reuse optimization",
+    "  • Peephole optimization in assembler",
+    "",
+    "Unsupported statements are ignored with warnings.",
+)) + "\n"
+# One `ls -l` row: mode, size, created, modified, name
+_LS_ROW = "{:<10} {:<8} {:<20} {:<20} {}"
+
+def _split_flags(args: List[str]) -> Tuple[set, List[str], Dict[str, str]]:
+    """Split command arguments in one pass.
+
+    Returns the set of "--flag" arguments, the positional arguments in order,
+    and "--key=value" options as {"--key": "value"} (the last one wins).
+    """
+    flags = set()
+    positional = []
+    options = {}
+    for arg in args:
+        if arg.startswith("--"):
+            key, sep, value = arg.partition("=")
+            if sep:
+                options[key] = value
+            else:
+                flags.add(arg)
+        else:
+            positional.append(arg)
+    return flags, positional, options
+
+@functools.lru_cache(maxsize=256)
+def _parse_int(text: str) -> int:
+    """int(text, 0) for command arguments; scripts tend to repeat the same addresses."""
+    return int(text, 0)
+
+@functools.lru_cache(maxsize=4096)
+def _ctime(t: int) -> str:
+    """time.ctime for whole-second timestamps; files often share them."""
+    return time.ctime(t)
+
+def _entry_ctime(t: Optional[float]) -> str:
+    """ctime of a file timestamp; a missing one reads as now, like time.ctime(None)."""
+    return time.ctime() if t is None else _ctime(int(t))
+
+# rot13 as a translate table; the rot_13 codec maps characters in Python
+_ROT13_TABLE = str.maketrans(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz",
+    "NOPQRSTUVWXYZABCDEFGHIJKLMnopqrstuvwxyzabcdefghijklm")
+
+@functools.lru_cache(maxsize=64)
+def _tr_table(from_chars: str, to_chars: str) -> Dict[int, int]:
+    """str.maketrans for the tr command, kept across calls with the same sets."""
+    return str.maketrans(from_chars, to_chars)
+
 class Shell:
     """
     A simple terminal that exposes kernel features and can load/execute assembled binaries in the CPU.
@@ -8919,6 +9048,56 @@ class Shell:
         self.bios = bios
         self.bootloader = Bootloader()
         self.history_index = 0
+        # Command name -> handler(args), looked up once per input line. A handler
+        # returns None to keep the shell running, True to reboot and False to exit.
+        self._DISPATCH: Dict[str, Callable[[List[str]], Optional[bool]]] = {
+            "help": self.do_help, "ls": self.do_ls, "cd": self.do_cd, "pwd": self.do_pwd,
+            "cat": self.do_cat, "nano": self.do_nano, "diagnose": self.do_diagnose,
+            "self-repair": self.do_self_repair,
+            "cas++": self.do_caspp, "c++": self.do_cpp_help, "compilecpp": self.do_compile_cpp,
+            "cpprun": self.do_run_cpp,
+            "whoami": self.do_whoami, "echo": self.do_echo, "write": self.do_write,
+            "loadasm": self.do_loadasm, "run": self.do_run_cmd, "runmt": self.do_runmt,
+            "threads": self.do_threads, "memmap": self.do_memmap, "regs": self.do_regs,
+            "disasm": self.do_disasm, "exit": self.do_exit, "quit": self.do_exit,
+            "ps": self.do_ps, "kill": self.do_kill, "chmod": self.do_chmod, "mkdir": self.do_mkdir,
+            "rm": self.do_rm, "cp": self.do_cp, "mv": self.do_mv, "stat": self.do_stat,
+            "time": self.do_time, "debug": self.do_debug, "trace": self.do_trace,
+            "reboot": self.do_reboot, "start-gui": self.do_start_gui,
+            "bios": self.do_bios, "enterbios": self.do_enterbios, "sysinfo": self.do_sysinfo,
+            "random": self.do_random, "bootload": self.do_bootload, "entboot": self.do_entboot,
+            "clear": self.do_clear, "history": self.do_history, "set": self.do_set,
+            "get": self.do_get, "setflag": self.do_setflag, "acc": self.do_acc,
+            "sleep": self.do_sleep, "ping": self.do_ping, "uptime": self.do_uptime,
+            "df": self.do_df, "top": self.do_top, "find": self.do_find, "cls": self.do_cls,
+            "ver": self.do_ver, "calc": self.do_calc, "date": self.do_date, "type": self.do_type,
+            "curl": self.do_curl, "wget": self.do_wget, "grep": self.do_grep, "wc": self.do_wc,
+            "nettest": self.do_nettest, "netsocket": self.do_netsocket, "http": self.do_http,
+            "dns": self.do_dns, "download": self.do_download,
+            "memstats": self.do_memstats, "memscrub": self.do_memscrub, "meminfo": self.do_meminfo,
+            "asmtest": self.do_asmtest, "stats": self.do_stats, "cpuinfo": self.do_cpuinfo,
+            "benchmark": self.do_benchmark, "test": self.do_test,
+            # Data processing commands
+            "hexdump": self.do_hexdump, "md5": self.do_md5, "sha256": self.do_sha256,
+            "base64": self.do_base64, "base32": self.do_base32, "hex": self.do_hex,
+            "rot13": self.do_rot13,
+            # Text processing commands
+            "reverse": self.do_reverse, "upper": self.do_upper, "lower": self.do_lower,
+            "tr": self.do_tr, "cut": self.do_cut, "sort": self.do_sort, "uniq": self.do_uniq,
+            "head": self.do_head, "tail": self.do_tail, "diff": self.do_diff,
+            # System commands
+            "uname": self.do_uname, "touch": self.do_touch, "env": self.do_env,
+            "export": self.do_export, "unset": self.do_unset,
+            # Game commands
+            "snake": self.do_snake, "minesweeper": self.do_minesweeper, "tetris": self.do_tetris,
+        }
+        # The subset of commands available from the GUI terminal (execute_cmd_safe)
+        self._GUI_DISPATCH: Dict[str, Callable[[List[str]], Optional[bool]]] = {
+            "help": self._gui_help, "cd": self.do_cd, "ls": self.do_ls, "cat": self.do_cat,
+            "echo": self.do_echo, "whoami": self.do_whoami, "ps": self.do_ps,
+            "regs": self.do_regs, "sysinfo": self.do_sysinfo, "pwd": self.do_pwd,
+            "clear": self._gui_clear,
+        }
     
     def _resolve_path(self, path: str) -> str:
         """Resolve user-supplied path against current working directory."""
@@ -8982,398 +9161,227 @@ class Shell:
             cmd = parts[0].lower()
             args = parts[1:]
             try:
-                if cmd == "help":
-                    if not args:
-                        # Show command categories
-                        print("Available command categories:")
-                        print("  system    - System and process management commands")
-                        print("  file      - File operations and management")
-                        print("  text      - Text processing commands")
-                        print("  data      - Data encoding and hashing commands")
-                        print("  memory    - Memory and CPU operations")
-                        print("  network   - Network simulation commands")
-                        print("  cpp       - C++ compiler commands")
-                        print("  games     - Terminal games (Snake, Minesweeper, Tetris)")
-                        print("  util      - Utility commands")
-                        print("\nUse 'help <category>' to see specific commands.")
-                        # continue main loop (don't exit shell)
-                        continue
-                        
-                    category = args[0].lower()
-                    if category == "system":
-                        print("System Commands:")
-                        print("  ps        - List processes")
-                        print("  kill      - Kill a process")
-                        print("  reboot    - Reboot the system")
-                        print("  sysinfo   - Show system information")
-                        print("  uptime    - Show system uptime")
-                        print("  top       - Show process information")
-                        print("  date      - Show current date")
-                        print("  time      - Show current time")
-                        print("  bios      - Show BIOS information")
-                        print("  sleep     - Delay execution")
-                        print("  ver       - Show version information")
-                        print("  whoami    - Show current user")
-                        print("  uname     - Show system info")
-                        print("  env       - Show environment variables")
-                        print("  export    - Set environment variable")
-                        print("  unset     - Remove environment variable")
-                        print("  diagnose  - Run system diagnostics")
-                        print("  self-repair - Attempt automated repairs")
-                        print("  diagnose  - Run system diagnostics and self-repair")
-                    elif category == "file":
-                        print("File Commands:")
-                        print("  ls        - List files")
-                        print("  cd        - Change directory")
-                        print("  pwd       - Print working directory")
-                        print("  cat       - Display file contents")
-                        print("  nano      - Text editor (like nano)")
-                        print("  write     - Write text to file")
-                        print("  mkdir     - Create directory")
-                        print("  rm        - Remove file")
-                        print("  cp        - Copy file")
-                        print("  mv        - Move file")
-                        print("  chmod     - Change file permissions")
-                        print("  stat      - Show file information")
-                        print("  type      - Print file contents")
-                        print("  find      - Search for files")
-                        print("  touch     - Create empty file")
-                        print("  df        - Show disk usage")
-                    elif category == "text":
-                        print("Text Processing Commands:")
-                        print("  grep      - Search within files")
-                        print("  wc        - Count lines/words/chars")
-                        print("  head      - Show first N lines")
-                        print("  tail      - Show last N lines")
-                        print("  sort      - Sort lines")
-                        print("  uniq      - Remove duplicate lines")
-                        print("  cut       - Extract columns")
-                        print("  tr        - Translate characters")
-                        print("  upper     - Convert to uppercase")
-                        print("  lower     - Convert to lowercase")
-                        print("  reverse   - Reverse text")
-                        print("  diff      - Compare two files")
-                    elif category == "data":
-                        print("Data Processing Commands:")
-                        print("  base64    - Base64 encode/decode")
-                        print("  base32    - Base32 encode/decode")
-                        print("  hex       - Hex encode/decode")
-                        print("  rot13     - ROT13 encode/decode")
-                        print("  md5       - MD5 hash")
-                        print("  sha256    - SHA256 hash")
-                        print("  hexdump   - Hex dump of file/memory")
-                    elif category == "memory":
-                        print("Memory & Assembly Commands:")
-                        print("  memmap    - Map memory region")
-                        print("  memstats  - Show memory statistics")
-                        print("  memscrub  - Securely zero a memory range")
-                        print("  meminfo   - Show memory info")
-                        print("  regs      - Show CPU registers")
-                        print("  disasm    - Disassemble memory")
-                        print("  debug     - Enable/disable CPU tracing")
-                        print("  trace     - Trace execution")
-                        print("  loadasm   - Load assembly program")
-                        print("  asminfo   - Show assembler symbols")
-                        print("  asmtest   - Run assembler tests")
-                        print("  run       - Execute program")
-                        print("  cpuinfo   - Show CPU information")
-                    elif category == "cpp":
-                        print("C++ Compiler Commands:")
-                        print("  cas++      - Compile C++ source with cas++")
-                        print("  compilecpp - Alias for cas++")
-                        print("  cpprun     - Compile and immediately run C++ code")
-                        print("  c++        - Show detailed cas++ help")
-                        print("  benchmark - Run benchmarks")
-                    elif category == "network":
-                        print("Network Commands:")
-                        print("  ping <host>              - Test connectivity (real TCP)")
-                        print("  curl <url>               - Fetch URL content (real HTTP GET)")
-                        print("  wget <url>               - Download file (real HTTP)")
-                        print("  http <get|head> <url>    - HTTP operations")
-                        print("  dns <hostname>           - DNS lookup")
-                        print("  download <url> [file]    - Download and save file")
-                        print("  nettest <host> <port>    - Test network connectivity")
-                        print("  netsocket <cmd> [args]   - Socket operations (create, connect, send, recv, close)")
-                    elif category == "games":
-                        print("Terminal Games:")
-                        print("  snake       - Play Snake game")
-                        print("  minesweeper - Play Minesweeper")
-                        print("  tetris      - Play Tetris (auto-falling!)")
-                        print("\nControls:")
-                        print("  Snake:       w/a/s/d to change direction, Enter to move, q to quit")
-                        print("  Minesweeper: 'row col' to reveal (e.g., '3 4')")
-                        print("                'f row col' to flag, q to quit")
-                        print("  Tetris:      a/d to move, w to rotate, s to drop fast, q to quit")
-                        print("                Pieces fall automatically every 0.8 seconds!")
-                    elif category == "util":
-                        print("Utility Commands:")
-                        print("  echo      - Print text")
-                        print("  clear/cls - Clear screen")
-                        print("  calc      - Basic calculator")
-                        print("  history   - Show command history")
-                        print("  set       - Set environment variable")
-                        print("  get       - Get environment variable")
-                        print("  random    - Generate random number")
-                        print("  stats     - Show system statistics")
-                        print("  test      - Run tests")
-                        print("  exit/quit - Exit the shell")
-                    else:
-                        print(f"Unknown category: {category}")
-                        print("Use 'help' for list of categories.")
-                elif cmd == "ls":
-                    self.do_ls(args)
-                elif cmd == "cd":
-                    self.do_cd(args)
-                elif cmd == "pwd":
-                    print(self.kernel.cwd)
-                elif cmd == "cat":
-                    self.do_cat(args)
-                elif cmd == "nano":
-                    self.do_nano(args)
-                elif cmd == "diagnose":
-                    self.do_diagnose(args)
-                elif cmd == "self-repair":
-                    self.do_self_repair(args)
-                elif cmd == "cas++":
-                    self.do_caspp(args)
-                elif cmd == "c++":
-                    self.do_cpp_help(args)
-                elif cmd == "compilecpp":
-                    self.do_compile_cpp(args)
-                elif cmd == "cpprun":
-                    self.do_run_cpp(args)
-                elif cmd == "whoami":
-                    print(self.kernel.username)
-                elif cmd == "echo":
-                    print(" ".join(args))
-                elif cmd == "write":
-                    self.do_write(args)
-                elif cmd == "loadasm":
-                    self.do_loadasm(args)
-                elif cmd == "run":
-                    result = self.do_run(args)
-                    if result == 0xDEADBEEF:  # Reboot signal
-                        print("System rebooting...")
-                        return True  # Signal to reboot
-                elif cmd == "runmt":
-                    self.do_runmt(args)
-                elif cmd == "threads":
-                    self.do_threads(args)
-                elif cmd == "memmap":
-                    self.do_memmap(args)
-                elif cmd == "regs":
-                    print(self.cpu.dump_regs())
-                elif cmd == "disasm":
-                    self.do_disasm(args)
-                elif cmd in ("exit", "quit"):
-                    print("Bye.")
-                    return False  # Normal exit
-                elif cmd == "ps":
-                    self.do_ps(args)
-                elif cmd == "kill":
-                    self.do_kill(args)
-                elif cmd == "chmod":
-                    self.do_chmod(args)
-                elif cmd == "mkdir":
-                    self.do_mkdir(args)
-                elif cmd == "rm":
-                    self.do_rm(args)
-                elif cmd == "cp":
-                    self.do_cp(args)
-                elif cmd == "mv":
-                    self.do_mv(args)
-                elif cmd == "stat":
-                    self.do_stat(args)
-                elif cmd == "time":
-                    self.do_time(args)
-                elif cmd == "debug":
-                    self.do_debug(args)
-                elif cmd == "trace":
-                    self.do_trace(args)
-                elif cmd == "reboot":
-                    print("Rebooting system...")
-                    # Use kernel REBOOT syscall
-                    self.cpu.reg_write(0, 24)  # REBOOT
-                    self.kernel.syscall(self.cpu)
-                    return True  # Signal to reboot
-                elif cmd == "start-gui":
-                    print("Starting desktop environment...")
-                    try:
-                        if not PYQT5_AVAILABLE:
-                            print("ERROR: PyQt5 not installed. Install with: pip install PyQt5")
-                        else:
-                            # Launch desktop environment
-                            should_reboot = launch_desktop_environment(self.kernel, self.cpu, self)
-                            if should_reboot:
-                                print("Rebooting from GUI...")
-                                return True
-                            else:
-                                print("Desktop environment closed.")
-                    except Exception as e:
-                        print(f"Error launching GUI: {e}")
-                        import traceback
-                        traceback.print_exc()
-                elif cmd == "bios":
-                    self.do_bios(args)
-                elif cmd == "enterbios":
-                    self.do_enterbios(args)
-                elif cmd == "sysinfo":
-                    self.do_sysinfo(args)
-                elif cmd == "random":
-                    self.do_random(args)
-                elif cmd == "bootload":
-                    self.do_bootload(args)
-                elif cmd == "entboot":
-                    self.do_entboot(args)
-                elif cmd == "clear":
-                    self.do_clear(args)
-                elif cmd == "history":
-                    self.do_history(args)
-                elif cmd == "set":
-                    self.do_set(args)
-                elif cmd == "get":
-                    self.do_get(args)
-                elif cmd == "setflag":
-                    if len(args) != 1:
-                        print("Usage: setflag <FLAG>")
-                    else:
-                        name = args[0].upper()
-                        mask = FLAG_NAME_MAP.get(name)
-                        if mask is None:
-                            print("Unknown flag", name)
-                        else:
-                            self.cpu.set_flag(mask)
-                            print(f"Set {name}")
-                elif cmd == "acc":
-                    # acc [get|set <value>]
-                    if not args or args[0] == 'get':
-                        print(f"ACC=0x{self.cpu.acc:08x}")
-                    elif args[0] == 'set' and len(args) == 2:
-                        try:
-                            v = int(args[1], 0)
-                            self.cpu.acc = v & 0xFFFFFFFF
-                            print(f"ACC set to 0x{self.cpu.acc:08x}")
-                        except ValueError:
-                            print("Invalid value")
-                elif cmd == "sleep":
-                    self.do_sleep(args)
-                elif cmd == "ping":
-                    self.do_ping(args)
-                elif cmd == "uptime":
-                    self.do_uptime(args)
-                elif cmd == "df":
-                    self.do_df(args)
-                elif cmd == "top":
-                    self.do_top(args)
-                elif cmd == "find":
-                    self.do_find(args)
-                elif cmd == "cls":
-                    self.do_cls(args)
-                elif cmd == "ver":
-                    self.do_ver(args)
-                elif cmd == "calc":
-                    self.do_calc(args)
-                elif cmd == "date":
-                    self.do_date(args)
-                elif cmd == "time":
-                    self.do_time_cmd(args)
-                elif cmd == "type":
-                    self.do_type(args)
-                elif cmd == "curl":
-                    self.do_curl(args)
-                elif cmd == "wget":
-                    self.do_wget(args)
-                elif cmd == "grep":
-                    self.do_grep(args)
-                elif cmd == "wc":
-                    self.do_wc(args)
-                elif cmd == "nettest":
-                    self.do_nettest(args)
-                elif cmd == "netsocket":
-                    self.do_netsocket(args)
-                elif cmd == "http":
-                    self.do_http(args)
-                elif cmd == "dns":
-                    self.do_dns(args)
-                elif cmd == "download":
-                    self.do_download(args)
-                elif cmd == "memstats":
-                    self.do_memstats(args)
-                elif cmd == "memscrub":
-                    self.do_memscrub(args)
-                elif cmd == "meminfo":
-                    self.do_meminfo(args)
-                elif cmd == "asmtest":
-                    self.do_asmtest(args)
-                elif cmd == "stats":
-                    self.do_stats(args)
-                elif cmd == "cpuinfo":
-                    self.do_cpuinfo(args)
-                elif cmd == "benchmark":
-                    self.do_benchmark(args)
-                elif cmd == "test":
-                    self.do_test(args)
-                # Data processing commands
-                elif cmd == "hexdump":
-                    self.do_hexdump(args)
-                elif cmd == "md5":
-                    self.do_md5(args)
-                elif cmd == "sha256":
-                    self.do_sha256(args)
-                elif cmd == "base64":
-                    self.do_base64(args)
-                elif cmd == "base32":
-                    self.do_base32(args)
-                elif cmd == "hex":
-                    self.do_hex(args)
-                elif cmd == "rot13":
-                    self.do_rot13(args)
-                # Text processing commands
-                elif cmd == "reverse":
-                    self.do_reverse(args)
-                elif cmd == "upper":
-                    self.do_upper(args)
-                elif cmd == "lower":
-                    self.do_lower(args)
-                elif cmd == "tr":
-                    self.do_tr(args)
-                elif cmd == "cut":
-                    self.do_cut(args)
-                elif cmd == "sort":
-                    self.do_sort(args)
-                elif cmd == "uniq":
-                    self.do_uniq(args)
-                elif cmd == "head":
-                    self.do_head(args)
-                elif cmd == "tail":
-                    self.do_tail(args)
-                elif cmd == "diff":
-                    self.do_diff(args)
-                # System commands
-                elif cmd == "uname":
-                    self.do_uname(args)
-                elif cmd == "touch":
-                    self.do_touch(args)
-                elif cmd == "env":
-                    self.do_env(args)
-                elif cmd == "export":
-                    self.do_export(args)
-                elif cmd == "unset":
-                    self.do_unset(args)
-                # Game commands
-                elif cmd == "snake":
-                    self.do_snake(args)
-                elif cmd == "minesweeper":
-                    self.do_minesweeper(args)
-                elif cmd == "tetris":
-                    self.do_tetris(args)
-                else:
+                handler = self._DISPATCH.get(cmd)
+                if handler is None:
                     print("Unknown command. Type 'help'.")
+                else:
+                    # None keeps the shell running; True asks for a reboot, False to exit
+                    result = handler(args)
+                    if result is not None:
+                        return result
             except Exception as e:
                 print("Error:", e)
         return False
+
+    def do_help(self, args):
+        """Show command categories, or the commands of one category"""
+        if not args:
+            # Show command categories
+            print("Available command categories:")
+            print("  system    - System and process management commands")
+            print("  file      - File operations and management")
+            print("  text      - Text processing commands")
+            print("  data      - Data encoding and hashing commands")
+            print("  memory    - Memory and CPU operations")
+            print("  network   - Network simulation commands")
+            print("  cpp       - C++ compiler commands")
+            print("  games     - Terminal games (Snake, Minesweeper, Tetris)")
+            print("  util      - Utility commands")
+            print("\nUse 'help <category>' to see specific commands.")
+            return
+
+        category = args[0].lower()
+        if category == "system":
+            print("System Commands:")
+            print("  ps        - List processes")
+            print("  kill      - Kill a process")
+            print("  reboot    - Reboot the system")
+            print("  sysinfo   - Show system information")
+            print("  uptime    - Show system uptime")
+            print("  top       - Show process information")
+            print("  date      - Show current date")
+            print("  time      - Show current time")
+            print("  bios      - Show BIOS information")
+            print("  sleep     - Delay execution")
+            print("  ver       - Show version information")
+            print("  whoami    - Show current user")
+            print("  uname     - Show system info")
+            print("  env       - Show environment variables")
+            print("  export    - Set environment variable")
+            print("  unset     - Remove environment variable")
+            print("  diagnose  - Run system diagnostics")
+            print("  self-repair - Attempt automated repairs")
+            print("  diagnose  - Run system diagnostics and self-repair")
+        elif category == "file":
+            print("File Commands:")
+            print("  ls        - List files")
+            print("  cd        - Change directory")
+            print("  pwd       - Print working directory")
+            print("  cat       - Display file contents")
+            print("  nano      - Text editor (like nano)")
+            print("  write     - Write text to file")
+            print("  mkdir     - Create directory")
+            print("  rm        - Remove file")
+            print("  cp        - Copy file")
+            print("  mv        - Move file")
+            print("  chmod     - Change file permissions")
+            print("  stat      - Show file information")
+            print("  type      - Print file contents")
+            print("  find      - Search for files")
+            print("  touch     - Create empty file")
+            print("  df        - Show disk usage")
+        elif category == "text":
+            print("Text Processing Commands:")
+            print("  grep      - Search within files")
+            print("  wc        - Count lines/words/chars")
+            print("  head      - Show first N lines")
+            print("  tail      - Show last N lines")
+            print("  sort      - Sort lines")
+            print("  uniq      - Remove duplicate lines")
+            print("  cut       - Extract columns")
+            print("  tr        - Translate characters")
+            print("  upper     - Convert to uppercase")
+            print("  lower     - Convert to lowercase")
+            print("  reverse   - Reverse text")
+            print("  diff      - Compare two files")
+        elif category == "data":
+            print("Data Processing Commands:")
+            print("  base64    - Base64 encode/decode")
+            print("  base32    - Base32 encode/decode")
+            print("  hex       - Hex encode/decode")
+            print("  rot13     - ROT13 encode/decode")
+            print("  md5       - MD5 hash")
+            print("  sha256    - SHA256 hash")
+            print("  hexdump   - Hex dump of file/memory")
+        elif category == "memory":
+            print("Memory & Assembly Commands:")
+            print("  memmap    - Map memory region")
+            print("  memstats  - Show memory statistics")
+            print("  memscrub  - Securely zero a memory range")
+            print("  meminfo   - Show memory info")
+            print("  regs      - Show CPU registers")
+            print("  disasm    - Disassemble memory")
+            print("  debug     - Enable/disable CPU tracing")
+            print("  trace     - Trace execution")
+            print("  loadasm   - Load assembly program")
+            print("  asminfo   - Show assembler symbols")
+            print("  asmtest   - Run assembler tests")
+            print("  run       - Execute program")
+            print("  cpuinfo   - Show CPU information")
+        elif category == "cpp":
+            print("C++ Compiler Commands:")
+            print("  cas++      - Compile C++ source with cas++")
+            print("  compilecpp - Alias for cas++")
+            print("  cpprun     - Compile and immediately run C++ code")
+            print("  c++        - Show detailed cas++ help")
+            print("  benchmark - Run benchmarks")
+        elif category == "network":
+            print("Network Commands:")
+            print("  ping <host>              - Test connectivity (real TCP)")
+            print("  curl <url>               - Fetch URL content (real HTTP GET)")
+            print("  wget <url>               - Download file (real HTTP)")
+            print("  http <get|head> <url>    - HTTP operations")
+            print("  dns <hostname>           - DNS lookup")
+            print("  download <url> [file]    - Download and save file")
+            print("  nettest <host> <port>    - Test network connectivity")
+            print("  netsocket <cmd> [args]   - Socket operations (create, connect, send, recv, close)")
+        elif category == "games":
+            print("Terminal Games:")
+            print("  snake       - Play Snake game")
+            print("  minesweeper - Play Minesweeper")
+            print("  tetris      - Play Tetris (auto-falling!)")
+            print("\nControls:")
+            print("  Snake:       w/a/s/d to change direction, Enter to move, q to quit")
+            print("  Minesweeper: 'row col' to reveal (e.g., '3 4')")
+            print("                'f row col' to flag, q to quit")
+            print("  Tetris:      a/d to move, w to rotate, s to drop fast, q to quit")
+            print("                Pieces fall automatically every 0.8 seconds!")
+        elif category == "util":
+            print("Utility Commands:")
+            print("  echo      - Print text")
+            print("  clear/cls - Clear screen")
+            print("  calc      - Basic calculator")
+            print("  history   - Show command history")
+            print("  set       - Set environment variable")
+            print("  get       - Get environment variable")
+            print("  random    - Generate random number")
+            print("  stats     - Show system statistics")
+            print("  test      - Run tests")
+            print("  exit/quit - Exit the shell")
+        else:
+            print(f"Unknown category: {category}")
+            print("Use 'help' for list of categories.")
+
+    def do_run_cmd(self, args):
+        """run <file> [addr]; a program exiting with 0xDEADBEEF reboots the system"""
+        result = self.do_run(args)
+        if result == 0xDEADBEEF:  # Reboot signal
+            print("System rebooting...")
+            return True  # Signal to reboot
+
+    def do_regs(self, args):
+        """Dump CPU registers"""
+        print(self.cpu.dump_regs())
+
+    def do_exit(self, args):
+        """Leave the shell"""
+        print("Bye.")
+        return False  # Normal exit
+
+    def do_reboot(self, args):
+        """Reboot the system through the kernel REBOOT syscall"""
+        print("Rebooting system...")
+        # Use kernel REBOOT syscall
+        self.cpu.reg_write(0, 24)  # REBOOT
+        self.kernel.syscall(self.cpu)
+        return True  # Signal to reboot
+
+    def do_start_gui(self, args):
+        """Launch the PyQt5 desktop environment"""
+        print("Starting desktop environment...")
+        try:
+            if not PYQT5_AVAILABLE:
+                print("ERROR: PyQt5 not installed. Install with: pip install PyQt5")
+            else:
+                # Launch desktop environment
+                should_reboot = launch_desktop_environment(self.kernel, self.cpu, self)
+                if should_reboot:
+                    print("Rebooting from GUI...")
+                    return True
+                else:
+                    print("Desktop environment closed.")
+        except Exception as e:
+            print(f"Error launching GUI: {e}")
+            import traceback
+            traceback.print_exc()
+
+    def do_setflag(self, args):
+        """setflag <FLAG> - set a CPU flag by name"""
+        if len(args) != 1:
+            print("Usage: setflag <FLAG>")
+        else:
+            name, mask = _flag_mask(args[0])
+            if mask is None:
+                print("Unknown flag", name)
+            else:
+                self.cpu.set_flag(mask)
+                print(f"Set {name}")
+
+    def do_acc(self, args):
+        """acc [get|set <value>] - read or write the accumulator"""
+        if not args or args[0] == 'get':
+            print(f"ACC=0x{self.cpu.acc:08x}")
+        elif args[0] == 'set' and len(args) == 2:
+            try:
+                v = _parse_int(args[1])
+                self.cpu.acc = v & 0xFFFFFFFF
+                print(f"ACC set to 0x{self.cpu.acc:08x}")
+            except ValueError:
+                print("Invalid value")
+
     def do_ls(self, args):
         """List files and directories"""
+        k = self.kernel
         long_format = False
         target = None
         for arg in args:
@@ -9381,28 +9389,37 @@ class Shell:
                 long_format = True
             elif target is None:
                 target = arg
-        path = target if target is not None else self.kernel.cwd
+        path = target if target is not None else k.cwd
         try:
-            entries = self.kernel.list_directory(path, self.kernel.cwd)
+            entries = k.list_directory(path, k.cwd)
         except FileNotFoundError:
             print(f"ls: cannot access '{path}': No such file or directory")
             return
         except NotADirectoryError:
-            entries = [self.kernel.get_entry(path, self.kernel.cwd)]
+            entries = [k.get_entry(path, k.cwd)]
 
+        # The listing is built first and written in one call rather than one
+        # print per entry
+        rows = []
+        append = rows.append
+        display_name = k.display_name
         if long_format:
-            print(f"{'Mode':<10} {'Size':<8} {'Created':<20} {'Modified':<20} {'Name'}")
+            append(_LS_ROW.format("Mode", "Size", "Created", "Modified", "Name"))
 
         for entry_path, info in entries:
-            display_name = self.kernel.display_name(entry_path)
-            mode_str = "drwxr-xr-x" if info.get("is_dir") else "rw-r--r--"
+            name = display_name(entry_path)
             size = len(info["data"])
-            created = time.ctime(info["created_time"])
-            modified = time.ctime(info["modified_time"])
             if long_format:
-                print(f"{mode_str:<10} {size:<8} {created:<20} {modified:<20} {display_name}")
-            else:
-                print(f"{display_name}\t{size} bytes")
+                # Timestamps are only formatted for the long listing
+                mode_str = "drwxr-xr-x" if info.get("is_dir") else "rw-r--r--"
+                created = _entry_ctime(info["created_time"])
+                modified = _entry_ctime(info["modified_time"])
+                append(_LS_ROW.format(mode_str, size, created, modified, name))
+            else:
+                append(f"{name}\t{size} bytes")
+        if rows:
+            append("")
+            sys.stdout.write("\n".join(rows))
     def do_cat(self, args):
         if not args:
             print("Usage: cat <file>")
@@ -9417,33 +9434,41 @@ class Shell:
             print(f"{name} is a directory")
             return
         try:
-            print(data.decode("utf-8", errors="replace"))
+            text = data.decode("utf-8", errors="replace")
         except Exception:
             print(data)
+            return
+        # Written through the text layer so newline translation, the stream's encoding
+        # and ordering with earlier prints all apply; no separate print formatting pass
+        out = sys.stdout
+        out.write(text)
+        out.write("\n")
     
     def do_cd(self, args):
         """Change directory"""
+        k = self.kernel
         if not args:
-            target = self.kernel.env_vars.get("HOME", "/")
+            target = k.env_vars.get("HOME", "/")
         else:
             target = args[0]
-        new_path = self.kernel.normalize_path(target, self.kernel.cwd)
-        entry = self.kernel.files.get(new_path)
+        new_path = k.normalize_path(target, k.cwd)
+        entry = k.files.get(new_path)
         if entry is None or not entry.get("is_dir", False):
             print(f"cd: no such directory: {target}")
             return
-        self.kernel.cwd = new_path
-        self.kernel.env_vars["PWD"] = self.kernel.cwd
-        print(f"Changed directory to: {self.kernel.cwd}")
+        k.cwd = new_path
+        k.env_vars["PWD"] = k.cwd
+        print(f"Changed directory to: {k.cwd}")
     
     def do_nano(self, args):
         """Simple text editor similar to nano"""
+        k = self.kernel
         if not args:
             print("Usage: nano <file>")
             return
         filename = args[0]
         try:
-            _, data = self.kernel.read_file(filename, self.kernel.cwd)
+            _, data = k.read_file(filename, k.cwd)
             content = data.decode("utf-8")
         except FileNotFoundError:
             content = ""
@@ -9471,26 +9496,24 @@ class Shell:
         print("\nEnter new content (type :w to save, :q to quit, :wq to save & quit):")
         
         new_lines = []
+        append = new_lines.append
+        write_file = k.write_file
         while True:
             try:
                 line = input()
-                if line == ":w":
-                    # Save
+                action = _NANO_COMMANDS.get(line)
+                if action is None:
+                    append(line)
+                    continue
+                save, leave = action
+                if save:
                     new_content = "\n".join(new_lines)
-                    self.kernel.write_file(filename, new_content.encode("utf-8"), 0o644, self.kernel.cwd)
+                    write_file(filename, new_content.encode("utf-8"), 0o644, k.cwd)
                     print(f"Saved {len(new_content)} bytes to {filename}")
-                elif line == ":q":
-                    # Quit without saving
+                elif leave:
                     print("Quit without saving")
+                if leave:
                     break
-                elif line == ":wq":
-                    # Save and quit
-                    new_content = "\n".join(new_lines)
-                    self.kernel.write_file(filename, new_content.encode("utf-8"), 0o644, self.kernel.cwd)
-                    print(f"Saved {len(new_content)} bytes to {filename}")
-                    break
-                else:
-                    new_lines.append(line)
             except EOFError:
                 break
             except KeyboardInterrupt:
@@ -9498,24 +9521,25 @@ class Shell:
                 break
     
     def do_write(self, args):
+        k = self.kernel
         if len(args) < 2:
             print("Usage: write <file> <text...>")
             return
-        name = args[0]
-        text = " ".join(args[1:])
-        self.kernel.write_file(name, text.encode("utf-8"), 0o644, self.kernel.cwd)
-        print(f"Wrote {len(text)} bytes to {self.kernel.normalize_path(name, self.kernel.cwd)}")
+        abs_path = k.normalize_path(args[0], k.cwd)
+        payload = b" ".join([arg.encode("utf-8") for arg in args[1:]])
+        k.write_file(abs_path, payload, 0o644)
+        print(f"Wrote {len(payload)} bytes to {abs_path}")
     
     def do_caspp(self, args):
         """Compile C++ code using the cas++ compiler"""
         if not args:
             print("Usage: cas++ <source.cpp> [output.bin] [--run] [--asm] [--debug] [--output]")
             return
-        run_after = "--run" in args
-        show_asm = "--asm" in args
-        debug_mode = "--debug" in args
-        output_only = "--output" in args
-        positional = [arg for arg in args if not arg.startswith("--")]
+        flags, positional, _ = _split_flags(args)
+        run_after = "--run" in flags
+        show_asm = "--asm" in flags
+        debug_mode = "--debug" in flags
+        output_only = "--output" in flags
         if not positional:
             print("Usage: cas++ <source.cpp> [output.bin] [--run] [--asm] [--debug] [--output]")
             return
@@ -9568,53 +9592,7 @@ class Shell:
     
     def do_cpp_help(self, args):
         """Show C++ compiler help"""
-        print("cas++ - SimpleOS C++ Compiler")
-        print("=" * 40)
-        print("USAGE:")
-        print("  cas++ <source.cpp> [output.bin] [options]")
-        print()
-        print("OPTIONS:")
-        print("  --run     Compile and immediately execute the program")
-        print("  --asm     Display generated assembly output")
-        print("  --debug   Alias for --asm (kept for compatibility)")
-        print("  --output  Show ONLY program output (no debug info)")
-        print()
-        print("OTHER COMMANDS:")
-        print("  compilecpp  - Alias for cas++")
-        print("  cpprun      - Compile and run in a single step")
-        print("  c++         - Show this help screen")
-        print()
-        print("SUPPORTED FEATURES:")
-        print("  • #include lines (ignored but accepted for common headers)")
-        print("  • int / const int / float / bool / char declarations")
-        print("  • Mutable variables mapped to CPU registers (R4-R12)")
-        print("  • Arithmetic: +, -, *, /, %, ++, --, +=, -=, *=, /=")
-        print("  • Bitwise: &, |, ^, ~, <<, >>, &=, |=, ^=, <<=, >>=")
-        print("  • Comparison: ==, !=, <, >, <=, >=")
-        print("  • Control flow: if/else, while, do-while, for, break, continue")
-        print("  • Arrays: int arr[size]; with indexing arr[i]")
-        print("  • Classes: Basic class support with members")
-        print()
-        print("BUILT-IN FUNCTIONS:")
-        print("  Math: abs(), min(), max(), sqrt(), pow(), rand(), srand()")
-        print("  String: strlen(), strcmp(), memset()")
-        print("  Bitwise: popcnt(), clz(), ctz(), swap(), reverse()")
-        print("  Graphics: lerp(), sign(), saturate(), clamp()")
-        print("  System: gettime(), sleep()")
-        print("  • printf(\"text\", value1, value2, ...); with %d placeholders")
-        print("  • return <expression>; (integers & simple arithmetic)")
-        print()
-        print("NEW CPU INSTRUCTIONS:")
-        print("  • MULH  - Multiply High (upper 32 bits of 64-bit result)")
-        print("  • DIVMOD - Combined division and modulo")
-        print("  • AVGB  - Average of two values (useful for blending)")
-        print()
-        print("OPTIMIZATIONS:")
-        print("  • Expression caching for faster compilation")
-        print("  • Register reuse optimization")
-        print("  • Peephole optimization in assembler")
-        print()
-        print("Unsupported statements are ignored with warnings.")
+        sys.stdout.write(_CPP_HELP_TEXT)
     
     def do_compile_cpp(self, args):
         """Alias for cas++"""
@@ -9627,13 +9605,14 @@ class Shell:
             return
         self.do_caspp(args + ["--run"])
     def do_loadasm(self, args):
+        k = self.kernel
         if len(args) < 2:
             print("Usage: loadasm <srcfile> <destfile>")
             return
         src = args[0]
         dest = args[1]
         try:
-            _, code_bytes = self.kernel.read_file(src, self.kernel.cwd)
+            _, code_bytes = k.read_file(src, k.cwd)
         except FileNotFoundError:
             print(f"Source file {src} not found")
             return
@@ -9641,7 +9620,8 @@ class Shell:
             print(f"{src} is a directory")
             return
         code = code_bytes.decode('utf-8', errors='replace') if isinstance(code_bytes, bytes) else code_bytes
-        assembler = Assembler()
+        assembler = self.assembler
+        assembler.reset()
         try:
             binary = assembler.assemble(code)
             # Show warnings if any
@@ -9653,7 +9633,7 @@ class Shell:
         except AssemblerError as e:
             print(f"Assembly error: {e}")
             return
-        self.kernel.write_file(dest, binary, 0o755, self.kernel.cwd)
+        k.write_file(dest, binary, 0o755, k.cwd)
         print(f"Assembled {len(binary)} bytes to {dest}")
         print(f"Labels: {list(assembler.labels.keys())}")
         print(f"Constants: {list(assembler.constants.keys())}")
@@ -9671,7 +9651,8 @@ class Shell:
             print(f"{filename} is a directory")
             return
         code = code_bytes.decode('utf-8', errors='replace') if isinstance(code_bytes, bytes) else code_bytes
-        assembler = Assembler()
+        assembler = self.assembler
+        assembler.reset()
         try:
             assembler.assemble(code)
         except AssemblerError as e:
@@ -9687,14 +9668,12 @@ class Shell:
             print("  --trace   : Enable instruction tracing")
             return
         
-        # Parse flags
-        debug_mode = "--debug" in args
-        output_mode = "--output" in args
+        # Parse flags; args keeps only the positional arguments
+        flags, args, _ = _split_flags(args)
+        debug_mode = "--debug" in flags
+        output_mode = "--output" in flags
         output_only = output_mode  # --output means show ONLY program output
-        trace_mode = "--trace" in args
-        
-        # Remove flags from args
-        args = [arg for arg in args if not arg.startswith("--")]
+        trace_mode = "--trace" in flags
         
         fname = args[0]
         try:
@@ -9705,7 +9684,7 @@ class Shell:
         except IsADirectoryError:
             print(f"{fname} is a directory")
             return
-        addr = int(args[1], 0) if len(args) > 1 else 0x1000
+        addr = _parse_int(args[1]) if len(args) > 1 else 0x1000
         
         # Load program into memory
         try:
@@ -9716,7 +9695,7 @@ class Shell:
         
         # Save initial state for debug mode
         if debug_mode or output_mode:
-            initial_regs = [self.cpu.reg_read(i) for i in range(NUM_REGS)]
+            initial_regs = self.cpu.snapshot_regs()
         
         self.cpu.pc = addr
         self.cpu.halted = False
@@ -9780,11 +9759,13 @@ class Shell:
                 print(f"Final SP: {self.cpu.reg_read(REG_SP):08x}")
                 print(f"Flags: {self.cpu.flags:08x}")
                 print("\nRegister Changes:")
-                for i in range(NUM_REGS):
-                    final_val = self.cpu.reg_read(i)
-                    if output_mode or (debug_mode and final_val != initial_regs[i]):
-                        print(f"  R{i}: {initial_regs[i]:08x} -> {final_val:08x}")
-                print("=" * 50)
+                # --output lists every register; --debug only the ones that changed
+                final_regs = self.cpu.snapshot_regs()
+                rows = ["  R%d: %08x -> %08x\n" % (i, initial_val, final_val)
+                        for i, (initial_val, final_val) in enumerate(zip(initial_regs, final_regs))
+                        if output_mode or initial_val != final_val]
+                rows.append("=" * 50 + "\n")
+                sys.stdout.write("".join(rows))
             
             # Check if it was a reboot signal
             if self.cpu.reg_read(0) == 0xDEADBEEF:
@@ -9805,21 +9786,18 @@ class Shell:
             return
         
         # Parse flags
-        trace_mode = "--trace" in args
+        flags, files, options = _split_flags(args)
+        trace_mode = "--trace" in flags
         priority = 5
         
         # Extract priority if specified
-        files = []
-        for arg in args:
-            if arg.startswith("--priority="):
-                try:
-                    priority = int(arg.split("=")[1])
-                    priority = max(0, min(10, priority))  # Clamp to 0-10
-                except ValueError:
-                    print(f"Invalid priority value: {arg}")
-                    return
-            elif not arg.startswith("--"):
-                files.append(arg)
+        if "--priority" in options:
+            try:
+                priority = int(options["--priority"])
+                priority = max(0, min(10, priority))  # Clamp to 0-10
+            except ValueError:
+                print(f"Invalid priority value: --priority={options['--priority']}")
+                return
         
         if not files:
             print("No files specified")
@@ -9880,8 +9858,10 @@ class Shell:
         print("=" * 60)
         print(f"{'TID':<6} {'State':<12} {'Priority':<10} {'PC':<10} {'Instructions':<15}")
         print("-" * 60)
-        for t in threads:
-            print(f"{t['tid']:<6} {t['state']:<12} {t['priority']:<10} {t['pc']:08x}   {t['instructions']:<15}")
+        sys.stdout.write("".join([
+            f"{t['tid']:<6} {t['state']:<12} {t['priority']:<10} {t['pc']:08x}   {t['instructions']:<15}\n"
+            for t in threads
+        ]))
         print("=" * 60)
         print(f"Total threads: {len(threads)}")
     
@@ -9889,8 +9869,8 @@ class Shell:
         if len(args) != 2:
             print("Usage: memmap <addr> <len>")
             return
-        addr = int(args[0], 0)
-        length = int(args[1], 0)
+        addr = _parse_int(args[0])
+        length = _parse_int(args[1])
         # Use kernel ALLOC syscall
         self.cpu.reg_write(0, 5)  # ALLOC
         self.cpu.reg_write(1, addr)
@@ -9905,10 +9885,10 @@ class Shell:
         if not args:
             print("Usage: disasm <addr> [count]")
             return
-        addr = int(args[0], 0)
+        addr = _parse_int(args[0])
         count = 8
         if len(args) > 1:
-            count = int(args[1], 0)
+            count = _parse_int(args[1])
         lines = self.cpu.disassemble_at(addr, count)
         for l in lines:
             print(l)
@@ -9921,8 +9901,10 @@ class Shell:
         
         print("TID  State      Priority  PC        Instructions")
         print("---  -----      --------  --------  ------------")
-        for t in threads:
-            print(f"{t['tid']:<4} {t['state']:<10} {t['priority']:<9} {t['pc']:08x}  {t['instructions']}")
+        sys.stdout.write("".join([
+            f"{t['tid']:<4} {t['state']:<10} {t['priority']:<9} {t['pc']:08x}  {t['instructions']}\n"
+            for t in threads
+        ]))
     def do_kill(self, args):
         """Kill process by PID"""
         if not args:
@@ -10115,8 +10097,8 @@ class Shell:
         if len(args) < 2:
             print("Usage: trace <addr> <count>")
             return
-        addr = int(args[0], 0)
-        count = int(args[1], 0)
+        addr = _parse_int(args[0])
+        count = _parse_int(args[1])
         self.cpu.pc = addr
         self.cpu.halted = False
         print(f"Tracing {count} steps starting at {addr:08x}")
@@ -10174,24 +10156,21 @@ class Shell:
                 set_names = [n for n,m in FLAG_NAME_MAP.items() if (f & m)]
                 print("Set:", ", ".join(set_names) if set_names else "<none>")
             elif cmd == "set" and args:
-                name = args[0].upper()
-                mask = FLAG_NAME_MAP.get(name)
+                name, mask = _flag_mask(args[0])
                 if mask is None:
                     print("Unknown flag", name)
                 else:
                     self.cpu.set_flag(mask)
                     print(f"Set {name}")
             elif cmd == "clear" and args:
-                name = args[0].upper()
-                mask = FLAG_NAME_MAP.get(name)
+                name, mask = _flag_mask(args[0])
                 if mask is None:
                     print("Unknown flag", name)
                 else:
                     self.cpu.clear_flag(mask)
                     print(f"Cleared {name}")
             elif cmd == "toggle" and args:
-                name = args[0].upper()
-                mask = FLAG_NAME_MAP.get(name)
+                name, mask = _flag_mask(args[0])
                 if mask is None:
                     print("Unknown flag", name)
                 else:
@@ -10306,45 +10285,11 @@ class Shell:
             # Redirect output for most commands
             with redirect_stdout(output_buffer):
                 # Execute simple commands
-                if cmd == "help":
-                    if not args:
-                        print("SimpleOS Commands:")
-                        print("  help [category]  - Show help")
-                        print("  ls               - List files")
-                        print("  cd [dir]         - Change directory")
-                        print("  pwd              - Print working directory")
-                        print("  cat [file]       - Show file")
-                        print("  echo [text]      - Print text")
-                        print("  whoami           - Show user")
-                        print("  ps               - List processes")
-                        print("  regs             - Show CPU registers")
-                        print("  sysinfo          - System info")
-                        print("  clear            - Clear screen")
-                        print("  exit             - Exit")
-                    else:
-                        print(f"Help for {args[0]}: Not available in GUI")
-                elif cmd == "cd":
-                    self.do_cd(args)
-                elif cmd == "ls":
-                    self.do_ls(args)
-                elif cmd == "cat":
-                    self.do_cat(args)
-                elif cmd == "echo":
-                    print(" ".join(args))
-                elif cmd == "whoami":
-                    print(self.kernel.username)
-                elif cmd == "ps":
-                    self.do_ps(args)
-                elif cmd == "regs":
-                    print(self.cpu.dump_regs())
-                elif cmd == "sysinfo":
-                    self.do_sysinfo(args)
-                elif cmd == "pwd":
-                    print(self.kernel.cwd)
-                elif cmd == "clear":
-                    print("[Screen cleared]")
-                else:
+                handler = self._GUI_DISPATCH.get(cmd)
+                if handler is None:
                     print(f"Unknown command: {cmd}")
+                else:
+                    handler(args)
                     
         except Exception as e:
             output_buffer.write(f"Error: {str(e)}\n")
@@ -10353,6 +10298,29 @@ class Shell:
         
         return output_buffer.getvalue()
     
+    def _gui_help(self, args):
+        """help as shown in the GUI terminal"""
+        if not args:
+            print("SimpleOS Commands:")
+            print("  help [category]  - Show help")
+            print("  ls               - List files")
+            print("  cd [dir]         - Change directory")
+            print("  pwd              - Print working directory")
+            print("  cat [file]       - Show file")
+            print("  echo [text]      - Print text")
+            print("  whoami           - Show user")
+            print("  ps               - List processes")
+            print("  regs             - Show CPU registers")
+            print("  sysinfo          - System info")
+            print("  clear            - Clear screen")
+            print("  exit             - Exit")
+        else:
+            print(f"Help for {args[0]}: Not available in GUI")
+
+    def _gui_clear(self, args):
+        """The GUI terminal widget clears itself; just acknowledge"""
+        print("[Screen cleared]")
+
     def do_history(self, args):
         """Show command history"""
         # Use kernel SHOW_HISTORY syscall
@@ -10838,8 +10806,8 @@ class Shell:
             print("Usage: memscrub <addr> <length>")
             return
         try:
-            addr = int(args[0], 0)
-            length = int(args[1], 0)
+            addr = _parse_int(args[0])
+            length = _parse_int(args[1])
         except ValueError:
             print("Usage: memscrub <addr> <length>")
             return
@@ -11543,12 +11511,12 @@ error:
             print("Usage: hexdump <file|addr> [length]")
             return
         target = args[0]
-        length = int(args[1], 0) if len(args) > 1 else 256
+        length = _parse_int(args[1]) if len(args) > 1 else 256
         
         # Check if it's a file or memory address
         if target.startswith('0x') or target.isdigit():
             # Memory address
-            addr = int(target, 0)
+            addr = _parse_int(target)
             try:
                 data = self.cpu.mem.dump(addr, length)
                 self._print_hexdump(data, addr)
@@ -11580,7 +11548,6 @@ error:
         abs_fname, data = self._read_file_bytes(fname)
         if abs_fname is None:
             return
-        import hashlib
         md5_hash = hashlib.md5(data).hexdigest()
         print(f"MD5 ({abs_fname}) = {md5_hash}")
     
@@ -11593,7 +11560,6 @@ error:
         abs_fname, data = self._read_file_bytes(fname)
         if abs_fname is None:
             return
-        import hashlib
         sha256_hash = hashlib.sha256(data).hexdigest()
         print(f"SHA256 ({abs_fname}) = {sha256_hash}")
     
@@ -11678,12 +11644,10 @@ error:
             print("Usage: rot13 <file>")
             return
         fname = args[0]
-        import codecs
         _, text = self._read_text(fname)
         if text is None:
             return
-        result = codecs.encode(text, 'rot_13')
-        print(result)
+        print(text.translate(_ROT13_TABLE))
     
     def do_reverse(self, args):
         """Reverse text in file"""
@@ -11729,8 +11693,7 @@ error:
         _, text = self._read_text(fname)
         if text is None:
             return
-        trans = str.maketrans(from_chars, to_chars)
-        print(text.translate(trans))
+        print(text.translate(_tr_table(from_chars, to_chars)))
     
     def do_cut(self, args):
         """Cut columns from file"""
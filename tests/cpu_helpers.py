@@ -0,0 +1,50 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import SimpleOS as S
+
+
+def compile_cpp(source):
+    """Compile source with a fresh compiler; returns (binary, assembly listing)."""
+    compiler = S.CppCompiler()
+    binary = compiler.compile(source)
+    return binary, compiler.last_assembly
+
+
+def run_binary(binary, data=b"", data_addr=0x2000, max_steps=10000):
+    """Run a compiled program at PROGRAM_BASE and return R0 once it halts."""
+    mem = S.Memory(size_bytes=S.DEFAULT_MEMORY_BYTES)
+    cpu = S.CPU(memory=mem, kernel=S.Kernel())
+    mem.load_bytes(0x1000, binary)
+    if data:
+        mem.load_bytes(data_addr, data)
+    cpu.pc = 0x1000
+    cpu.halted = False
+    cpu.reg_write(S.REG_SP, (S.STACK_BASE - 4) & 0xFFFFFFFF)
+    cpu.program_start = 0x1000
+    cpu.program_end = 0x1000 + len(binary)
+    steps = 0
+    while not cpu.halted and steps < max_steps:
+        cpu.step()
+        steps += 1
+    assert cpu.halted, "program did not halt"
+    return cpu.reg_read(0)
+
+
+def run_cpp(source, **kwargs):
+    """Compile and run source; returns (R0, assembly listing)."""
+    binary, assembly = compile_cpp(source)
+    return run_binary(binary, **kwargs), assembly
+
+
+def main_body(*lines):
+    """Wrap statements in int main() { ... }."""
+    return "int main() {\n" + "".join(f"    {line}\n" for line in lines) + "}\n"
+
+
+def assembled_opcode(text):
+    """Opcode of the first instruction the assembler emits for text."""
+    word = int.from_bytes(S.Assembler().assemble(text)[:4], "little")
+    return S.unpack_instruction(word)[0]
@@ -0,0 +1,44 @@
+import pytest
+
+from cpu_helpers import S, assembled_opcode, main_body, run_binary, run_cpp
+
+
+@pytest.mark.parametrize("mnemonic, opcode", [("CBZ", S.OP_CBZ), ("CBNZ", S.OP_CBNZ)])
+def test_opcode_survives_encoding(mnemonic, opcode):
+    assert assembled_opcode(f"{mnemonic} R1, done\ndone:\n    HALT") == opcode
+
+
+@pytest.mark.parametrize("mnemonic, value, expected", [
+    ("CBZ", 0, 1), ("CBZ", 5, 2),
+    ("CBNZ", 0, 2), ("CBNZ", 5, 1),
+])
+def test_branch_taken_only_on_matching_value(mnemonic, value, expected):
+    asm = (f"LOADI R1, {value}\nLOADI R0, 1\n{mnemonic} R1, taken\n"
+           "LOADI R0, 2\nHALT\ntaken:\nHALT\n")
+    assert run_binary(S.Assembler().assemble(asm)) == expected
+
+
+@pytest.mark.parametrize("x, expected", [(0, 1), (7, 2)])
+def test_if_truth_test(x, expected):
+    result, assembly = run_cpp(main_body(
+        f"int x = {x};",
+        "int r = 1;",
+        "if (x) {",
+        "    r = 2;",
+        "}",
+        "return r;",
+    ))
+    assert "CBZ" in assembly
+    assert result == expected
+
+
+@pytest.mark.parametrize("a, b", [(0, 0), (0, 3), (4, 0), (4, 3)])
+def test_logical_and(a, b):
+    result, assembly = run_cpp(main_body(
+        f"int a = {a};",
+        f"int b = {b};",
+        "int r = (a && b);",
+        "return r;",
+    ))
+    assert "CBZ" in assembly
+    assert result == int(bool(a and b))
@@ -0,0 +1,36 @@
+import operator
+
+import pytest
+
+from cpu_helpers import main_body, run_cpp
+
+_OPERATORS = {
+    "<": operator.lt, "<=": operator.le, ">": operator.gt,
+    ">=": operator.ge, "==": operator.eq, "!=": operator.ne,
+}
+_VALUES = (-5, -1, 0, 3, 7)
+
+
+@pytest.mark.parametrize("op", list(_OPERATORS))
+@pytest.mark.parametrize("a", _VALUES)
+@pytest.mark.parametrize("b", _VALUES)
+def test_compare_registers(op, a, b):
+    result, _ = run_cpp(main_body(
+        f"int a = {a};",
+        f"int b = {b};",
+        f"int r = (a {op} b);",
+        "return r;",
+    ))
+    assert result == int(_OPERATORS[op](a, b))
+
+
+@pytest.mark.parametrize("op", list(_OPERATORS))
+@pytest.mark.parametrize("a", _VALUES)
+@pytest.mark.parametrize("b", (-1, 0, 3))
+def test_compare_with_constant(op, a, b):
+    result, _ = run_cpp(main_body(
+        f"int a = {a};",
+        f"int r = (a {op} {b});",
+        "return r;",
+    ))
+    assert result == int(_OPERATORS[op](a, b))
@@ -0,0 +1,13 @@
+import zlib
+
+from cpu_helpers import S, assembled_opcode, main_body, run_cpp
+
+
+def test_crc32_buf_opcode_survives_encoding():
+    assert assembled_opcode("CRC32_BUF") == S.OP_CRC32_BUF
+
+
+def test_crc32_buf_matches_zlib():
+    data = b"SimpleOS crc32_buf check"
+    result, _ = run_cpp(main_body("return crc32_buf(8192, %d);" % len(data)), data=data)
+    assert result == zlib.crc32(data)
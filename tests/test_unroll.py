@@ -0,0 +1,57 @@
+from cpu_helpers import main_body, run_cpp
+
+
+def test_unrolled_counter_folds_to_constants():
+    result, assembly = run_cpp(main_body(
+        "int s = 0;",
+        "for (int i = 0; i < 4; i++) {",
+        "    s = s + i * 3;",
+        "}",
+        "return s;",
+    ))
+    assert result == 18
+    assert assembly.count("(unrolled)") == 4
+    # Every use of i folded, so the counter is never stepped or compared
+    assert "INC" not in assembly
+    assert "CMP" not in assembly
+
+
+def test_unrolled_counter_keeps_final_value():
+    result, assembly = run_cpp(main_body(
+        "int s = 0;",
+        "int i = 0;",
+        "for (i = 0; i < 4; i++) {",
+        "    s += i;",
+        "}",
+        "return s * 100 + i;",
+    ))
+    assert result == 604
+    assert assembly.count("(unrolled)") == 4
+
+
+def test_loop_writing_counter_is_not_unrolled():
+    result, assembly = run_cpp(main_body(
+        "int s = 0;",
+        "for (int i = 0; i < 4; i++) {",
+        "    i = i + 1;",
+        "    s = s + 1;",
+        "}",
+        "return s;",
+    ))
+    assert result == 2
+    assert "(unrolled)" not in assembly
+
+
+def test_loop_with_break_is_not_unrolled():
+    result, assembly = run_cpp(main_body(
+        "int s = 0;",
+        "for (int i = 0; i < 4; i++) {",
+        "    if (i == 2) {",
+        "        break;",
+        "    }",
+        "    s = s + 10;",
+        "}",
+        "return s;",
+    ))
+    assert result == 20
+    assert "(unrolled)" not in assembly